@@ -0,0 +1,161 @@
+from sqlalchemy import insert, select
+from database import engine as default_engine
+from models import AuditLog, User
+from fraud_graph import fraud_ring_index
+from datetime import datetime
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.5"))
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "50000"))
+FLUSH_RETRIES = 3
+
+
+class AuditBackpressure(Exception):
+    """Raised when the audit queue is full"""
+
+
+class AuditSink:
+    """Buffers audit events and writes them in batched multi-row inserts.
+
+    Events go onto a bounded queue; a writer thread flushes whenever a
+    batch fills up or the flush interval passes. A full queue pushes back
+    on callers instead of growing without bound.
+    """
+
+    def __init__(self, engine=None, batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_interval: float = AUDIT_FLUSH_INTERVAL, max_queue: int = AUDIT_QUEUE_SIZE):
+        self.engine = engine or default_engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+                self._thread.start()
+
+    def emit(self, user_id: int, action: str, resource: str, details: dict = None,
+             ip_address: str = None, block: bool = False, timeout: float = None):
+        """Queue an audit event; raises AuditBackpressure if the queue stays full"""
+        self.start()
+        event = {
+            "user_id": user_id,
+            "action": action,
+            "resource": resource,
+            "details": details,
+            "ip_address": ip_address,
+            "created_at": datetime.utcnow(),
+        }
+        try:
+            self.queue.put(event, block=block, timeout=timeout)
+        except queue.Full:
+            raise AuditBackpressure("Audit queue is full")
+
+    def pending(self) -> int:
+        return self.queue.qsize()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Block until every event queued before this call is written"""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout: float = 10.0):
+        """Drain the queue and stop the writer thread"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self.queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            batch = []
+            markers = []
+            stopping = False
+            deadline = None
+            while len(batch) < self.batch_size:
+                wait = None if deadline is None else deadline - time.monotonic()
+                if wait is not None and wait <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=wait)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                if isinstance(item, threading.Event):
+                    markers.append(item)
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch:
+                self._write(batch)
+            for marker in markers:
+                marker.set()
+            if stopping:
+                return
+
+    def _write(self, batch: list):
+        for attempt in range(FLUSH_RETRIES):
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(insert(AuditLog), batch)
+                break
+            except Exception:
+                logger.exception("Audit flush of %d events failed (attempt %d)", len(batch), attempt + 1)
+                time.sleep(0.1 * 2 ** attempt)
+        else:
+            self.dropped += len(batch)
+            return
+
+        self.written += len(batch)
+        if fraud_ring_index.built:
+            for event in batch:
+                fraud_ring_index.link(event["user_id"], "ip", event["ip_address"])
+
+
+audit_sink = AuditSink()
+atexit.register(audit_sink.stop)
+
+# Users are never deleted, so a positive existence check can be reused
+_known_users = set()
+MAX_KNOWN_USERS = 100000
+
+
+def user_exists(db, user_id: int) -> bool:
+    if user_id in _known_users:
+        return True
+    if db.execute(select(User.id).where(User.id == user_id)).first() is None:
+        return False
+    if len(_known_users) >= MAX_KNOWN_USERS:
+        _known_users.clear()
+    _known_users.add(user_id)
+    return True
+
+
+def log_event(user_id: int, action: str, resource: str, details: dict = None, ip_address: str = None):
+    """In-process audit API for other routes; never blocks the caller"""
+    try:
+        audit_sink.emit(user_id, action, resource, details, ip_address)
+    except AuditBackpressure:
+        audit_sink.dropped += 1
+        logger.warning("Audit queue full, dropped %s on %s for user %s", action, resource, user_id)
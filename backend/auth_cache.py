@@ -0,0 +1,86 @@
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import time
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Caps staleness for changes made by other worker processes
+TOKEN_CACHE_MAX_TTL = float(os.getenv("TOKEN_CACHE_MAX_TTL", "300"))
+
+
+class TokenCache:
+    """Bounded LRU of verified token -> user snapshot.
+
+    Entries expire with the token's exp claim (capped at max_ttl) and can
+    be dropped per user when their role, points or 2FA settings change.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, max_ttl: float = TOKEN_CACHE_MAX_TTL):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def peek(self, token: str):
+        """Like get, without touching LRU order or the hit counters"""
+        with self._lock:
+            entry = self._entries.get(self._key(token))
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[2]
+
+    def put(self, token: str, user_id: int, snapshot, exp: float):
+        key = self._key(token)
+        expires_at = min(exp, time.time() + self.max_ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, user_id, snapshot)
+            self._by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        _, user_id, _ = self._entries.pop(key)
+        keys = self._by_user.get(user_id)
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user_id]
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache()
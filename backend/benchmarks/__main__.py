@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from datetime import datetime
+
+# Settings that must match between a run and the baseline it's compared to
+COMPARABLE = ("requests", "concurrency", "warmup", "users", "tasks_per_user", "llm_latency", "llm_jitter", "seed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the API in-process against a generated dataset and a stub LLM")
+    parser.add_argument("--scenarios", default="", help="Comma-separated glob patterns, e.g. 'tasks.*,fraud.*' (default: all)")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per scenario before timing")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tasks-per-user", type=int, default=20)
+    parser.add_argument("--chats-per-user", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds each stub LLM call takes")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="Extra seconds, up to this much, derived from the prompt")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database", help="SQLite file to generate the dataset into; must not exist (default: a temp file)")
+    parser.add_argument("--rate-limits", action="store_true", help="Keep the production rate limits (429s show up in status counts)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against; exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed relative change before a regression")
+    args = parser.parse_args()
+
+    if args.database and os.path.exists(args.database):
+        parser.error(f"{args.database} already exists")
+    database = args.database or os.path.join(tempfile.mkdtemp(prefix="workpay-bench-"), "bench.db")
+
+    # The app reads these at import time
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+    if not args.rate_limits:
+        for name in ("RATE_LIMIT_USER_BURST", "RATE_LIMIT_USER_RATE", "RATE_LIMIT_ROUTE_BURST", "RATE_LIMIT_ROUTE_RATE"):
+            os.environ[name] = "1e9"
+
+    from database import engine
+    from main import app
+    from audit_sink import audit_sink
+    from benchmarks.dataset import generate
+    from benchmarks.runner import run_benchmark, select_scenarios, compare
+    from benchmarks.stub_llm import StubGroq, installed
+
+    names = select_scenarios([p.strip() for p in args.scenarios.split(",") if p.strip()])
+    if not names:
+        parser.error("no scenarios match")
+
+    print(f"Generating dataset in {database}", file=sys.stderr)
+    ctx = generate(engine, args.users, args.tasks_per_user, args.chats_per_user, args.seed)
+
+    def progress(name, stats):
+        print(f"{name:34} {stats['throughput']:9.1f} req/s  p50 {stats['p50_ms']:8.2f}  "
+              f"p95 {stats['p95_ms']:8.2f}  p99 {stats['p99_ms']:8.2f} ms  errors {stats['errors']}", file=sys.stderr)
+
+    with installed(StubGroq(args.llm_latency, args.llm_jitter)):
+        results = run_benchmark(app, ctx, names, args.requests, args.concurrency, args.warmup, args.seed, progress)
+    audit_sink.stop()
+
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "users": args.users,
+            "tasks_per_user": args.tasks_per_user,
+            "llm_latency": args.llm_latency,
+            "llm_jitter": args.llm_jitter,
+            "seed": args.seed
+        },
+        "scenarios": results
+    }
+    rendered = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(rendered + "\n")
+    else:
+        print(rendered)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        changed = [k for k in COMPARABLE if baseline["meta"].get(k) != report["meta"][k]]
+        if changed:
+            print(f"Warning: baseline was run with different {', '.join(changed)}", file=sys.stderr)
+        regressions = compare(results, baseline["scenarios"], args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['scenario']} {r['metric']}: {r['baseline']} -> {r['current']}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+from sqlalchemy import select
+from models import User, Task
+from scripts.seed import seed_database, WORDS
+from datetime import datetime
+
+# Fixed so the same seed always produces the same rows
+END_DATE = datetime(2025, 1, 1)
+
+
+def generate(engine, users: int = 200, tasks_per_user: float = 20, chats_per_user: float = 5, seed: int = 42) -> dict:
+    """Seed engine with the synthetic dataset and return the ids scenarios draw from.
+
+    Every generated account's password is scripts.seed.PASSWORD.
+    """
+    seed_database(engine, users=users, tasks_per_user=tasks_per_user, chats_per_user=chats_per_user,
+                  seed=seed, end=END_DATE, demo=False, log=lambda message: None)
+    with engine.connect() as conn:
+        accounts = conn.execute(select(User.id, User.email).order_by(User.id)).all()
+        task_ids = conn.execute(select(Task.id).order_by(Task.id)).scalars().all()
+        pending = conn.execute(
+            select(Task.id).where(Task.verification_status == "pending").order_by(Task.id)
+        ).scalars().all()
+    return {
+        "user_ids": [user_id for user_id, _ in accounts],
+        "emails": dict(accounts),
+        "task_ids": list(task_ids),
+        "pending_task_ids": list(pending),
+        "words": WORDS
+    }
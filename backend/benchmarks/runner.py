@@ -0,0 +1,189 @@
+from collections import Counter
+from routes.auth import create_access_token
+from scripts.seed import PASSWORD
+import asyncio
+import fnmatch
+import math
+import random
+import time
+import httpx
+
+
+def _user(ctx, rng):
+    return rng.choice(ctx["user_ids"])
+
+
+def _words(ctx, rng, n=1):
+    return " ".join(rng.sample(ctx["words"], n))
+
+
+def _login(ctx, rng):
+    return "POST", "/api/auth/login", {"email": ctx["emails"][_user(ctx, rng)], "password": PASSWORD}, None
+
+
+def _me(ctx, rng):
+    token = create_access_token({"sub": ctx["emails"][_user(ctx, rng)]})
+    return "GET", "/api/auth/me", {"token": token}, None
+
+
+def _submit(ctx, rng):
+    body = {"description": f"{_words(ctx, rng, 4)} {rng.random():.6f}", "amount": round(rng.uniform(20, 200), 2)}
+    return "POST", "/api/tasks/submit", {"user_id": _user(ctx, rng)}, body
+
+
+def _verify(ctx, rng):
+    return "POST", f"/api/tasks/verify/{rng.choice(ctx['pending_task_ids'] or ctx['task_ids'])}", None, None
+
+
+def _process(ctx, rng):
+    return "POST", "/api/payments/process", None, {"task_id": rng.choice(ctx["task_ids"])}
+
+
+def _audit_log(ctx, rng):
+    return "POST", "/api/security/audit-log", {"user_id": _user(ctx, rng), "action": "view", "resource": "dashboard"}, {}
+
+
+def _get(path):
+    """A GET of path formatted with a random user_id"""
+    return lambda ctx, rng: ("GET", path.format(user_id=_user(ctx, rng)), None, None)
+
+
+def _post(path, **params):
+    """A POST to path formatted with a random user_id, with fixed query params"""
+    return lambda ctx, rng: ("POST", path.format(user_id=_user(ctx, rng)), params or None, None)
+
+
+# name -> builder(ctx, rng) returning (method, url, query params, json body); covers every router
+SCENARIOS = {
+    "health": lambda ctx, rng: ("GET", "/health", None, None),
+    "auth.login": _login,
+    "auth.me": _me,
+    "tasks.submit": _submit,
+    "tasks.list": _get("/api/tasks/{user_id}"),
+    "tasks.search": lambda ctx, rng: ("GET", f"/api/tasks/search/{_user(ctx, rng)}", {"q": _words(ctx, rng)}, None),
+    "tasks.verify": _verify,
+    "payments.process": _process,
+    "payments.list": _get("/api/payments/{user_id}"),
+    "payments.credit_score": _get("/api/payments/credit-score/{user_id}"),
+    "ai.predict": _post("/api/ai/predict/{user_id}"),
+    "ai.anomalies": _post("/api/ai/anomalies/{user_id}"),
+    "ai.chat_send": lambda ctx, rng: ("POST", "/api/ai/chat/send", {"user_id": _user(ctx, rng), "content": f"How is my {_words(ctx, rng)} going?"}, None),
+    "ai.chat_history": _get("/api/ai/chat/history/{user_id}"),
+    "ai.chat_search": lambda ctx, rng: ("GET", f"/api/ai/chat/search/{_user(ctx, rng)}", {"q": _words(ctx, rng)}, None),
+    "analytics.metrics": _get("/api/analytics/metrics/{user_id}"),
+    "analytics.report": lambda ctx, rng: ("POST", "/api/analytics/report/generate", {"user_id": _user(ctx, rng), "report_type": "performance"}, None),
+    "gamification.leaderboard": lambda ctx, rng: ("GET", "/api/gamification/leaderboard", {"limit": rng.choice([10, 50])}, None),
+    "gamification.stats": _get("/api/gamification/stats/{user_id}"),
+    "gamification.check_achievements": _post("/api/gamification/check-achievements/{user_id}"),
+    "security.audit_log": _audit_log,
+    "security.audit_logs": _get("/api/security/audit-logs/{user_id}"),
+    "security.compliance": _get("/api/security/compliance-status/{user_id}"),
+    "integrations.status": _get("/api/integrations/status/{user_id}"),
+    "integrations.webhooks": _get("/api/integrations/webhooks/{user_id}"),
+    "web3.wallet": _get("/api/web3/wallet/{user_id}"),
+    "web3.rewards": _get("/api/web3/rewards/{user_id}"),
+    "web3.nfts": _get("/api/web3/nft/{user_id}"),
+    "fraud.detect": _post("/api/fraud/detect/{user_id}"),
+    "fraud.velocity": _get("/api/fraud/velocity/{user_id}"),
+    "fraud.logs": _get("/api/fraud/logs/{user_id}"),
+}
+
+
+def select_scenarios(patterns: list = None) -> list:
+    """Scenario names matching any of the glob patterns, in definition order"""
+    if not patterns:
+        return list(SCENARIOS)
+    return [name for name in SCENARIOS if any(fnmatch.fnmatchcase(name, p) for p in patterns)]
+
+
+def percentile(ordered: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(latencies: list, statuses: Counter, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "requests": len(ordered),
+        "errors": sum(n for status, n in statuses.items() if status == "error" or int(status) >= 500),
+        "status": dict(sorted(statuses.items())),
+        "throughput": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p95_ms": ms(percentile(ordered, 95)),
+        "p99_ms": ms(percentile(ordered, 99)),
+        "max_ms": ms(ordered[-1]) if ordered else 0.0
+    }
+
+
+async def _drive(client, plan: list, concurrency: int):
+    """Send every planned request with at most concurrency in flight"""
+    latencies = []
+    statuses = Counter()
+    pending = iter(plan)
+
+    async def worker():
+        for method, url, params, body in pending:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, params=params, json=body)
+                status = str(response.status_code)
+            except httpx.HTTPError:
+                status = "error"
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+async def _run(app, ctx: dict, names: list, requests: int, concurrency: int, warmup: int, seed: int, on_result=None):
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for name in names:
+            rng = random.Random(f"{seed}:{name}")
+            build = SCENARIOS[name]
+            plan = [build(ctx, rng) for _ in range(warmup + requests)]
+            if warmup:
+                await _drive(client, plan[:warmup], concurrency)
+            results[name] = summarize(*await _drive(client, plan[warmup:], concurrency))
+            if on_result:
+                on_result(name, results[name])
+    return results
+
+
+def run_benchmark(app, ctx: dict, names: list = None, requests: int = 200, concurrency: int = 8,
+                  warmup: int = 10, seed: int = 0, on_result=None) -> dict:
+    """Drive each scenario in turn against app in-process and return per-scenario stats.
+
+    Request plans are drawn from a generator seeded per scenario, so two
+    runs with the same dataset and seed send the same requests.
+    """
+    names = names or list(SCENARIOS)
+    return asyncio.run(_run(app, ctx, names, requests, concurrency, warmup, seed, on_result))
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.15, min_delta_ms: float = 1.0) -> list:
+    """Regressions of current against baseline, both {scenario: stats}.
+
+    p95 latency counts when it grows by more than threshold and by at
+    least min_delta_ms, so sub-millisecond jitter isn't flagged.
+    Throughput counts when it drops by more than threshold.
+    """
+    regressions = []
+    for name, now in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if now["p95_ms"] > before["p95_ms"] * (1 + threshold) and now["p95_ms"] - before["p95_ms"] >= min_delta_ms:
+            regressions.append({"scenario": name, "metric": "p95_ms", "baseline": before["p95_ms"], "current": now["p95_ms"]})
+        if now["throughput"] < before["throughput"] * (1 - threshold):
+            regressions.append({"scenario": name, "metric": "throughput", "baseline": before["throughput"], "current": now["throughput"]})
+        if now["errors"] > before["errors"]:
+            regressions.append({"scenario": name, "metric": "errors", "baseline": before["errors"], "current": now["errors"]})
+    return regressions
@@ -1,21 +1,112 @@
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base, sessionmaker
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./workpay.db")
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
-    echo=False
-)
+# Pragmas run, in order, on every new SQLite connection, per storage profile.
+# busy_timeout goes first so switching the journal mode also waits for the lock.
+SQLITE_PROFILES = {
+    # WAL lets readers run alongside the writer; NORMAL only syncs at checkpoints, which WAL keeps crash-safe
+    "wal": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,
+        "cache_size": -65536,
+        "temp_store": "MEMORY",
+    },
+    # Same, but every commit is synced to disk
+    "durable": {"busy_timeout": 5000, "journal_mode": "WAL", "synchronous": "FULL"},
+    # SQLite's own defaults
+    "off": {},
+}
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "wal")
+# Overrides for single pragmas, e.g. "busy_timeout=10000,mmap_size=0"
+SQLITE_PRAGMAS = os.getenv("SQLITE_PRAGMAS", "")
+READ_POOL_SIZE = int(os.getenv("READ_POOL_SIZE", "8"))
+# Extra writer connections opened under load and closed again once returned; 0 makes the writer
+# a strict single connection, with requests waiting up to WRITE_POOL_TIMEOUT seconds for it
+WRITE_POOL_OVERFLOW = int(os.getenv("WRITE_POOL_OVERFLOW", "10"))
+WRITE_POOL_TIMEOUT = float(os.getenv("WRITE_POOL_TIMEOUT", "5"))
+# Requests with these methods get a read-only session from get_db
+READ_METHODS = ("GET", "HEAD")
+
+
+def sqlite_pragmas(profile: str = SQLITE_PROFILE, overrides: str = SQLITE_PRAGMAS) -> dict:
+    pragmas = dict(SQLITE_PROFILES[profile])
+    for item in overrides.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            pragmas[name.strip()] = value.strip()
+    return pragmas
+
+
+def is_memory_url(url: str) -> bool:
+    database = make_url(url).database
+    return url.startswith("sqlite") and database in (None, "", ":memory:")
+
+
+def make_engine(url: str, read_only: bool = False, pool_size: int = 5, max_overflow: int = 10, pragmas: dict = None,
+                pool_timeout: float = 30):
+    """Engine with the storage profile applied; read_only ones refuse writes (PRAGMA query_only)"""
+    if not url.startswith("sqlite"):
+        return create_engine(url, echo=False)
+    kwargs = {}
+    if not is_memory_url(url):
+        kwargs.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+    engine = create_engine(url, connect_args={"check_same_thread": False}, echo=False, **kwargs)
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+    return engine
+
+
+def make_write_engine(url: str, max_overflow: int = None):
+    """Writer engine: one persistent connection, plus overflow ones so a request never waits on the pool.
+
+    Writes are still single-writer: SQLite lets one connection write at a
+    time, and the others wait up to busy_timeout for the lock instead of
+    failing with "database is locked". The overflow is there because most
+    routes are async and run their queries on the event loop. A session
+    keeps its connection from its first query to commit, often across an
+    await such as an LLM call, and with no connection to spare the next
+    request would block the loop thread on the pool, so the holder could
+    never resume to return it. Set WRITE_POOL_OVERFLOW=0 for a strict
+    single connection where handlers don't hold sessions across awaits.
+    """
+    max_overflow = WRITE_POOL_OVERFLOW if max_overflow is None else max_overflow
+    return make_engine(url, pool_size=1, max_overflow=max_overflow, pool_timeout=WRITE_POOL_TIMEOUT)
+
+
+def make_read_engine(url: str, writer):
+    # An in-memory database only exists on its own connections, so it can't have a separate reader;
+    # other databases manage their own readers
+    if is_memory_url(url) or not url.startswith("sqlite"):
+        return writer
+    return make_engine(url, read_only=True, pool_size=READ_POOL_SIZE)
+
+
+engine = make_write_engine(DATABASE_URL)
+read_engine = make_read_engine(DATABASE_URL, engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
-def get_db():
-    """Dependency to get database session"""
-    db = SessionLocal()
+def get_db(request: Request):
+    """Dependency to get database session; GET and HEAD requests get a read-only one"""
+    db = (ReadSessionLocal if request.method in READ_METHODS else SessionLocal)()
     try:
         yield db
     finally:
@@ -0,0 +1,157 @@
+from sqlalchemy import select, insert, delete, exists
+from sqlalchemy.orm import Session
+from models import Task, TaskSignature, TaskSignatureBand
+from shards import shard_router
+import hashlib
+import random
+import re
+import struct
+import zlib
+
+NUM_PERM = 128
+BANDS = 32
+SHINGLE_SIZE = 5
+# Matches below this estimated Jaccard similarity are ignored
+MIN_SIMILARITY = 0.5
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Character shingles of normalized text, hashed to 32 bits"""
+    text = re.sub(r"\s+", " ", re.sub(r"[^\w\s]", "", (text or "").lower())).strip()
+    if len(text) <= size:
+        return {zlib.crc32(text.encode())}
+    return {zlib.crc32(text[i:i + size].encode()) for i in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures from fixed universal hash permutations"""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.params = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, text: str) -> tuple:
+        hashes = shingles(text)
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self.params
+        )
+
+
+def similarity(sig_a: tuple, sig_b: tuple) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+def _bucket(band: int, rows: tuple) -> int:
+    """Stable signed 64-bit key of one band, so it fits an SQLite INTEGER"""
+    digest = hashlib.blake2b(struct.pack(f"<I{len(rows)}I", band, *rows), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def pack_signature(sig: tuple) -> bytes:
+    return struct.pack(f"<{len(sig)}I", *sig)
+
+
+def unpack_signature(data: bytes) -> tuple:
+    return struct.unpack(f"<{len(data) // 4}I", data)
+
+
+class TaskDedupIndex:
+    """LSH index over task descriptions, stored next to the tasks.
+
+    Each task's signature goes in task_signatures and its bands in
+    task_signature_bands, written in the same transaction as the task;
+    signatures are computed before that transaction starts, since hashing
+    is slow and a held SQLite write lock blocks every other writer.
+    Tasks sharing any band bucket are candidates, ranked by estimated
+    similarity, so a lookup reads only the handful of tasks that collide
+    with the query, on every shard, and nothing is rebuilt in memory.
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, bands: int = BANDS):
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+
+    def buckets(self, sig: tuple) -> list:
+        return [_bucket(band, sig[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def signatures(self, descriptions) -> list:
+        """Signatures to pass to add(); pure-Python hashing, so async handlers run this in the threadpool"""
+        return [self.hasher.signature(description) for description in descriptions]
+
+    def rows_for(self, tasks):
+        """task_signatures and task_signature_bands rows for (task_id, user_id, signature, created_at) tuples"""
+        signatures, bands = [], []
+        for task_id, user_id, sig, created_at in tasks:
+            signatures.append({"task_id": task_id, "user_id": user_id, "signature": pack_signature(sig), "created_at": created_at})
+            bands.extend(
+                {"task_id": task_id, "band": band, "bucket": bucket, "user_id": user_id}
+                for band, bucket in enumerate(self.buckets(sig))
+            )
+        return signatures, bands
+
+    def add(self, db, tasks):
+        """Index (task_id, user_id, signature, created_at) tuples in db's transaction"""
+        signatures, bands = self.rows_for(tasks)
+        if signatures:
+            db.execute(insert(TaskSignature), signatures)
+            db.execute(insert(TaskSignatureBand), bands)
+
+    def remove(self, db: Session, task_id: int):
+        db.execute(delete(TaskSignatureBand).where(TaskSignatureBand.task_id == task_id))
+        db.execute(delete(TaskSignature).where(TaskSignature.task_id == task_id))
+
+    def query(self, db: Session, description: str, exclude: int = None, min_similarity: float = MIN_SIMILARITY, limit: int = 10) -> list:
+        """Near-duplicate tasks of a description on every shard, most similar first"""
+        sig = self.hasher.signature(description)
+        candidates = select(TaskSignatureBand.task_id).where(TaskSignatureBand.bucket.in_(self.buckets(sig)))
+        rows = shard_router.gather(
+            select(TaskSignature.task_id, TaskSignature.user_id, TaskSignature.created_at, TaskSignature.signature)
+            .where(TaskSignature.task_id.in_(candidates)), db
+        )
+        matches = []
+        for task_id, user_id, created_at, data in rows:
+            if task_id == exclude:
+                continue
+            score = similarity(sig, unpack_signature(data))
+            if score >= min_similarity:
+                matches.append({"task_id": task_id, "user_id": user_id, "created_at": created_at, "similarity": round(score, 3)})
+        matches.sort(key=lambda m: m["similarity"], reverse=True)
+        return matches[:limit]
+
+    def index_unsigned(self, conn, chunk_size: int = 1000, log=None) -> int:
+        """Index tasks that have no signature yet, a chunk at a time; returns how many.
+
+        Backfills tasks from before the index was stored, or bulk loads
+        that skipped it.
+        """
+        total = 0
+        last_id = 0
+        while True:
+            tasks = conn.execute(
+                select(Task.id, Task.user_id, Task.description, Task.created_at)
+                .where(Task.id > last_id, ~exists().where(TaskSignature.task_id == Task.id))
+                .order_by(Task.id).limit(chunk_size)
+            ).all()
+            if not tasks:
+                return total
+            self.add(conn, [
+                (task_id, user_id, sig, created_at)
+                for (task_id, user_id, _, created_at), sig in zip(tasks, self.signatures(row[2] for row in tasks))
+            ])
+            total += len(tasks)
+            last_id = tasks[-1][0]
+            if log:
+                log(f"Indexed {total} task signatures")
+
+
+task_dedup_index = TaskDedupIndex()
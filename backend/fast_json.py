@@ -0,0 +1,38 @@
+from fastapi.responses import StreamingResponse
+import itertools
+import orjson
+
+# Rows fetched from the cursor and encoded per streamed chunk
+STREAM_CHUNK_ROWS = 1000
+
+
+def row_dicts(result) -> list:
+    """Core result rows as plain dicts keyed by column name, without ORM objects"""
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+
+def stream_ndjson(rows) -> StreamingResponse:
+    """Stream an iterable of dicts as newline-delimited JSON.
+
+    orjson encodes datetimes itself, so rows skip pydantic and
+    jsonable_encoder; rows are pulled and encoded a chunk at a time, so
+    memory stays flat however many there are.
+    """
+    rows = iter(rows)
+
+    def body():
+        while True:
+            chunk = list(itertools.islice(rows, STREAM_CHUNK_ROWS))
+            if not chunk:
+                return
+            yield b"".join(orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE) for row in chunk)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+def stream_rows(db, stmt) -> StreamingResponse:
+    """Every row of a Core select as NDJSON, read from the cursor in chunks"""
+    result = db.execute(stmt, execution_options={"yield_per": STREAM_CHUNK_ROWS})
+    keys = list(result.keys())
+    return stream_ndjson(dict(zip(keys, row)) for row in result)
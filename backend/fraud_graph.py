@@ -0,0 +1,244 @@
+from sqlalchemy import event, select, func
+from sqlalchemy.orm import Session
+from models import User, CryptoWallet, AuditLog, FraudLog
+from log_partitions import log_storage
+import ipaddress
+import os
+import threading
+
+# Members at or above this confidence count as flagged in their cluster
+FLAGGED_CONFIDENCE = 0.5
+# Addresses or networks many unrelated users share, e.g. our reverse proxies or an office NAT; comma-separated
+FRAUD_RING_IGNORED_IPS = [
+    ipaddress.ip_network(item.strip(), strict=False)
+    for item in os.getenv("FRAUD_RING_IGNORED_IPS", "").split(",") if item.strip()
+]
+
+
+class UnionFind:
+    """Disjoint sets over hashable items with union by size and path compression"""
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def __contains__(self, item):
+        return item in self.parent
+
+    def add(self, item):
+        if item not in self.parent:
+            self.parent[item] = item
+            self.size[item] = 1
+
+    def find(self, item):
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a, b):
+        """Merge the sets of a and b, returning (root, absorbed root or None)"""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a, None
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size.pop(root_b)
+        return root_a, root_b
+
+
+def identifier_key(kind: str, value):
+    """Normalize a shared identifier, or None when it can't link users"""
+    if not value:
+        return None
+    value = str(value).strip().lower()
+    if kind == "ip":
+        try:
+            ip = ipaddress.ip_address(value)
+        except ValueError:
+            return None
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        # Private, CGNAT, link-local, reserved and loopback addresses are shared by unrelated users
+        if not ip.is_global or ip.is_multicast or any(ip in network for network in FRAUD_RING_IGNORED_IPS):
+            return None
+        return f"ip:{ip}"
+    return f"{kind}:{value}"
+
+
+class FraudRingIndex:
+    """Clusters users that share IPs or wallet identifiers.
+
+    Users and identifier keys are nodes of one union-find; linking a user
+    to an identifier merges their sets. Each root keeps its members, shared
+    identifiers and a running aggregate of member fraud confidence, so
+    cluster lookups cost one find.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.sets = UnionFind()
+            self.members = {}
+            self.identifiers = {}
+            self.user_risk = {}
+            self.risk = {}
+            self.built = False
+
+    def _add_user(self, user_id: int):
+        node = ("user", user_id)
+        if node not in self.sets:
+            self.sets.add(node)
+            self.members[node] = {user_id}
+            self.identifiers[node] = set()
+            self.risk[node] = {"sum": 0.0, "max": 0.0, "flagged": 0}
+        return node
+
+    def _add_identifier(self, key: str):
+        node = ("id", key)
+        if node not in self.sets:
+            self.sets.add(node)
+            self.members[node] = set()
+            self.identifiers[node] = {key}
+            self.risk[node] = {"sum": 0.0, "max": 0.0, "flagged": 0}
+        return node
+
+    def _union(self, a, b):
+        root, absorbed = self.sets.union(a, b)
+        if absorbed is None:
+            return
+        for attr in ("members", "identifiers"):
+            sets = getattr(self, attr)
+            small = sets.pop(absorbed)
+            sets[root] |= small
+        merged = self.risk.pop(absorbed)
+        self.risk[root]["sum"] += merged["sum"]
+        self.risk[root]["max"] = max(self.risk[root]["max"], merged["max"])
+        self.risk[root]["flagged"] += merged["flagged"]
+
+    def link(self, user_id: int, kind: str, value):
+        """Incrementally add an edge between a user and a shared identifier"""
+        key = identifier_key(kind, value)
+        with self._lock:
+            user_node = self._add_user(user_id)
+            if key:
+                self._union(user_node, self._add_identifier(key))
+
+    def record_risk(self, user_id: int, confidence: float):
+        """Fold a fraud confidence into the user's cluster aggregate"""
+        with self._lock:
+            node = self._add_user(user_id)
+            previous = self.user_risk.get(user_id, 0.0)
+            if confidence <= previous:
+                return
+            self.user_risk[user_id] = confidence
+            aggregate = self.risk[self.sets.find(node)]
+            aggregate["sum"] += confidence - previous
+            aggregate["max"] = max(aggregate["max"], confidence)
+            if previous < FLAGGED_CONFIDENCE <= confidence:
+                aggregate["flagged"] += 1
+
+    def _describe(self, root) -> dict:
+        members = self.members[root]
+        aggregate = self.risk[root]
+        return {
+            "cluster_id": min(members) if members else None,
+            "size": len(members),
+            "members": sorted(members),
+            "shared_identifiers": sorted(self.identifiers[root]),
+            "risk": {
+                "max_confidence": round(aggregate["max"], 4),
+                "mean_confidence": round(aggregate["sum"] / len(members), 4) if members else 0.0,
+                "flagged_members": aggregate["flagged"],
+            },
+        }
+
+    def cluster_of(self, user_id: int) -> dict:
+        with self._lock:
+            node = self._add_user(user_id)
+            return self._describe(self.sets.find(node))
+
+    def clusters(self, min_size: int = 2, limit: int = 50) -> list:
+        """Clusters with at least min_size users, riskiest first"""
+        with self._lock:
+            found = [
+                self._describe(root)
+                for root, members in self.members.items()
+                if len(members) >= min_size
+            ]
+        found.sort(key=lambda c: (c["risk"]["max_confidence"], c["size"]), reverse=True)
+        return found[:limit]
+
+    def build(self, db: Session):
+        """Load every stored identifier and fraud confidence from the database"""
+        self.reset()
+        for user_id, wallet_id in db.execute(select(User.id, User.wallet_id)):
+            self.link(user_id, "wallet", wallet_id)
+        for user_id, address in db.execute(select(CryptoWallet.user_id, CryptoWallet.wallet_address)):
+            self.link(user_id, "wallet", address)
+        for user_id, ip in log_storage.iter_rows(db, "audit_logs", lambda t: (
+            select(t.c.user_id, t.c.ip_address).where(t.c.ip_address.isnot(None)).distinct()
+        )):
+            self.link(user_id, "ip", ip)
+        for user_id, confidence in log_storage.iter_rows(db, "fraud_logs", lambda t: (
+            select(t.c.user_id, func.max(t.c.confidence)).group_by(t.c.user_id)
+        )):
+            self.record_risk(user_id, confidence or 0.0)
+        self.built = True
+
+    def ensure_built(self, db: Session):
+        """Build on first use; concurrent callers wait for the one build"""
+        if not self.built:
+            with self._build_lock:
+                if not self.built:
+                    self.build(db)
+
+    def apply(self, edge):
+        """Apply an edge captured by edges_for"""
+        if edge[0] == "risk":
+            self.record_risk(edge[1], edge[2])
+        else:
+            self.link(*edge[1:])
+
+
+def edges_for(obj) -> list:
+    """Index updates implied by a newly inserted row"""
+    if isinstance(obj, User):
+        return [("link", obj.id, "wallet", obj.wallet_id)]
+    if isinstance(obj, CryptoWallet):
+        return [("link", obj.user_id, "wallet", obj.wallet_address)]
+    if isinstance(obj, AuditLog):
+        return [("link", obj.user_id, "ip", obj.ip_address)]
+    if isinstance(obj, FraudLog):
+        return [("risk", obj.user_id, obj.confidence or 0.0)]
+    return []
+
+
+fraud_ring_index = FraudRingIndex()
+
+
+# Edges are captured at flush time and only applied once the rows commit
+@event.listens_for(Session, "after_flush")
+def _collect_ring_edges(session, flush_context):
+    if fraud_ring_index.built:
+        pending = session.info.setdefault("fraud_ring_pending", [])
+        for obj in session.new:
+            pending.extend(edges_for(obj))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_ring_edges(session):
+    for edge in session.info.pop("fraud_ring_pending", []):
+        fraud_ring_index.apply(edge)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_ring_edges(session):
+    session.info.pop("fraud_ring_pending", None)
@@ -0,0 +1,267 @@
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from models import Payment, FraudLog
+from collections import OrderedDict, deque, Counter
+from datetime import datetime, timedelta
+import threading
+import os
+
+# Sliding windows tracked per user
+WINDOWS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+# A window trips when count, amount sum or distinct methods reach these limits
+VELOCITY_THRESHOLDS = {
+    "minute": {"count": 5, "amount": 1000.0, "methods": 2},
+    "hour": {"count": 30, "amount": 5000.0, "methods": 3},
+    "day": {"count": 150, "amount": 20000.0, "methods": 4},
+}
+
+# Payments scoring at or above this are held instead of paid out
+HOLD_RISK_SCORE = float(os.getenv("FRAUD_HOLD_RISK_SCORE", "1.0"))
+# Users kept in memory; the least recently active are dropped past this and reloaded from the DB if they pay again
+MAX_TRACKED_USERS = int(os.getenv("FRAUD_MAX_TRACKED_USERS", "100000"))
+
+
+class SlidingWindow:
+    """Running count, amount sum and method histogram over a time span"""
+
+    def __init__(self, span: timedelta):
+        self.span = span
+        self.events = deque()
+        self.amount = 0.0
+        self.methods = Counter()
+
+    def add(self, at: datetime, amount: float, method: str):
+        self.events.append((at, amount, method))
+        self.amount += amount
+        self.methods[method] += 1
+        self.evict(at)
+
+    def evict(self, now: datetime):
+        cutoff = now - self.span
+        while self.events and self.events[0][0] <= cutoff:
+            _, amount, method = self.events.popleft()
+            self.amount -= amount
+            self.methods[method] -= 1
+            if not self.methods[method]:
+                del self.methods[method]
+
+    def snapshot(self, pending=()) -> dict:
+        """Stats for the window, plus (at, amount, method) events not added yet"""
+        return {
+            "count": len(self.events) + len(pending),
+            "amount": round(self.amount + sum(amount for _, amount, _ in pending), 2),
+            "methods": len(set(self.methods).union(method for _, _, method in pending)),
+        }
+
+
+class VelocityMonitor:
+    """Per-user payment velocity across minute, hour and day windows.
+
+    Each observation appends to the user's windows and evicts expired
+    entries from the front, so updates are amortized O(1). Users are kept
+    in last-access order; once the front user's newest payment has left
+    every window (or there are more than max_users) they are dropped, so
+    memory tracks recently active users only.
+    """
+
+    def __init__(self, windows: dict = None, thresholds: dict = None, max_users: int = MAX_TRACKED_USERS):
+        self.windows = windows or WINDOWS
+        self.thresholds = thresholds or VELOCITY_THRESHOLDS
+        self.max_users = max_users
+        self._span = max(self.windows.values())
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_tracked(self, user_id: int) -> bool:
+        return user_id in self._users
+
+    def _user_windows(self, user_id: int) -> dict:
+        windows = self._users.get(user_id)
+        if windows is None:
+            windows = {name: SlidingWindow(span) for name, span in self.windows.items()}
+            self._users[user_id] = windows
+        else:
+            self._users.move_to_end(user_id)
+        return windows
+
+    def _expire(self, now: datetime):
+        while self._users:
+            user_id, windows = next(iter(self._users.items()))
+            last = max((window.events[-1][0] for window in windows.values() if window.events), default=None)
+            if len(self._users) <= self.max_users and last is not None and now - last < self._span:
+                break
+            del self._users[user_id]
+
+    def prime(self, user_id: int, history):
+        """Seed a user's windows from (created_at, amount, method) rows"""
+        with self._lock:
+            windows = self._user_windows(user_id)
+            for at, amount, method in sorted(history, key=lambda row: row[0]):
+                for window in windows.values():
+                    window.add(at, amount or 0.0, method or "unknown")
+
+    def score(self, user_id: int, amount: float, method: str, at: datetime = None, pending=()):
+        """Return (risk_score, tripped thresholds) for a payment without recording it.
+
+        pending holds (at, amount, method) payments that count towards the
+        windows but aren't recorded yet, e.g. earlier ones in the same transaction.
+        """
+        at = at or datetime.utcnow()
+        return self.score_many(user_id, [(at, amount, method)], pending)
+
+    def score_many(self, user_id: int, payments, pending=()):
+        """score() for several (at, amount, method) payments at once, e.g. a batch"""
+        payments = [(at, amount or 0.0, method or "unknown") for at, amount, method in payments]
+        at = max(payment[0] for payment in payments)
+        events = list(pending) + payments
+        with self._lock:
+            windows = self._user_windows(user_id)
+            risk = 0.0
+            tripped = []
+            for name, window in windows.items():
+                window.evict(at)
+                stats = window.snapshot([e for e in events if e[0] > at - window.span])
+                for metric, limit in self.thresholds[name].items():
+                    ratio = stats[metric] / limit
+                    risk = max(risk, ratio)
+                    if ratio >= 1:
+                        tripped.append({
+                            "window": name,
+                            "metric": metric,
+                            "value": stats[metric],
+                            "threshold": limit,
+                        })
+        return min(risk, 1.0), tripped
+
+    def record(self, user_id: int, amount: float, method: str, at: datetime = None):
+        at = at or datetime.utcnow()
+        with self._lock:
+            for window in self._user_windows(user_id).values():
+                window.add(at, amount or 0.0, method or "unknown")
+            self._expire(at)
+
+    def observe(self, user_id: int, amount: float, method: str, at: datetime = None):
+        """Record a payment and return (risk_score, tripped thresholds)"""
+        at = at or datetime.utcnow()
+        result = self.score(user_id, amount, method, at)
+        self.record(user_id, amount, method, at)
+        return result
+
+    def stats(self, user_id: int, now: datetime = None) -> dict:
+        now = now or datetime.utcnow()
+        with self._lock:
+            windows = self._users.get(user_id)
+            if not windows:
+                return {name: {"count": 0, "amount": 0.0, "methods": 0} for name in self.windows}
+            result = {}
+            for name, window in windows.items():
+                window.evict(now)
+                result[name] = window.snapshot()
+            return result
+
+    def prune(self, now: datetime = None) -> int:
+        """Drop users with no payments left in any window"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            idle = []
+            for user_id, windows in self._users.items():
+                for window in windows.values():
+                    window.evict(now)
+                if not any(window.events for window in windows.values()):
+                    idle.append(user_id)
+            for user_id in idle:
+                del self._users[user_id]
+            return len(idle)
+
+    def reset(self):
+        with self._lock:
+            self._users.clear()
+
+
+velocity_monitor = VelocityMonitor()
+
+
+def _load_recent_payments(session: Session, user_id: int, now: datetime):
+    """Rebuild a user's windows from the DB the first time this process sees them"""
+    since = now - max(velocity_monitor.windows.values())
+    rows = session.execute(
+        select(Payment.created_at, Payment.amount, Payment.method)
+        .where(Payment.user_id == user_id, Payment.created_at > since)
+    ).all()
+    velocity_monitor.prime(user_id, [tuple(row) for row in rows])
+
+
+def _assess(session: Session, user_id: int, amounts, method: str, details: dict, now: datetime = None):
+    """Score payments of amounts against their user's windows, each one counting as an event.
+
+    Adds one FraudLog to the session when a threshold trips and returns
+    (risk_score, held) for all of them. The payments only enter the windows
+    once the session commits.
+    """
+    now = now or datetime.utcnow()
+    if not velocity_monitor.is_tracked(user_id):
+        _load_recent_payments(session, user_id, now)
+
+    pending = session.info.setdefault("velocity_pending", [])
+    payments = [(now, amount or 0.0, method or "unknown") for amount in amounts]
+    risk, tripped = velocity_monitor.score_many(
+        user_id, payments, [obs[1:] for obs in pending if obs[0] == user_id]
+    )
+    pending.extend((user_id, *payment) for payment in payments)
+    risk_score = round(risk, 4)
+    if tripped:
+        session.add(FraudLog(
+            user_id=user_id,
+            event_type="velocity_check",
+            confidence=risk_score,
+            details={**details, "amount": round(sum(payment[1] for payment in payments), 2), "tripped": tripped}
+        ))
+    return risk_score, bool(tripped) and risk >= HOLD_RISK_SCORE
+
+
+def assess_payment(session: Session, user_id: int, task_id: int, amount: float, method: str, now: datetime = None):
+    """Score a new payment; returns (risk_score, held)"""
+    return _assess(session, user_id, [amount], method, {"task_id": task_id}, now)
+
+
+def assess_batch(session: Session, user_id: int, task_ids, amounts, method: str, now: datetime = None):
+    """Score a batch's payments together, as if submitted one by one, with at most one FraudLog.
+
+    Returns one (risk_score, held) that applies to every payment in the batch.
+    """
+    return _assess(session, user_id, amounts, method, {"task_ids": list(task_ids)}, now)
+
+
+def score_payment(session: Session, payment: Payment, now: datetime = None):
+    """Set risk_score (and hold) on a pending Payment"""
+    payment.risk_score, held = assess_payment(
+        session, payment.user_id, payment.task_id, payment.amount, payment.method or "bKash", now
+    )
+    if held:
+        payment.status = "held"
+
+
+@event.listens_for(Session, "before_flush")
+def _score_new_payments(session, flush_context, instances):
+    """Run velocity checks on every Payment about to be inserted"""
+    now = datetime.utcnow()
+    for obj in list(session.new):
+        if isinstance(obj, Payment):
+            score_payment(session, obj, now)
+
+
+# Payments are only recorded in the windows once their rows commit
+@event.listens_for(Session, "after_commit")
+def _record_payments(session):
+    for user_id, at, amount, method in session.info.pop("velocity_pending", []):
+        velocity_monitor.record(user_id, amount, method, at)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_payments(session):
+    session.info.pop("velocity_pending", None)
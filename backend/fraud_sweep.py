@@ -0,0 +1,257 @@
+from sqlalchemy import select, insert, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from models import User, Payment, FraudLog, FraudSweep
+from database import DATABASE_URL, SessionLocal, make_engine
+from shards import SHARD_URLS
+from fraud_monitor import VELOCITY_THRESHOLDS
+from fraud_graph import fraud_ring_index
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import groupby
+from collections import Counter
+from statistics import median
+import json
+import os
+import uuid
+
+CHECKPOINT_PATH = os.getenv("FRAUD_SWEEP_CHECKPOINT", "./fraud_sweep.checkpoint.json")
+CHUNK_SIZE = int(os.getenv("FRAUD_SWEEP_CHUNK_SIZE", "2000"))
+FLAG_THRESHOLD = 0.8
+
+# Engines reused by each pool worker for all chunks it scans, one per database
+_worker_engines = {}
+
+
+def _max_burst(payments, span: timedelta) -> int:
+    """Most payments inside any span-long window"""
+    best = 0
+    start = 0
+    for end in range(len(payments)):
+        while payments[end][3] - payments[start][3] > span:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+def _max_methods(payments, span: timedelta) -> int:
+    """Most distinct methods inside any span-long window"""
+    methods = Counter()
+    best = 0
+    start = 0
+    for end in range(len(payments)):
+        methods[payments[end][2]] += 1
+        while payments[end][3] - payments[start][3] > span:
+            methods[payments[start][2]] -= 1
+            if not methods[payments[start][2]]:
+                del methods[payments[start][2]]
+            start += 1
+        best = max(best, len(methods))
+    return best
+
+
+def score_user_payments(payments) -> tuple:
+    """Rule-based risk for one user's payments, ordered by created_at.
+
+    Each payment is an (amount, status, method, created_at) tuple and each
+    signal is scored against its limit. Returns (risk 0-1, red_flags).
+    """
+    if not payments:
+        return 0.0, []
+
+    signals = {}
+
+    hour_limit = VELOCITY_THRESHOLDS["hour"]["count"]
+    burst = _max_burst(payments, timedelta(hours=1))
+    signals["payment_burst"] = (burst / hour_limit, {"max_per_hour": burst})
+
+    method_limit = VELOCITY_THRESHOLDS["day"]["methods"]
+    methods = _max_methods(payments, timedelta(days=1))
+    signals["method_hopping"] = (methods / method_limit, {"max_methods_per_day": methods})
+
+    if len(payments) >= 5:
+        failed = sum(1 for p in payments if p[1] in ("failed", "refunded"))
+        signals["high_failure_rate"] = (failed / len(payments), {"failed": failed})
+
+        amounts = [p[0] or 0.0 for p in payments]
+        typical = median(amounts)
+        if typical > 0:
+            spike = max(amounts) / typical
+            signals["amount_spike"] = (spike / 10, {"max_to_median": round(spike, 2)})
+
+    risk = min(max(score for score, _ in signals.values()), 1.0)
+    flags = [
+        {"type": name, **detail}
+        for name, (score, detail) in signals.items()
+        if score >= FLAG_THRESHOLD
+    ]
+    return round(risk, 4), flags
+
+
+def scan_chunk(conn, first_id: int, last_id: int) -> list:
+    """Score every user in [first_id, last_id] with one grouped query.
+
+    Returns FraudLog rows ready for bulk insert.
+    """
+    stmt = (
+        select(Payment.user_id, Payment.amount, Payment.status, Payment.method, Payment.created_at)
+        .where(Payment.user_id >= first_id, Payment.user_id <= last_id)
+        .order_by(Payment.user_id, Payment.created_at)
+        .execution_options(yield_per=5000)
+    )
+    rows = []
+    for user_id, group in groupby(conn.execute(stmt), key=lambda row: row[0]):
+        payments = [tuple(row[1:]) for row in group]
+        risk, flags = score_user_payments(payments)
+        if risk >= FLAG_THRESHOLD:
+            rows.append({
+                "user_id": user_id,
+                "event_type": "fraud_sweep",
+                "confidence": risk,
+                "details": {"red_flags": flags, "payments_scanned": len(payments)}
+            })
+    return rows
+
+
+def _worker_engine(database_url: str):
+    if database_url not in _worker_engines:
+        # Workers only scan, so they take read-only connections and never hold up the writer
+        _worker_engines[database_url] = make_engine(database_url, read_only=True)
+    return _worker_engines[database_url]
+
+
+def scan_shards(database_urls, first_id: int, last_id: int) -> list:
+    """scan_chunk on each database in turn; each user's payments live on just one of them"""
+    rows = []
+    for database_url in database_urls:
+        with _worker_engine(database_url).connect() as conn:
+            rows.extend(scan_chunk(conn, first_id, last_id))
+    return rows
+
+
+def _scan_chunk_worker(args):
+    database_urls, first_id, last_id, user_count = args
+    return first_id, last_id, user_count, scan_shards(database_urls, first_id, last_id)
+
+
+def iter_user_chunks(db: Session, after_id: int = 0, chunk_size: int = CHUNK_SIZE):
+    """Yield (first_id, last_id, count) ranges of user ids in id order"""
+    ids = db.execute(
+        select(User.id).where(User.id > after_id).order_by(User.id).execution_options(yield_per=chunk_size)
+    ).scalars()
+    chunk = []
+    for user_id in ids:
+        chunk.append(user_id)
+        if len(chunk) == chunk_size:
+            yield chunk[0], chunk[-1], len(chunk)
+            chunk = []
+    if chunk:
+        yield chunk[0], chunk[-1], len(chunk)
+
+
+def load_checkpoint(path: str = CHECKPOINT_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(state: dict, path: str = CHECKPOINT_PATH):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _record_progress(db: Session, state: dict):
+    """Stage the sweep's state in db's transaction, alongside the chunk's fraud logs"""
+    stmt = sqlite_insert(FraudSweep).values(sweep_id=state["sweep_id"], state=state, updated_at=datetime.utcnow())
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[FraudSweep.sweep_id],
+        set_={"state": stmt.excluded.state, "updated_at": stmt.excluded.updated_at}
+    ))
+
+
+def run_sweep(
+    workers: int = None,
+    chunk_size: int = CHUNK_SIZE,
+    resume: bool = True,
+    checkpoint_path: str = CHECKPOINT_PATH,
+    database_url: str = DATABASE_URL,
+    shard_urls=SHARD_URLS,
+    session_factory=SessionLocal,
+    on_progress=None,
+):
+    """Scan all users for fraud and bulk insert FraudLog rows.
+
+    Chunks are scanned in a process pool (or inline when workers == 0)
+    and committed in id order, each in one transaction with the sweep's
+    progress, so a resumed sweep starts right after the last chunk whose
+    logs were written. The checkpoint file names the sweep to resume and
+    may lag the database by a chunk. Each chunk reads payments from the
+    main database and every shard.
+    """
+    state = load_checkpoint(checkpoint_path) if resume else None
+    if not state or state.get("completed"):
+        state = {
+            "sweep_id": uuid.uuid4().hex,
+            "started_at": datetime.utcnow().isoformat(),
+            "last_user_id": 0,
+            "users_scanned": 0,
+            "flagged": 0,
+            "completed": False,
+        }
+
+    db = session_factory()
+    try:
+        committed = db.get(FraudSweep, state["sweep_id"])
+        if committed:
+            state = dict(committed.state)
+        state["total_users"] = state["users_scanned"] + db.execute(
+            select(func.count(User.id)).where(User.id > state["last_user_id"])
+        ).scalar()
+        chunks = [
+            ((database_url, *shard_urls), first_id, last_id, count)
+            for first_id, last_id, count in iter_user_chunks(db, state["last_user_id"], chunk_size)
+        ]
+
+        if workers == 0:
+            results = (
+                (first_id, last_id, count,
+                 scan_chunk(db.connection(), first_id, last_id) + scan_shards(shard_urls, first_id, last_id))
+                for _, first_id, last_id, count in chunks
+            )
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            results = pool.map(_scan_chunk_worker, chunks)
+
+        try:
+            for first_id, last_id, count, rows in results:
+                if rows:
+                    for row in rows:
+                        row["details"]["sweep_id"] = state["sweep_id"]
+                    db.execute(insert(FraudLog), rows)
+                state["last_user_id"] = last_id
+                state["users_scanned"] += count
+                state["flagged"] += len(rows)
+                _record_progress(db, state)
+                db.commit()
+                if fraud_ring_index.built:
+                    for row in rows:
+                        fraud_ring_index.record_risk(row["user_id"], row["confidence"])
+                save_checkpoint(state, checkpoint_path)
+                if on_progress:
+                    on_progress(dict(state))
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+
+        state["completed"] = True
+        state["finished_at"] = datetime.utcnow().isoformat()
+        _record_progress(db, state)
+        db.commit()
+        save_checkpoint(state, checkpoint_path)
+        return state
+    finally:
+        db.close()
@@ -0,0 +1,31 @@
+import threading
+
+
+class Lazy:
+    """Proxy that builds its object with factory on first attribute access.
+
+    Keeps heavy imports and clients (the Groq SDK, the bcrypt context) out of
+    app startup. The object is built once, even if first used from several
+    threads at a time.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._built = False
+        self._value = None
+
+    def get(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self._value = self._factory()
+                    self._built = True
+        return self._value
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
@@ -0,0 +1,325 @@
+from sqlalchemy import MetaData, Table, Column, Index, create_engine, select, insert, delete, func, tuple_
+from database import engine as default_engine
+from models import AuditLog, FraudLog
+from datetime import datetime
+import gzip
+import heapq
+import json
+import os
+import shutil
+import threading
+
+LOG_STORAGE_DIR = os.getenv("LOG_STORAGE_DIR", "./log_partitions")
+LOG_RETENTION_MONTHS = int(os.getenv("LOG_RETENTION_MONTHS", "6"))
+
+# Hot tables stay in the main database; closed months move to one SQLite file per month
+LOG_TABLES = {
+    "audit_logs": AuditLog.__table__,
+    "fraud_logs": FraudLog.__table__,
+}
+
+
+def month_key(at: datetime) -> str:
+    return f"{at.year:04d}-{at.month:02d}"
+
+
+def month_start(key: str) -> datetime:
+    year, month = key.split("-")
+    return datetime(int(year), int(month), 1)
+
+
+def shift_month(key: str, months: int) -> str:
+    year, month = map(int, key.split("-"))
+    index = year * 12 + month - 1 + months
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def next_month(key: str) -> str:
+    return shift_month(key, 1)
+
+
+def months_between(start: datetime, end: datetime) -> list:
+    """Month keys covering [start, end], newest first"""
+    keys = []
+    key = month_key(start)
+    while key <= month_key(end):
+        keys.append(key)
+        key = next_month(key)
+    return keys[::-1]
+
+
+def partition_table(table, schema: str = None):
+    """Copy of a log table and its indexes, without foreign keys, which can't cross database files"""
+    part = Table(
+        table.name, MetaData(),
+        *[Column(c.name, c.type, primary_key=c.primary_key) for c in table.c],
+        schema=schema
+    )
+    for index in table.indexes:
+        Index(index.name, *[part.c[c.name] for c in index.columns], unique=index.unique)
+    return part
+
+
+def create_partition_indexes(conn, schema: str = None):
+    """Add the hot tables' indexes to whichever log tables a partition has"""
+    for table in LOG_TABLES.values():
+        if conn.dialect.has_table(conn, table.name, schema=schema):
+            for index in partition_table(table, schema=schema).indexes:
+                index.create(conn, checkfirst=True)
+
+
+def _serialize(row: dict) -> dict:
+    row = dict(row)
+    if isinstance(row.get("created_at"), datetime):
+        row["created_at"] = row["created_at"].isoformat()
+    return row
+
+
+class LogStorage:
+    """Monthly partitioned storage for audit and fraud logs.
+
+    rotate() moves rows from closed months out of the hot tables into
+    per-month SQLite files, archive() compacts partitions past the
+    retention horizon into gzipped NDJSON, and query() reads only the
+    partitions and archives that overlap the requested range.
+    """
+
+    def __init__(self, engine=None, root: str = LOG_STORAGE_DIR):
+        self.engine = engine or default_engine
+        self.root = root
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def partition_path(self, key: str) -> str:
+        return os.path.join(self.root, "partitions", f"{key}.db")
+
+    def archive_path(self, kind: str, key: str) -> str:
+        return os.path.join(self.root, "archive", f"{kind}-{key}.ndjson.gz")
+
+    def partitions(self) -> list:
+        directory = os.path.join(self.root, "partitions")
+        if not os.path.isdir(directory):
+            return []
+        return sorted((name[:-3] for name in os.listdir(directory) if name.endswith(".db")), reverse=True)
+
+    def archives(self, kind: str) -> list:
+        directory = os.path.join(self.root, "archive")
+        if not os.path.isdir(directory):
+            return []
+        prefix, suffix = f"{kind}-", ".ndjson.gz"
+        return sorted(
+            (name[len(prefix):-len(suffix)] for name in os.listdir(directory)
+             if name.startswith(prefix) and name.endswith(suffix)),
+            reverse=True
+        )
+
+    def _partition_engine(self, key: str):
+        with self._lock:
+            if key not in self._engines:
+                engine = create_engine(f"sqlite:///{self.partition_path(key)}")
+                # Partitions written before they carried indexes get them on first open
+                with engine.begin() as conn:
+                    create_partition_indexes(conn)
+                self._engines[key] = engine
+            return self._engines[key]
+
+    def _dispose(self, key: str):
+        with self._lock:
+            engine = self._engines.pop(key, None)
+        if engine is not None:
+            engine.dispose()
+
+    def rotate(self, now: datetime = None) -> dict:
+        """Move rows older than the current month into their monthly partition files"""
+        cutoff = month_start(month_key(now or datetime.utcnow()))
+        os.makedirs(os.path.join(self.root, "partitions"), exist_ok=True)
+        moved = {}
+        for kind, table in LOG_TABLES.items():
+            with self.engine.connect() as conn:
+                keys = conn.execute(
+                    select(func.strftime("%Y-%m", table.c.created_at)).where(table.c.created_at < cutoff).distinct()
+                ).scalars().all()
+            for key in sorted(keys):
+                moved[f"{kind}/{key}"] = self._move_month(table, key)
+        return moved
+
+    def _move_month(self, table, key: str) -> int:
+        start, end = month_start(key), month_start(next_month(key))
+        part_table = partition_table(table, schema="part")
+        with self.engine.connect() as conn:
+            conn.exec_driver_sql("ATTACH DATABASE ? AS part", (self.partition_path(key),))
+            try:
+                part_table.create(conn, checkfirst=True)
+                create_partition_indexes(conn, schema="part")
+                in_month = (table.c.created_at >= start) & (table.c.created_at < end)
+                conn.execute(insert(part_table).from_select(
+                    [c.name for c in table.c], select(table).where(in_month)
+                ))
+                count = conn.execute(delete(table).where(in_month)).rowcount
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.exec_driver_sql("DETACH DATABASE part")
+        return count
+
+    def archive(self, retention_months: int = LOG_RETENTION_MONTHS, now: datetime = None) -> list:
+        """Compact partitions older than the retention horizon into gzipped NDJSON"""
+        horizon = shift_month(month_key(now or datetime.utcnow()), -retention_months)
+        os.makedirs(os.path.join(self.root, "archive"), exist_ok=True)
+
+        archived = []
+        for key in self.partitions():
+            if key >= horizon:
+                continue
+            engine = self._partition_engine(key)
+            with engine.connect() as conn:
+                for kind, table in LOG_TABLES.items():
+                    if not engine.dialect.has_table(conn, table.name):
+                        continue
+                    path = self.archive_path(kind, key)
+                    # Late rows for an archived month are appended as another gzip member
+                    if os.path.exists(path):
+                        shutil.copyfile(path, f"{path}.tmp")
+                    with gzip.open(f"{path}.tmp", "at") as out:
+                        for row in conn.execute(select(table).order_by(table.c.created_at)).mappings():
+                            out.write(json.dumps(_serialize(row), default=str) + "\n")
+                    os.replace(f"{path}.tmp", path)
+            self._dispose(key)
+            os.remove(self.partition_path(key))
+            archived.append(key)
+        return archived
+
+    def _read_partition(self, key: str, table, user_id, start, end, limit, columns=None, before=None):
+        engine = self._partition_engine(key)
+        with engine.connect() as conn:
+            if not engine.dialect.has_table(conn, table.name):
+                return []
+            return [_serialize(row) for row in conn.execute(
+                _range_query(table, user_id, start, end, columns, before).limit(limit)
+            ).mappings()]
+
+    def _stream_partition(self, key: str, table, user_id, start, end, columns, before):
+        engine = self._partition_engine(key)
+        with engine.connect() as conn:
+            if not engine.dialect.has_table(conn, table.name):
+                return
+            result = conn.execution_options(yield_per=1000).execute(
+                _range_query(table, user_id, start, end, columns, before)
+            ).mappings()
+            for row in result:
+                yield _serialize(row)
+
+    def _read_archive(self, kind: str, key: str, user_id, start, end, columns=None, before=None):
+        start_iso = start.isoformat() if start else None
+        end_iso = end.isoformat() if end else None
+        before = (before[0].isoformat(), before[1]) if before else None
+        rows = []
+        with gzip.open(self.archive_path(kind, key), "rt") as f:
+            for line in f:
+                row = json.loads(line)
+                if user_id is not None and row["user_id"] != user_id:
+                    continue
+                if (start_iso and row["created_at"] < start_iso) or (end_iso and row["created_at"] > end_iso):
+                    continue
+                if before and (row["created_at"], row["id"]) >= before:
+                    continue
+                rows.append({name: row[name] for name in columns} if columns else row)
+        return rows
+
+    def query(self, db, kind: str, user_id: int = None, start: datetime = None, end: datetime = None,
+              limit: int = 100, columns: tuple = None, before: tuple = None) -> list:
+        """Newest-first rows across hot table, partitions and archives.
+
+        Only months overlapping [start, end] are opened. Without a start,
+        partitions are walked newest first until the limit is met and
+        archives are left alone. columns (names, including id and
+        created_at) narrows what is selected and returned; before, a
+        (created_at, id) pair, keeps only rows that sort after it.
+        """
+        table = LOG_TABLES[kind]
+        rows = [_serialize(row) for row in db.execute(
+            _range_query(table, user_id, start, end, columns, before).limit(limit)
+        ).mappings()]
+
+        wanted = set(months_between(start, end or datetime.utcnow())) if start else None
+        for key in self.partitions():
+            if wanted is not None:
+                if key not in wanted:
+                    continue
+            elif end and key > month_key(end):
+                continue
+            elif len(rows) >= limit:
+                # Older partitions can't displace anything on a full page
+                rows.sort(key=_sort_key, reverse=True)
+                if rows[limit - 1]["created_at"] >= month_start(next_month(key)).isoformat():
+                    break
+            rows.extend(self._read_partition(key, table, user_id, start, end, limit, columns, before))
+
+        if wanted is not None:
+            for key in self.archives(kind):
+                if key in wanted:
+                    rows.extend(self._read_archive(kind, key, user_id, start, end, columns, before))
+
+        rows.sort(key=_sort_key, reverse=True)
+        return rows[:limit]
+
+    def iter_query(self, db, kind: str, user_id: int = None, start: datetime = None, end: datetime = None,
+                   columns: tuple = None, before: tuple = None):
+        """Every row query() would page through, newest first, read lazily.
+
+        The hot table and each partition are streamed from their cursors
+        and merged, so a full dump holds one chunk per source in memory.
+        """
+        table = LOG_TABLES[kind]
+        hot = db.execute(
+            _range_query(table, user_id, start, end, columns, before),
+            execution_options={"yield_per": 1000}
+        ).mappings()
+        sources = [(_serialize(row) for row in hot)]
+        wanted = set(months_between(start, end or datetime.utcnow())) if start else None
+        for key in self.partitions():
+            if (wanted is not None and key not in wanted) or (end and key > month_key(end)):
+                continue
+            sources.append(self._stream_partition(key, table, user_id, start, end, columns, before))
+        if wanted is not None:
+            for key in self.archives(kind):
+                if key in wanted:
+                    sources.append(iter(sorted(
+                        self._read_archive(kind, key, user_id, start, end, columns, before),
+                        key=_sort_key, reverse=True
+                    )))
+        return heapq.merge(*sources, key=_sort_key, reverse=True)
+
+    def iter_rows(self, db, kind: str, build):
+        """Run build(table) against the hot table and every partition file"""
+        table = LOG_TABLES[kind]
+        yield from db.execute(build(table))
+        for key in self.partitions():
+            engine = self._partition_engine(key)
+            with engine.connect() as conn:
+                if engine.dialect.has_table(conn, table.name):
+                    yield from conn.execute(build(table))
+
+
+def _sort_key(row):
+    return row["created_at"], row["id"]
+
+
+def _range_query(table, user_id, start, end, columns=None, before=None):
+    stmt = select(*[table.c[name] for name in columns] if columns else [table]).order_by(
+        table.c.created_at.desc(), table.c.id.desc()
+    )
+    if before:
+        stmt = stmt.where(tuple_(table.c.created_at, table.c.id) < tuple_(*before))
+    if user_id is not None:
+        stmt = stmt.where(table.c.user_id == user_id)
+    if start:
+        stmt = stmt.where(table.c.created_at >= start)
+    if end:
+        stmt = stmt.where(table.c.created_at <= end)
+    return stmt
+
+
+log_storage = LogStorage()
@@ -1,8 +1,13 @@
+import time
+
+# Startup timings count from here, the first thing the app module runs
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, init_db, Base
 from models import User, Task, Payment, FraudLog, ChatMessage, Achievement, AIInsight, Report, AuditLog, Integration, CryptoWallet, NFTBadge
-from routes.auth import router as auth_router
+from routes.auth import router as auth_router, hasher_stats
 from routes.tasks import router as tasks_router
 from routes.payments import router as payments_router
 from routes.ai_intelligence import router as ai_router
@@ -12,19 +17,67 @@ from routes.security import router as security_router
 from routes.integrations import router as integrations_router
 from routes.web3 import router as web3_router
 from routes.fraud import router as fraud_router
-from contextlib import asynccontextmanager
+from audit_sink import audit_sink
+from rate_limit import RateLimitMiddleware, rate_limiter
+from metrics import MetricsMiddleware, register_gauge, render as render_metrics
+from auth_cache import token_cache
+from response_cache import response_cache
+from webhooks import webhook_dispatcher
+from scheduler import automation_scheduler
+from shards import shard_router
+from migrations import upgrade
+from contextlib import asynccontextmanager, contextmanager
+import logging
+import os
+
+logger = logging.getLogger(__name__)
 
-# Initialize database
-Base.metadata.create_all(bind=engine)
+# Seconds spent in each startup phase, exported as workpay_startup_seconds
+startup_timings = {"import": time.perf_counter() - _import_started}
+
+@contextmanager
+def startup_phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = time.perf_counter() - started
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    init_db()
+    # The schema only changes through the explicit migration step (python -m scripts.migrate);
+    # AUTO_MIGRATE=1 also runs it here, for a single local instance
+    if os.getenv("AUTO_MIGRATE", "0") == "1":
+        with startup_phase("migrate"):
+            upgrade(shard_router)
+    # Leases keep concurrent dispatchers apart; WEBHOOK_DISPATCHER=0 turns delivery off here
+    if os.getenv("WEBHOOK_DISPATCHER", "1") == "1":
+        with startup_phase("webhook_dispatcher"):
+            webhook_dispatcher.start()
+    # Leases keep a job from running twice; AUTOMATION_SCHEDULER=0 turns scheduling off here
+    if os.getenv("AUTOMATION_SCHEDULER", "1") == "1":
+        with startup_phase("automation_scheduler"):
+            automation_scheduler.start()
+    # Moves outbox events, fraud logs and accruals written on extra shards into the catalog;
+    # reruns are harmless, so SHARD_RELAY=0 only turns it off here
+    if shard_router.sharded and os.getenv("SHARD_RELAY", "1") == "1":
+        with startup_phase("shard_relay"):
+            shard_router.start_relay()
+    logger.info("Started in %.3fs (%s)", sum(startup_timings.values()), ", ".join(
+        f"{name} {seconds:.3f}s" for name, seconds in startup_timings.items()
+    ))
     yield
     # Shutdown
+    automation_scheduler.stop()
+    shard_router.stop_relay()
+    await webhook_dispatcher.stop()
+    audit_sink.stop()
+
+app = FastAPI(title="WorkPayAI", version="2.0.0", description="Comprehensive fintech platform with AI intelligence", lifespan=lifespan)
 
-app = FastAPI(title="WorkPayAI", version="2.0.0", description="Comprehensive fintech platform with AI intelligence")
+# Token-bucket limits on LLM-backed routes (added first so CORS wraps its 429s)
+app.add_middleware(RateLimitMiddleware)
 
 # CORS middleware
 app.add_middleware(
@@ -35,6 +88,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so rate-limited and CORS responses are measured too
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth_router, prefix="/api")
 app.include_router(tasks_router, prefix="/api")
@@ -49,7 +105,28 @@ app.include_router(fraud_router, prefix="/api")
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "WorkPayAI", "version": "2.0.0"}
+    return {"status": "healthy", "service": "WorkPayAI", "version": "2.0.0", "password_hasher": hasher_stats()}
+
+register_gauge("workpay_password_hasher", "Password hashing pool state", lambda: {
+    (key,): value for key, value in hasher_stats().items()
+}, ("stat",))
+register_gauge("workpay_cache", "In-process cache counters", lambda: {
+    ("token", "hits"): token_cache.hits, ("token", "misses"): token_cache.misses, ("token", "entries"): len(token_cache),
+    ("response", "hits"): response_cache.hits, ("response", "misses"): response_cache.misses, ("response", "entries"): len(response_cache),
+}, ("cache", "stat"))
+register_gauge("workpay_audit_queue_depth", "Audit events waiting to be written", lambda: {(): audit_sink.pending()})
+register_gauge("workpay_rate_limit_buckets", "Live token buckets", lambda: {(): len(rate_limiter)})
+register_gauge("workpay_startup_seconds", "Seconds spent in each startup phase", lambda: {
+    (name,): seconds for name, seconds in startup_timings.items()
+}, ("phase",))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request, SQL and LLM metrics"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# Building the app, its middleware and routes
+startup_timings["app"] = time.perf_counter() - _import_started - startup_timings["import"]
 
 if __name__ == "__main__":
     import uvicorn
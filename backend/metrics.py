@@ -0,0 +1,306 @@
+from collections import Counter as StatementCounter
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from urllib.parse import parse_qs
+import bisect
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# The same SELECT run this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+# Allows ?profile=1 / X-Profile: 1 to return a sampled stack profile instead of the response
+METRICS_PROFILING = os.getenv("METRICS_PROFILING", "0") == "1"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: tuple = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def count(self, labels: tuple) -> int:
+        series = self._series.get(labels)
+        return series[1] if series else 0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (buckets, count, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, buckets):
+                    cumulative += n
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labels, labels)} {count}")
+        return lines
+
+
+http_requests = Counter("workpay_http_requests_total", "HTTP requests", ("method", "route", "status"))
+http_latency = Histogram("workpay_http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+request_queries = Histogram("workpay_http_request_sql_queries", "SQL statements per request", ("route",), QUERY_COUNT_BUCKETS)
+request_sql_time = Histogram("workpay_http_request_sql_seconds", "Time in SQL per request", ("route",))
+sql_latency = Histogram("workpay_sql_statement_duration_seconds", "SQL statement latency", ("operation",))
+llm_calls = Counter("workpay_llm_calls_total", "LLM API calls", ("operation", "outcome"))
+llm_latency = Histogram("workpay_llm_call_duration_seconds", "LLM API call latency", ("operation",),
+                        (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+n_plus_one = Counter("workpay_n_plus_one_suspected_total", "Requests repeating one SELECT at least N_PLUS_ONE_THRESHOLD times", ("route",))
+
+METRICS = [http_requests, http_latency, request_queries, request_sql_time, sql_latency, llm_calls, llm_latency, n_plus_one]
+# name -> (help, callable returning {labels tuple: value}, label names) for values owned elsewhere
+_gauges = {}
+
+
+def register_gauge(name: str, help: str, collect, labels: tuple = ()):
+    _gauges[name] = (help, collect, labels)
+
+
+def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, (help, collect, labels) in sorted(_gauges.items()):
+        try:
+            values = collect()
+        except Exception:
+            logger.exception("Gauge %s failed", name)
+            continue
+        lines.extend([f"# HELP {name} {help}", f"# TYPE {name} gauge"])
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{name}{_labels(labels, label_values)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class RequestStats:
+    __slots__ = ("sql_count", "sql_time", "statements", "llm_calls", "llm_time")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.statements = StatementCounter()
+        self.llm_calls = 0
+        self.llm_time = 0.0
+
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+def current_stats():
+    return _current.get()
+
+
+# Listening on Engine covers the app engine in database.py and any other engine in the process
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    sql_latency.observe((statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER",), elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_time += elapsed
+        stats.statements[statement] += 1
+
+
+@contextmanager
+def llm_call(operation: str):
+    """Time an LLM API call and count it by outcome"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        llm_calls.inc((operation, outcome))
+        llm_latency.observe((operation,), elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.llm_calls += 1
+            stats.llm_time += elapsed
+
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval into collapsed-stack counts"""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = StatementCounter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self, limit: int = 200) -> str:
+        """Flame-graph friendly "stack count" lines, heaviest first"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common(limit)) + "\n"
+
+
+_reported_n_plus_one = set()
+
+
+def _wants_profile(scope) -> bool:
+    if not METRICS_PROFILING:
+        return False
+    if parse_qs(scope.get("query_string", b"").decode()).get("profile") == ["1"]:
+        return True
+    return any(name == b"x-profile" and value == b"1" for name, value in scope.get("headers", []))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, SQL and LLM usage per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = [500]
+        profiler = SamplingProfiler(threading.get_ident()) if _wants_profile(scope) else None
+        buffered = []
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                timing = 'db;dur=%.1f;desc="%d queries", llm;dur=%.1f' % (
+                    stats.sql_time * 1000, stats.sql_count, stats.llm_time * 1000
+                )
+                message = dict(message, headers=[*message.get("headers", []), (b"server-timing", timing.encode())])
+            if profiler is not None:
+                buffered.append(message)
+            else:
+                await send(message)
+
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            if profiler is not None:
+                profiler.stop()
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            self._record(scope["method"], route, status[0], elapsed, stats)
+
+        if profiler is not None:
+            body = profiler.collapsed().encode()
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"x-profiled-status", str(status[0]).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+
+    def _record(self, method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+        http_requests.inc((method, route, str(status)))
+        http_latency.observe((method, route), elapsed)
+        request_queries.observe((route,), stats.sql_count)
+        request_sql_time.observe((route,), stats.sql_time)
+
+        repeated = [s for s, n in stats.statements.items()
+                    if n >= N_PLUS_ONE_THRESHOLD and s.lstrip().upper().startswith("SELECT")]
+        if repeated:
+            n_plus_one.inc((route,))
+            for statement in repeated:
+                if (route, statement) not in _reported_n_plus_one and len(_reported_n_plus_one) < 1000:
+                    _reported_n_plus_one.add((route, statement))
+                    logger.warning("Possible N+1 on %s %s: %dx %s", method, route,
+                                   stats.statements[statement], " ".join(statement.split())[:300])
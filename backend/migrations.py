@@ -0,0 +1,137 @@
+from sqlalchemy import inspect, select, insert
+from database import Base
+from models import SchemaMigration
+from search import recreate_fts
+from dedup_index import task_dedup_index
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def create_indexes(*names):
+    """Migration step creating the named model indexes on whichever of their tables exist.
+
+    create_all only builds indexes with a new table, so indexes added to
+    existing models reach existing databases through a step like this.
+    """
+    def apply(conn):
+        existing = set(inspect(conn).get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            for index in table.indexes:
+                if index.name in names:
+                    index.create(conn, checkfirst=True)
+    return apply
+
+
+def add_columns(table_name, *names, defaults=None):
+    """Migration step adding the named model columns to table_name where the table lacks them.
+
+    defaults maps a column to the SQL literal existing rows get, e.g. {"status": "'minted'"}.
+    """
+    defaults = defaults or {}
+
+    def apply(conn):
+        inspector = inspect(conn)
+        if table_name not in inspector.get_table_names():
+            return
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        table = Base.metadata.tables[table_name]
+        for name in names:
+            if name in existing:
+                continue
+            ddl = f"ALTER TABLE {table_name} ADD COLUMN {name} {table.c[name].type.compile(dialect=conn.dialect)}"
+            if name in defaults:
+                ddl += f" DEFAULT {defaults[name]}"
+            conn.exec_driver_sql(ddl)
+    return apply
+
+
+# Applied in order, once per database; append new steps and never edit released ones
+def index_task_signatures(conn):
+    """Migration step storing near-duplicate signatures for tasks that have none"""
+    if "task_signatures" in inspect(conn).get_table_names():
+        task_dedup_index.index_unsigned(conn, log=logger.info)
+
+
+
+def unique_nft_badges(conn):
+    """Migration step keeping each user's first copy of a badge, then allowing only one"""
+    if "nft_badges" not in inspect(conn).get_table_names():
+        return
+    conn.exec_driver_sql(
+        "DELETE FROM nft_badges WHERE id NOT IN (SELECT MIN(id) FROM nft_badges GROUP BY user_id, badge_name)"
+    )
+    create_indexes("ix_nft_badges_user_id_badge_name")(conn)
+
+MIGRATIONS = [
+    ("0001", "Per-user listing, leaderboard and payment lookup indexes", create_indexes(
+        "ix_tasks_user_id_created_at",
+        "ix_payments_user_id_created_at",
+        "ix_payments_task_id",
+        "ix_chat_messages_user_id_created_at",
+        "ix_fraud_logs_user_id_created_at",
+        "ix_audit_logs_user_id_created_at",
+        "ix_ai_insights_user_id_created_at",
+        "ix_users_points",
+        "ix_achievements_user_id",
+        "ix_reports_user_id",
+        "ix_integrations_user_id",
+        "ix_crypto_wallets_user_id",
+        "ix_nft_badges_user_id",
+        "ix_webhook_subscriptions_user_id",
+    )),
+    ("0002", "Batch minting columns on nft_badges", add_columns(
+        "nft_badges", "content_hash", "token_uri", "status", "tx_hash",
+        # Badges from before batch minting were minted one at a time
+        defaults={"status": "'minted'"},
+    )),
+    ("0003", "Index user_id in full-text search tables", recreate_fts),
+    ("0004", "Near-duplicate signatures for existing tasks", index_task_signatures),
+    ("0005", "Webhook dispatcher polling indexes", create_indexes(
+        "ix_webhook_outbox_pending",
+        "ix_webhook_deliveries_status_next_attempt_at",
+        "ix_webhook_deliveries_outbox_id",
+    )),
+    ("0006", "One badge of each name per user", unique_nft_badges),
+]
+
+
+def applied_versions(engine) -> set:
+    with engine.begin() as conn:
+        SchemaMigration.__table__.create(conn, checkfirst=True)
+        return set(conn.execute(select(SchemaMigration.version)).scalars())
+
+
+def migrate(engine, log=logger.info) -> list:
+    """Apply pending migrations to engine's database, each in its own transaction.
+
+    Returns the versions applied; a database that is up to date is left untouched.
+    """
+    done = applied_versions(engine)
+    versions = []
+    for version, description, apply in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            apply(conn)
+            # Another process may have applied it concurrently; its steps are idempotent
+            conn.execute(insert(SchemaMigration).prefix_with("OR IGNORE").values(version=version, description=description))
+        log(f"Applied migration {version}: {description}")
+        versions.append(version)
+    return versions
+
+
+def upgrade(router, log=logger.info) -> dict:
+    """The schema step: create missing tables and apply pending migrations on the catalog and every shard.
+
+    Returns the versions applied per shard name. The app runs this at startup
+    only with AUTO_MIGRATE=1; otherwise run scripts.migrate before deploying.
+    """
+    Base.metadata.create_all(bind=router.catalog)
+    router.create_all()
+    return {
+        name: migrate(engine, log=lambda message, name=name: log(f"{name}: {message}"))
+        for name, engine in router.engines.items()
+    }
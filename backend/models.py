@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Text, Boolean, JSON, LargeBinary, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -13,7 +13,7 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     wallet_id = Column(String, unique=True, nullable=False)
     credit_score = Column(Float, default=500)
-    points = Column(Integer, default=0)
+    points = Column(Integer, default=0, index=True)
     two_factor_enabled = Column(Boolean, default=False)
     role = Column(String, default="user")  # admin, manager, user
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -28,6 +28,7 @@ class User(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (Index("ix_tasks_user_id_created_at", "user_id", "created_at", "id"),)
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -43,15 +44,34 @@ class Task(Base):
     user = relationship("User", back_populates="tasks")
     payments = relationship("Payment", back_populates="task", cascade="all, delete-orphan")
 
+class TaskSignature(Base):
+    """MinHash signature of a task description, for near-duplicate lookups"""
+    __tablename__ = "task_signatures"
+    
+    task_id = Column(Integer, ForeignKey("tasks.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    signature = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime)
+
+class TaskSignatureBand(Base):
+    """One LSH band bucket of a task's signature; tasks sharing a bucket are duplicate candidates"""
+    __tablename__ = "task_signature_bands"
+    
+    task_id = Column(Integer, ForeignKey("tasks.id"), primary_key=True)
+    band = Column(Integer, primary_key=True)
+    bucket = Column(BigInteger, nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (Index("ix_payments_user_id_created_at", "user_id", "created_at", "id"),)
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False, index=True)
     amount = Column(Float, nullable=False)
     method = Column(String, default="bKash")  # bKash, Nagad, card, crypto
-    status = Column(String, default="pending")  # pending, completed, failed, refunded
+    status = Column(String, default="pending")  # pending, held, completed, failed, refunded
     risk_score = Column(Float, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -61,6 +81,7 @@ class Payment(Base):
 
 class FraudLog(Base):
     __tablename__ = "fraud_logs"
+    __table_args__ = (Index("ix_fraud_logs_user_id_created_at", "user_id", "created_at", "id"),)
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -73,6 +94,7 @@ class FraudLog(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (Index("ix_chat_messages_user_id_created_at", "user_id", "created_at", "id"),)
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -88,7 +110,7 @@ class Achievement(Base):
     __tablename__ = "achievements"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     badge_name = Column(String, nullable=False)  # Task Master, Speed Demon, Perfect Score, Leadership
     points_earned = Column(Integer, default=0)
     unlocked_at = Column(DateTime, default=datetime.utcnow)
@@ -97,6 +119,7 @@ class Achievement(Base):
 
 class AIInsight(Base):
     __tablename__ = "ai_insights"
+    __table_args__ = (Index("ix_ai_insights_user_id_created_at", "user_id", "created_at", "id"),)
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -109,7 +132,7 @@ class Report(Base):
     __tablename__ = "reports"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     title = Column(String, nullable=False)
     report_type = Column(String, nullable=False)  # performance, compliance, roi
     data = Column(JSON, nullable=False)
@@ -117,6 +140,7 @@ class Report(Base):
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (Index("ix_audit_logs_user_id_created_at", "user_id", "created_at", "id"),)
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -132,7 +156,7 @@ class Integration(Base):
     __tablename__ = "integrations"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     integration_type = Column(String, nullable=False)  # slack, teams, calendar, zapier
     config = Column(JSON, nullable=False)
     is_active = Column(Boolean, default=True)
@@ -142,7 +166,7 @@ class CryptoWallet(Base):
     __tablename__ = "crypto_wallets"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     wallet_address = Column(String, unique=True, nullable=False)
     balance = Column(Float, default=0)
     wallet_type = Column(String)  # metamask, walletconnect
@@ -150,10 +174,155 @@ class CryptoWallet(Base):
 
 class NFTBadge(Base):
     __tablename__ = "nft_badges"
+    __table_args__ = (Index("ix_nft_badges_user_id_badge_name", "user_id", "badge_name", unique=True),)
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     badge_name = Column(String, nullable=False)
     token_id = Column(String, unique=True, nullable=False)
     nft_metadata = Column(JSON, nullable=False)  # Renamed from metadata to avoid SQLAlchemy conflict
+    content_hash = Column(String, nullable=True)  # sha256 of canonical nft_metadata
+    token_uri = Column(String, nullable=True)
+    status = Column(String, default="minted")  # pending, minted
+    tx_hash = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class NFTMetadata(Base):
+    __tablename__ = "nft_metadata"
+    
+    content_hash = Column(String, primary_key=True)
+    token_uri = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class IdSequence(Base):
+    __tablename__ = "id_sequences"
+    
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+class ShardPlacement(Base):
+    __tablename__ = "shard_placements"
+
+    # Users without a row are on shard0, where all data lived before sharding
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    shard = Column(String, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class WebhookSubscription(Base):
+    __tablename__ = "webhook_subscriptions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    event = Column(String, nullable=False)  # task.submitted, task.verified, payment.completed, * for all
+    url = Column(String, nullable=False)
+    secret = Column(String, nullable=False)
+    is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+class WebhookOutbox(Base):
+    __tablename__ = "webhook_outbox"
+    # Only undispatched rows are indexed, so the dispatcher's poll stays small however long the history
+    __table_args__ = (Index("ix_webhook_outbox_pending", "id", sqlite_where=text("dispatched_at IS NULL")),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    event = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    dispatched_at = Column(DateTime, nullable=True)  # set once fanned out to deliveries
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class WebhookDelivery(Base):
+    __tablename__ = "webhook_deliveries"
+    __table_args__ = (
+        Index("ix_webhook_deliveries_status_next_attempt_at", "status", "next_attempt_at"),
+        Index("ix_webhook_deliveries_outbox_id", "outbox_id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    outbox_id = Column(Integer, ForeignKey("webhook_outbox.id"), nullable=False)
+    subscription_id = Column(Integer, ForeignKey("webhook_subscriptions.id"), nullable=False)
+    status = Column(String, default="pending")  # pending, delivered, dead, cancelled
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    lease_owner = Column(String, nullable=True)
+    lease_until = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    delivered_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class WebhookDeadLetter(Base):
+    __tablename__ = "webhook_dead_letters"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    delivery_id = Column(Integer, ForeignKey("webhook_deliveries.id"), nullable=False)
+    subscription_id = Column(Integer, ForeignKey("webhook_subscriptions.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    url = Column(String, nullable=False)
+    event = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, default=0)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Automation(Base):
+    __tablename__ = "automations"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    automation_type = Column(String, nullable=False)  # report, review, sync
+    frequency = Column(String, nullable=False)  # hourly, daily, weekly, monthly or a 5-field cron expression
+    config = Column(JSON, nullable=True)
+    is_active = Column(Boolean, default=True)
+    next_run_at = Column(DateTime, nullable=False, index=True)
+    last_run_at = Column(DateTime, nullable=True)
+    last_status = Column(String, nullable=True)  # succeeded, failed
+    last_error = Column(String, nullable=True)
+    run_count = Column(Integer, default=0)
+    lease_owner = Column(String, nullable=True)
+    lease_until = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class RewardAccrual(Base):
+    __tablename__ = "reward_accruals"
+    __table_args__ = (UniqueConstraint("user_id", "source", "source_id"),)
+    
+    # Append-only: rows are never updated or deleted
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    source = Column(String, nullable=False)  # achievement, task_payment, settlement
+    source_id = Column(Integer, nullable=False)
+    amount = Column(Float, nullable=False)  # WPAY; settlement rows move this much from pending to balance
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class RewardBalance(Base):
+    __tablename__ = "reward_balances"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    pending = Column(Float, default=0)
+    settled = Column(Float, default=0)
+    lifetime_earned = Column(Float, default=0)
+    transactions = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class RewardSettlement(Base):
+    __tablename__ = "reward_settlements"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_count = Column(Integer, default=0)
+    total = Column(Float, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class FraudSweep(Base):
+    __tablename__ = "fraud_sweeps"
+
+    # Progress committed with each chunk's fraud logs; the checkpoint file only names the sweep to resume
+    sweep_id = Column(String, primary_key=True)
+    state = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    
+    version = Column(String, primary_key=True)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
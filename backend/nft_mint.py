@@ -0,0 +1,176 @@
+from sqlalchemy import select, insert, update, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import NFTBadge, NFTMetadata
+from sequences import allocate_ids
+from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+NFT_MINT_BATCH_SIZE = int(os.getenv("NFT_MINT_BATCH_SIZE", "500"))
+TOKEN_SEQUENCE = "nft_token"
+
+
+def format_token_id(n: int) -> str:
+    # Zero-padded so string order matches mint order
+    return f"NFT_{n:012d}"
+
+
+def badge_metadata(badge_name: str) -> dict:
+    """Metadata shared by every copy of a badge; mint time lives on the row, not here"""
+    return {
+        "name": badge_name,
+        "description": f"WorkPayAI Achievement: {badge_name}",
+        "image": f"ipfs://QmNFT{badge_name}",
+        "attributes": [
+            {"trait_type": "Achievement", "value": badge_name}
+        ]
+    }
+
+
+def content_hash(metadata: dict) -> str:
+    canonical = json.dumps(metadata, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class LocalChain:
+    """Stand-in for IPFS pinning and the chain's batch mint call.
+
+    Swap in a real backend with the same pin/mint methods through
+    mint_queue.backend.
+    """
+
+    def pin(self, metadata: dict) -> str:
+        return f"ipfs://local-{content_hash(metadata)[:46]}"
+
+    def mint(self, mints: list) -> str:
+        digest = hashlib.sha256(",".join(m["token_id"] for m in mints).encode()).hexdigest()
+        return f"0x{digest}"
+
+
+class MintQueue:
+    """Collects badge awards and mints them in batches.
+
+    flush() skips badges the user already holds, including ones a
+    concurrent flush inserts first, pins each distinct
+    metadata document once (by content hash), reserves a block of token
+    IDs, and bulk-inserts the batch as pending before handing it to the
+    chain in one call. Batches the chain rejects stay pending and are
+    picked up by retry_pending().
+    """
+
+    def __init__(self, backend=None, batch_size: int = NFT_MINT_BATCH_SIZE):
+        self.backend = backend or LocalChain()
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, user_id: int, badge_name: str):
+        with self._lock:
+            self._pending[(user_id, badge_name)] = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _drain(self) -> list:
+        with self._lock:
+            awards = list(self._pending)
+            self._pending.clear()
+        return awards
+
+    def flush(self, db) -> list:
+        """Mint everything queued so far; returns the new mints"""
+        awards = self._drain()
+        minted = []
+        for i in range(0, len(awards), self.batch_size):
+            minted.extend(self._mint_batch(db, awards[i:i + self.batch_size]))
+        return minted
+
+    def _token_uris(self, db, documents: dict) -> dict:
+        known = dict(db.execute(
+            select(NFTMetadata.content_hash, NFTMetadata.token_uri)
+            .where(NFTMetadata.content_hash.in_(list(documents)))
+        ).all())
+        missing = [h for h in documents if h not in known]
+        if missing:
+            now = datetime.utcnow()
+            pinned = {h: self.backend.pin(documents[h]) for h in missing}
+            db.execute(insert(NFTMetadata), [
+                {"content_hash": h, "token_uri": uri, "created_at": now} for h, uri in pinned.items()
+            ])
+            known.update(pinned)
+        return known
+
+    def _mint_batch(self, db, awards: list) -> list:
+        held = set(db.execute(
+            select(NFTBadge.user_id, NFTBadge.badge_name)
+            .where(tuple_(NFTBadge.user_id, NFTBadge.badge_name).in_(awards))
+        ).tuples())
+        awards = [a for a in awards if a not in held]
+        if not awards:
+            return []
+
+        documents = {}
+        hashes = {}
+        for _, badge_name in awards:
+            if badge_name not in hashes:
+                metadata = badge_metadata(badge_name)
+                hashes[badge_name] = content_hash(metadata)
+                documents[hashes[badge_name]] = metadata
+        uris = self._token_uris(db, documents)
+
+        now = datetime.utcnow()
+        rows = [
+            {
+                "user_id": user_id,
+                "badge_name": badge_name,
+                "token_id": format_token_id(n),
+                "nft_metadata": documents[hashes[badge_name]],
+                "content_hash": hashes[badge_name],
+                "token_uri": uris[hashes[badge_name]],
+                "status": "pending",
+                "created_at": now,
+            }
+            for (user_id, badge_name), n in zip(awards, allocate_ids(db, TOKEN_SEQUENCE, len(awards)))
+        ]
+        # Another flush may have inserted the same award since the check above
+        stmt = sqlite_insert(NFTBadge).on_conflict_do_nothing(index_elements=[NFTBadge.user_id, NFTBadge.badge_name])
+        inserted = set(db.execute(stmt.returning(NFTBadge.token_id), rows).scalars())
+        db.commit()
+        rows = [r for r in rows if r["token_id"] in inserted]
+        return self._submit(db, rows) if rows else []
+
+    def _submit(self, db, rows: list) -> list:
+        try:
+            tx_hash = self.backend.mint([
+                {"token_id": r["token_id"], "owner": r["user_id"], "token_uri": r["token_uri"]} for r in rows
+            ])
+        except Exception:
+            logger.exception("Chain mint of %d tokens failed; left pending", len(rows))
+            return rows
+        db.execute(
+            update(NFTBadge).where(NFTBadge.token_id.in_([r["token_id"] for r in rows]))
+            .values(status="minted", tx_hash=tx_hash)
+        )
+        db.commit()
+        for r in rows:
+            r.update(status="minted", tx_hash=tx_hash)
+        return rows
+
+    def retry_pending(self, db) -> list:
+        """Resubmit mints the chain hasn't confirmed"""
+        rows = [dict(r) for r in db.execute(
+            select(NFTBadge.user_id, NFTBadge.badge_name, NFTBadge.token_id, NFTBadge.token_uri)
+            .where(NFTBadge.status == "pending").order_by(NFTBadge.token_id)
+        ).mappings()]
+        minted = []
+        for i in range(0, len(rows), self.batch_size):
+            minted.extend(self._submit(db, rows[i:i + self.batch_size]))
+        return minted
+
+
+mint_queue = MintQueue()
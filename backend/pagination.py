@@ -0,0 +1,56 @@
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from datetime import datetime
+from fast_json import row_dicts
+import base64
+import json
+
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(row: dict) -> str:
+    """Opaque cursor for the (created_at, id) position just after row"""
+    created_at = row["created_at"]
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = json.dumps([created_at, row["id"]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """(created_at, id) from a cursor; a malformed one is a 400"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset(stmt, created_at, id_column, cursor: str = None):
+    """Order stmt newest first on (created_at, id), starting after cursor"""
+    stmt = stmt.order_by(created_at.desc(), id_column.desc())
+    if cursor:
+        stmt = stmt.where(tuple_(created_at, id_column) < tuple_(*decode_cursor(cursor)))
+    return stmt
+
+
+def page_of(rows: list, limit: int) -> dict:
+    """A page from up to limit + 1 rows; the extra row only signals that more exist"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "results": rows,
+        "limit": limit,
+        "next_cursor": encode_cursor(rows[-1]) if has_more else None,
+    }
+
+
+def keyset_page(db, stmt, limit: int) -> dict:
+    """Run a keyset-ordered select for one page of results"""
+    limit = clamp_limit(limit)
+    return page_of(row_dicts(db.execute(stmt.limit(limit + 1))), limit)
@@ -0,0 +1,77 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import json
+import re
+import threading
+
+# Statements worth explaining; writes without a WHERE and DDL have no plan to improve
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "WITH")
+# "SCAN tasks" reads every row; "SCAN tasks USING INDEX ..." and virtual (FTS) tables don't
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+
+class QueryCapture:
+    """Records each distinct SQL statement run on any engine, with one sample of its parameters.
+
+    Use as a context manager around a workload, then hand the capture to
+    advise(); save()/load() keep it for replaying against another database.
+    """
+
+    def __init__(self):
+        self.statements = {}
+        self._lock = threading.Lock()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith(EXPLAINABLE):
+            return
+        with self._lock:
+            entry = self.statements.get(statement)
+            if entry is None:
+                self.statements[statement] = {"parameters": list(parameters or ()), "count": 1}
+            else:
+                entry["count"] += 1
+
+    def __enter__(self):
+        event.listen(Engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Engine, "before_cursor_execute", self._record)
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.statements, f, indent=2, default=str)
+
+    @classmethod
+    def load(cls, path: str) -> "QueryCapture":
+        capture = cls()
+        with open(path) as f:
+            capture.statements = json.load(f)
+        return capture
+
+
+def explain(conn, statement: str, parameters) -> list:
+    """SQLite's EXPLAIN QUERY PLAN detail lines for a statement"""
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", tuple(parameters))
+    return [row[-1] for row in rows]
+
+
+def advise(engine, capture: QueryCapture) -> list:
+    """Captured statements whose plan scans a whole table, most frequently run first.
+
+    Statements that no longer parse against engine's schema are skipped.
+    """
+    findings = []
+    with engine.connect() as conn:
+        for statement, entry in capture.statements.items():
+            try:
+                plan = explain(conn, statement, entry["parameters"])
+            except Exception:
+                conn.rollback()
+                continue
+            scans = [m.group(1) for m in map(FULL_SCAN.match, plan) if m]
+            if scans:
+                findings.append({"statement": " ".join(statement.split()), "count": entry["count"],
+                                 "scans": scans, "plan": plan})
+    findings.sort(key=lambda f: f["count"], reverse=True)
+    return findings
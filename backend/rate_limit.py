@@ -0,0 +1,140 @@
+from collections import OrderedDict
+from routes.auth import token_subject
+import json
+import math
+import os
+import threading
+import time
+
+# (method, path prefix, cost) for routes that call the LLM; first match wins
+RATE_LIMIT_RULES = [
+    ("POST", "/api/tasks/verify/", 5),
+    ("POST", "/api/fraud/detect/", 5),
+    ("POST", "/api/ai/chat/send", 2),
+    ("POST", "/api/ai/", 5),
+]
+
+# Per client per route group
+USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", "20"))
+USER_RATE = float(os.getenv("RATE_LIMIT_USER_RATE", "0.5"))
+# Shared by all clients of a route group, guarding the upstream LLM quota
+ROUTE_BURST = float(os.getenv("RATE_LIMIT_ROUTE_BURST", "200"))
+ROUTE_RATE = float(os.getenv("RATE_LIMIT_ROUTE_RATE", "10"))
+MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+
+
+class TokenBucketLimiter:
+    """Token buckets refilled lazily on access.
+
+    Buckets live in an OrderedDict in last-access order. A bucket idle long
+    enough to refill completely is the same as a new one, so stale buckets
+    are dropped from the front as we go. Each check is amortized O(1).
+    """
+
+    def __init__(self, max_buckets: int = MAX_BUCKETS, clock=time.monotonic):
+        self.max_buckets = max_buckets
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bucket(self, key, capacity: float, rate: float, now: float):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return [capacity, now, capacity / rate]
+        tokens, updated, idle_ttl = bucket
+        return [min(capacity, tokens + (now - updated) * rate), now, idle_ttl]
+
+    def _expire(self, now: float):
+        while self._buckets:
+            key, (_, updated, idle_ttl) = next(iter(self._buckets.items()))
+            if now - updated < idle_ttl and len(self._buckets) <= self.max_buckets:
+                break
+            del self._buckets[key]
+
+    def acquire(self, limits: list, cost: float = 1.0) -> float:
+        """Take cost tokens from every (key, capacity, rate) bucket, or none of them.
+
+        Returns 0 when allowed, otherwise seconds until the request would fit.
+        """
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            buckets = [(key, self._bucket(key, capacity, rate, now), rate) for key, capacity, rate in limits]
+            wait = max(
+                (cost - bucket[0]) / rate if bucket[0] < cost else 0.0
+                for _, bucket, rate in buckets
+            )
+            for key, bucket, _ in buckets:
+                if not wait:
+                    bucket[0] -= cost
+                self._buckets[key] = bucket
+                self._buckets.move_to_end(key)
+            return wait
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+rate_limiter = TokenBucketLimiter()
+
+
+def _client_key(scope) -> str:
+    """Verified token subject, else the client address.
+
+    Nothing the caller can vary freely (unverified tokens, query or path
+    parameters such as user_id) is part of the key, or every request could
+    get a fresh bucket.
+    """
+    for name, value in scope.get("headers", []):
+        if name == b"authorization" and value.lower().startswith(b"bearer "):
+            subject = token_subject(value[7:].decode("latin-1"))
+            if subject:
+                return f"sub:{subject}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying per-client and per-route token buckets"""
+
+    def __init__(self, app, limiter: TokenBucketLimiter = None, rules: list = None):
+        self.app = app
+        self.limiter = rate_limiter if limiter is None else limiter
+        self.rules = RATE_LIMIT_RULES if rules is None else rules
+
+    def _match(self, method: str, path: str):
+        for rule_method, prefix, cost in self.rules:
+            if method == rule_method and path.startswith(prefix):
+                return prefix, cost
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        matched = self._match(scope["method"], scope["path"])
+        if matched is None:
+            return await self.app(scope, receive, send)
+
+        group, cost = matched
+        wait = self.limiter.acquire([
+            (("client", _client_key(scope), group), USER_BURST, USER_RATE),
+            (("route", group), ROUTE_BURST, ROUTE_RATE),
+        ], cost)
+        if not wait:
+            return await self.app(scope, receive, send)
+
+        body = json.dumps({"detail": "Rate limit exceeded"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(wait)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,151 @@
+from collections import OrderedDict
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class ResponseCache:
+    """Bounded LRU of rendered JSON responses with per-entry TTL and tags.
+
+    invalidate(tag) drops every entry carrying the tag and bumps the tag's
+    generation; a response computed across an invalidation isn't stored,
+    so a slow read can't put stale data back. Each process has its own
+    cache, so TTLs bound staleness for writes made by other workers.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._by_tag = {}
+        self._generations = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def generations(self, tags: list) -> tuple:
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def put(self, key, body: bytes, etag: str, ttl: float, tags: list, generations: tuple = None):
+        with self._lock:
+            if generations is not None and generations != tuple(self._generations.get(tag, 0) for tag in tags):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self.clock() + ttl, body, etag, tags)
+            self._bytes += len(body)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, body, _, tags = self._entries.pop(key)
+        self._bytes -= len(body)
+        for tag in tags:
+            keys = self._by_tag.get(tag)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                for key in list(self._by_tag.get(tag, ())):
+                    self._remove(key)
+
+    def invalidate_user(self, user_id: int, *tags):
+        self.invalidate(f"user:{user_id}", *tags)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+response_cache = ResponseCache()
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [t.strip() for t in header.split(",")]
+
+
+def _respond(request: Request, body: bytes, etag: str, state: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "X-Cache": state}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def cached(ttl: float, tags: list = (), cache: ResponseCache = None):
+    """Cache a JSON GET endpoint by path and query string.
+
+    tags are format strings over the endpoint's arguments, e.g.
+    "user:{user_id}". Responses carry an ETag and a matching
+    If-None-Match gets a 304.
+    """
+    def decorator(endpoint):
+        signature = inspect.signature(endpoint)
+        takes_request = "request" in signature.parameters
+
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            store = response_cache if cache is None else cache
+            request = kwargs["request"] if takes_request else kwargs.pop("cache_request")
+            query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+            key = f"{request.url.path}?{query}"
+
+            hit = store.get(key)
+            if hit is not None:
+                return _respond(request, hit[0], hit[1], "HIT")
+
+            entry_tags = [tag.format(**kwargs) for tag in tags]
+            generations = store.generations(entry_tags)
+            result = await endpoint(*args, **kwargs)
+            if isinstance(result, Response):
+                return result
+            body = json.dumps(jsonable_encoder(result), separators=(",", ":")).encode()
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            store.put(key, body, etag, ttl, entry_tags, generations)
+            return _respond(request, body, etag, "MISS")
+
+        if not takes_request:
+            wrapper.__signature__ = signature.replace(parameters=[
+                *signature.parameters.values(),
+                inspect.Parameter("cache_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+            ])
+        return wrapper
+    return decorator
@@ -0,0 +1,153 @@
+from sqlalchemy import select, insert, update, delete, func, bindparam, case
+from sqlalchemy.exc import IntegrityError
+from models import RewardAccrual, RewardBalance, RewardSettlement, CryptoWallet
+from datetime import datetime
+import os
+
+WPAY_USD_RATE = float(os.getenv("WPAY_USD_RATE", "0.45"))
+# WPAY credited per unit of a paid task's amount
+TASK_REWARD_RATE = float(os.getenv("WPAY_TASK_REWARD_RATE", "0.02"))
+ACHIEVEMENT_BASE_REWARD = float(os.getenv("WPAY_ACHIEVEMENT_BASE", "5"))
+ACHIEVEMENT_POINT_REWARD = float(os.getenv("WPAY_PER_ACHIEVEMENT_POINT", "0.25"))
+SETTLEMENT_CHUNK = 500
+
+
+def achievement_reward(points_earned: int) -> float:
+    return ACHIEVEMENT_BASE_REWARD + (points_earned or 0) * ACHIEVEMENT_POINT_REWARD
+
+
+def task_reward(amount: float) -> float:
+    return (amount or 0) * TASK_REWARD_RATE
+
+
+def _bump(db, user_id: int, **deltas):
+    values = {name: getattr(RewardBalance, name) + delta for name, delta in deltas.items()}
+    values["updated_at"] = datetime.utcnow()
+    stmt = update(RewardBalance).where(RewardBalance.user_id == user_id).values(**values)
+    if db.execute(stmt).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(RewardBalance).values(
+                user_id=user_id, pending=0, settled=0, lifetime_earned=0, transactions=0
+            ))
+    except IntegrityError:
+        pass  # Created concurrently
+    db.execute(stmt)
+
+
+def accrue(db, user_id: int, source: str, source_id: int, amount: float) -> bool:
+    """Credit pending WPAY in the caller's transaction; a repeat of the same source is ignored"""
+    amount = round(amount, 8)
+    if amount <= 0:
+        return False
+    try:
+        with db.begin_nested():
+            db.execute(insert(RewardAccrual).values(
+                user_id=user_id, source=source, source_id=source_id,
+                amount=amount, created_at=datetime.utcnow()
+            ))
+    except IntegrityError:
+        return False
+    # A shard session keeps the accrual on the user's shard; the shard relay credits the balance
+    if db.get_bind(RewardAccrual) is db.get_bind(RewardBalance):
+        _bump(db, user_id, pending=amount, lifetime_earned=amount, transactions=1)
+    return True
+
+
+def summary(db, user_id: int) -> dict:
+    """Reward totals from the per-user running balance (a primary key read)"""
+    balance = db.get(RewardBalance, user_id)
+    earned = balance.lifetime_earned if balance else 0.0
+    return {
+        "user_id": user_id,
+        "wpay_earned": earned,
+        "wpay_to_usd": earned * WPAY_USD_RATE,
+        "wpay_balance": balance.settled if balance else 0.0,
+        "pending_rewards": balance.pending if balance else 0.0,
+        "total_transactions": balance.transactions if balance else 0
+    }
+
+
+def _primary_wallets(db, user_ids: list) -> dict:
+    return dict(db.execute(
+        select(CryptoWallet.user_id, func.min(CryptoWallet.id))
+        .where(CryptoWallet.user_id.in_(user_ids))
+        .group_by(CryptoWallet.user_id)
+    ).all())
+
+
+def settle(db, min_amount: float = 0, now: datetime = None) -> dict:
+    """Move pending rewards into settled balances and each user's primary wallet"""
+    now = now or datetime.utcnow()
+    due = db.execute(
+        select(RewardBalance.user_id, RewardBalance.pending)
+        .where(RewardBalance.pending > 0, RewardBalance.pending >= min_amount)
+        .order_by(RewardBalance.user_id)
+    ).all()
+    if not due:
+        return {"settlement_id": None, "users": 0, "total": 0.0}
+
+    settlement = RewardSettlement(user_count=len(due), total=round(sum(p for _, p in due), 8), created_at=now)
+    db.add(settlement)
+    db.flush()
+
+    balances = RewardBalance.__table__
+    wallets = CryptoWallet.__table__
+    for i in range(0, len(due), SETTLEMENT_CHUNK):
+        chunk = due[i:i + SETTLEMENT_CHUNK]
+        db.execute(insert(RewardAccrual), [
+            {"user_id": user_id, "source": "settlement", "source_id": settlement.id,
+             "amount": amount, "created_at": now}
+            for user_id, amount in chunk
+        ])
+        # Relative updates, so credits landing mid-settlement stay pending
+        db.execute(
+            update(balances).where(balances.c.user_id == bindparam("b_user_id")).values(
+                pending=balances.c.pending - bindparam("b_amount"),
+                settled=balances.c.settled + bindparam("b_amount"),
+                updated_at=now
+            ),
+            [{"b_user_id": user_id, "b_amount": amount} for user_id, amount in chunk]
+        )
+        primary = _primary_wallets(db, [user_id for user_id, _ in chunk])
+        if primary:
+            db.execute(
+                update(wallets).where(wallets.c.id == bindparam("w_id"))
+                .values(balance=wallets.c.balance + bindparam("w_amount")),
+                [{"w_id": primary[user_id], "w_amount": amount} for user_id, amount in chunk if user_id in primary]
+            )
+    db.commit()
+    return {"settlement_id": settlement.id, "users": settlement.user_count, "total": settlement.total}
+
+
+def rebuild_balances(db) -> int:
+    """Recompute every running balance and primary wallet from the accrual ledger"""
+    is_settlement = RewardAccrual.source == "settlement"
+    rows = db.execute(
+        select(
+            RewardAccrual.user_id,
+            func.sum(case((is_settlement, 0), else_=RewardAccrual.amount)),
+            func.sum(case((is_settlement, RewardAccrual.amount), else_=0)),
+            func.sum(case((is_settlement, 0), else_=1))
+        ).group_by(RewardAccrual.user_id)
+    ).all()
+    now = datetime.utcnow()
+    db.execute(delete(RewardBalance))
+    if rows:
+        db.execute(insert(RewardBalance), [
+            {"user_id": user_id, "pending": round(earned - settled, 8), "settled": settled,
+             "lifetime_earned": earned, "transactions": count, "updated_at": now}
+            for user_id, earned, settled, count in rows
+        ])
+        settled = {user_id: s for user_id, _, s, _ in rows}
+        wallets = CryptoWallet.__table__
+        for i in range(0, len(rows), SETTLEMENT_CHUNK):
+            primary = _primary_wallets(db, [row[0] for row in rows[i:i + SETTLEMENT_CHUNK]])
+            if primary:
+                db.execute(
+                    update(wallets).where(wallets.c.id == bindparam("w_id")).values(balance=bindparam("w_balance")),
+                    [{"w_id": wallet_id, "w_balance": settled[user_id]} for user_id, wallet_id in primary.items()]
+                )
+    db.commit()
+    return len(rows)
@@ -1,25 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from models import Task, User, AIInsight, ChatMessage
-from database import get_db
-from groq import Groq
+from shards import get_user_db
+from metrics import llm_call
+from search import search
+from fast_json import stream_rows
+from pagination import keyset, keyset_page
+from lazy import Lazy
 import os
 import json
 from datetime import datetime, timedelta
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
-# Initialize Groq client with graceful fallback
+# Initialize Groq client with graceful fallback, on first use so startup doesn't load the SDK
 def get_groq_client():
     api_key = os.getenv("GROQ_API_KEY")
     if api_key:
+        from groq import Groq
         return Groq(api_key=api_key)
     return None
 
-groq_client = get_groq_client()
+groq_client = Lazy(get_groq_client)
 
 @router.post("/predict/{user_id}")
-async def predict_completion(user_id: int, db: Session = Depends(get_db)):
+async def predict_completion(user_id: int, db: Session = Depends(get_user_db)):
     """Predict task completion rates and trends"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -28,14 +35,15 @@ async def predict_completion(user_id: int, db: Session = Depends(get_db)):
     tasks = db.query(Task).filter(Task.user_id == user_id).all()
     task_data = json.dumps([{"status": t.verification_status, "score": t.ai_score} for t in tasks[-10:]], default=str)
     
-    message = groq_client.messages.create(
-        model="mixtral-8x7b-32768",
-        max_tokens=500,
-        temperature=0.5,
-        messages=[
-            {
-                "role": "user",
-                "content": f"""Analyze task completion trends. Return JSON with:
+    with llm_call("predict_completion"):
+        message = groq_client.messages.create(
+            model="mixtral-8x7b-32768",
+            max_tokens=500,
+            temperature=0.5,
+            messages=[
+                {
+                    "role": "user",
+                    "content": f"""Analyze task completion trends. Return JSON with:
 - completion_rate: float (0-1)
 - predicted_revenue: float
 - trend: 'improving' | 'stable' | 'declining'
@@ -44,9 +52,9 @@ async def predict_completion(user_id: int, db: Session = Depends(get_db)):
 Task history: {task_data}
 
 Respond ONLY with JSON."""
-            }
-        ]
-    )
+                }
+            ]
+        )
     
     result = json.loads(message.content[0].text)
     insight = AIInsight(user_id=user_id, insight_type="prediction", data=result, confidence=0.85)
@@ -56,7 +64,7 @@ Respond ONLY with JSON."""
     return result
 
 @router.post("/anomalies/{user_id}")
-async def detect_anomalies(user_id: int, db: Session = Depends(get_db)):
+async def detect_anomalies(user_id: int, db: Session = Depends(get_user_db)):
     """Detect unusual work patterns and anomalies"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -73,14 +81,15 @@ async def detect_anomalies(user_id: int, db: Session = Depends(get_db)):
             "status": task.verification_status
         })
     
-    message = groq_client.messages.create(
-        model="mixtral-8x7b-32768",
-        max_tokens=500,
-        temperature=0.5,
-        messages=[
-            {
-                "role": "user",
-                "content": f"""Detect anomalies in this work pattern. Return JSON with:
+    with llm_call("detect_anomalies"):
+        message = groq_client.messages.create(
+            model="mixtral-8x7b-32768",
+            max_tokens=500,
+            temperature=0.5,
+            messages=[
+                {
+                    "role": "user",
+                    "content": f"""Detect anomalies in this work pattern. Return JSON with:
 - anomalies: list of {{"type": str, "severity": 0-1}}
 - normal_pattern: description
 - unusual_activity: bool
@@ -89,9 +98,9 @@ async def detect_anomalies(user_id: int, db: Session = Depends(get_db)):
 Timeline: {json.dumps(timeline)}
 
 Respond ONLY with JSON."""
-            }
-        ]
-    )
+                }
+            ]
+        )
     
     result = json.loads(message.content[0].text)
     insight = AIInsight(user_id=user_id, insight_type="anomaly", data=result, confidence=0.8)
@@ -101,20 +110,21 @@ Respond ONLY with JSON."""
     return result
 
 @router.post("/sentiment/{user_id}")
-async def analyze_sentiment(user_id: int, db: Session = Depends(get_db)):
+async def analyze_sentiment(user_id: int, db: Session = Depends(get_user_db)):
     """Analyze sentiment from chat conversations"""
     messages = db.query(ChatMessage).filter(ChatMessage.user_id == user_id).order_by(ChatMessage.created_at.desc()).limit(10).all()
     
     chat_data = json.dumps([{"content": m.content, "sender": m.sender} for m in messages], default=str)
     
-    message = groq_client.messages.create(
-        model="mixtral-8x7b-32768",
-        max_tokens=500,
-        temperature=0.5,
-        messages=[
-            {
-                "role": "user",
-                "content": f"""Analyze sentiment and team morale. Return JSON with:
+    with llm_call("analyze_sentiment"):
+        message = groq_client.messages.create(
+            model="mixtral-8x7b-32768",
+            max_tokens=500,
+            temperature=0.5,
+            messages=[
+                {
+                    "role": "user",
+                    "content": f"""Analyze sentiment and team morale. Return JSON with:
 - overall_sentiment: 'positive' | 'neutral' | 'negative'
 - morale_score: float (0-1)
 - key_concerns: list of str
@@ -123,9 +133,9 @@ async def analyze_sentiment(user_id: int, db: Session = Depends(get_db)):
 Chat history: {chat_data}
 
 Respond ONLY with JSON."""
-            }
-        ]
-    )
+                }
+            ]
+        )
     
     result = json.loads(message.content[0].text)
     
@@ -139,7 +149,7 @@ Respond ONLY with JSON."""
     return result
 
 @router.post("/chat/send")
-async def send_chat_message(user_id: int, content: str, analysis_mode: str = "general", db: Session = Depends(get_db)):
+async def send_chat_message(user_id: int, content: str, analysis_mode: str = "general", db: Session = Depends(get_user_db)):
     """Send message to AI chat and get response"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -159,18 +169,19 @@ async def send_chat_message(user_id: int, content: str, analysis_mode: str = "ge
         "conflict": "You are a conflict resolution specialist helping resolve workplace issues."
     }
     
-    response = groq_client.messages.create(
-        model="mixtral-8x7b-32768",
-        max_tokens=500,
-        temperature=0.7,
-        system=system_prompts.get(analysis_mode, system_prompts["general"]),
-        messages=[
-            {
-                "role": "user",
-                "content": content
-            }
-        ]
-    )
+    with llm_call("send_chat_message"):
+        response = groq_client.messages.create(
+            model="mixtral-8x7b-32768",
+            max_tokens=500,
+            temperature=0.7,
+            system=system_prompts.get(analysis_mode, system_prompts["general"]),
+            messages=[
+                {
+                    "role": "user",
+                    "content": content
+                }
+            ]
+        )
     
     response_text = response.content[0].text
     
@@ -181,8 +192,21 @@ async def send_chat_message(user_id: int, content: str, analysis_mode: str = "ge
     
     return {"user_message": user_msg.id, "ai_response": response_text}
 
-@router.get("/chat/history/{user_id}")
-async def get_chat_history(user_id: int, limit: int = 50, db: Session = Depends(get_db)):
-    """Get chat message history"""
-    messages = db.query(ChatMessage).filter(ChatMessage.user_id == user_id).order_by(ChatMessage.created_at.desc()).limit(limit).all()
-    return [{"id": m.id, "content": m.content, "sender": m.sender, "analysis_mode": m.analysis_mode, "created_at": m.created_at.isoformat()} for m in reversed(messages)]
+@router.get("/chat/history/{user_id}", response_class=ORJSONResponse)
+async def get_chat_history(user_id: int, limit: int = 50, cursor: str = None, stream: bool = False, db: Session = Depends(get_user_db)):
+    """Get chat history a page at a time, oldest first within a page; next_cursor walks back in time"""
+    stmt = keyset(
+        select(ChatMessage.id, ChatMessage.content, ChatMessage.sender, ChatMessage.analysis_mode, ChatMessage.created_at)
+        .where(ChatMessage.user_id == user_id),
+        ChatMessage.created_at, ChatMessage.id, cursor
+    )
+    if stream:
+        return stream_rows(db, stmt)
+    page = keyset_page(db, stmt, limit)
+    page["results"].reverse()
+    return ORJSONResponse(page)
+
+@router.get("/chat/search/{user_id}")
+async def search_chat_history(user_id: int, q: str, limit: int = 20, offset: int = 0, db: Session = Depends(get_user_db)):
+    """Full-text search over a user's chat messages"""
+    return search(db, "chat_messages_fts", user_id, q, limit, offset)
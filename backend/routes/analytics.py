@@ -2,29 +2,27 @@ from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from models import Task, Payment, User, Report
 from database import get_db
-from groq import Groq
+from shards import get_user_db
+from response_cache import cached
+from lazy import Lazy
 import os
 import json
 from datetime import datetime, timedelta
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
-# Initialize Groq client with graceful fallback
+# Initialize Groq client with graceful fallback, on first use so startup doesn't load the SDK
 def get_groq_client():
     api_key = os.getenv("GROQ_API_KEY")
     if api_key:
+        from groq import Groq
         return Groq(api_key=api_key)
     return None
 
-groq_client = get_groq_client()
+groq_client = Lazy(get_groq_client)
 
-@router.post("/report/generate")
-async def generate_report(user_id: int, report_type: str, date_from: str = None, date_to: str = None, db: Session = Depends(get_db)):
-    """Generate custom report (performance, compliance, roi)"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+def create_report(db: Session, user_id: int, report_type: str) -> dict:
+    """Build and store a report; shared with the automation scheduler"""
     tasks = db.query(Task).filter(Task.user_id == user_id).all()
     payments = db.query(Payment).filter(Payment.user_id == user_id).all()
     
@@ -46,6 +44,15 @@ async def generate_report(user_id: int, report_type: str, date_from: str = None,
     
     return report_data
 
+@router.post("/report/generate")
+async def generate_report(user_id: int, report_type: str, date_from: str = None, date_to: str = None, db: Session = Depends(get_user_db)):
+    """Generate custom report (performance, compliance, roi)"""
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    return create_report(db, user_id, report_type)
+
 @router.post("/report/export/{report_id}")
 async def export_report(report_id: int, db: Session = Depends(get_db)):
     """Export report as CSV"""
@@ -60,7 +67,7 @@ async def export_report(report_id: int, db: Session = Depends(get_db)):
     return Response(content=csv_content, media_type="text/csv", headers={"Content-Disposition": "attachment; filename=report.csv"})
 
 @router.post("/roi-calculator")
-async def calculate_roi(user_id: int, initial_investment: float, db: Session = Depends(get_db)):
+async def calculate_roi(user_id: int, initial_investment: float, db: Session = Depends(get_user_db)):
     """Calculate ROI with projections"""
     payments = db.query(Payment).filter(Payment.user_id == user_id).all()
     total_earnings = sum([p.amount for p in payments])
@@ -76,7 +83,8 @@ async def calculate_roi(user_id: int, initial_investment: float, db: Session = D
     }
 
 @router.get("/metrics/{user_id}")
-async def get_analytics_metrics(user_id: int, db: Session = Depends(get_db)):
+@cached(ttl=30, tags=["user:{user_id}"])
+async def get_analytics_metrics(user_id: int, db: Session = Depends(get_user_db)):
     """Get comprehensive analytics metrics"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -1,18 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from models import User
 from schemas import UserCreate, User as UserSchema
 from database import get_db
+from audit_sink import log_event
+from auth_cache import token_cache
+from lazy import Lazy
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
+import threading
+import time
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "64"))
+
+# Hashes with any other cost are flagged by verify_and_update and rehashed on login
+def _make_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+        bcrypt__max_rounds=BCRYPT_ROUNDS
+    )
+
+# Built on first use, so startup doesn't import passlib
+pwd_context = Lazy(_make_pwd_context)
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
+bearer_scheme = HTTPBearer(auto_error=False)
+
+# bcrypt releases the GIL, so a small dedicated pool keeps it off the event loop
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_lock = threading.Lock()
+_hash_stats = {"pending": 0, "completed": 0, "rejected": 0, "rehashed": 0}
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -20,6 +49,32 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+async def _run_hasher(fn, *args):
+    """Run a bcrypt call on the hashing pool, shedding load when the queue is full"""
+    with _hash_lock:
+        if _hash_stats["pending"] >= HASH_MAX_PENDING:
+            _hash_stats["rejected"] += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Authentication busy, retry shortly", headers={"Retry-After": "1"})
+        _hash_stats["pending"] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        with _hash_lock:
+            _hash_stats["pending"] -= 1
+            _hash_stats["completed"] += 1
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hasher(pwd_context.hash, password)
+
+async def verify_and_update_async(plain_password: str, hashed_password: str):
+    """Returns (valid, new_hash); new_hash is set when the stored cost is outdated"""
+    return await _run_hasher(pwd_context.verify_and_update, plain_password, hashed_password)
+
+def hasher_stats() -> dict:
+    """Queue depth and throughput of the password hashing pool"""
+    with _hash_lock:
+        return dict(_hash_stats, workers=HASH_WORKERS, max_pending=HASH_MAX_PENDING, rounds=BCRYPT_ROUNDS)
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -31,7 +86,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return encoded_jwt
 
 @router.post("/register")
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, request: Request, db: Session = Depends(get_db)):
     """Register a new user"""
     db_user = db.query(User).filter(User.email == user_data.email).first()
     if db_user:
@@ -40,23 +95,33 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     db_user = User(
         name=user_data.name,
         email=user_data.email,
-        hashed_password=hash_password(user_data.password),
+        hashed_password=await hash_password_async(user_data.password),
         wallet_id=user_data.wallet_id,
         credit_score=500
     )
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    log_event(db_user.id, "register", "user", ip_address=request.client.host if request.client else None)
     
     access_token = create_access_token(data={"sub": db_user.email})
     return {"access_token": access_token, "user": UserSchema.from_orm(db_user)}
 
 @router.post("/login")
-async def login(email: str, password: str, db: Session = Depends(get_db)):
+async def login(email: str, password: str, request: Request, db: Session = Depends(get_db)):
     """Login user"""
     user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.hashed_password):
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    valid, new_hash = await verify_and_update_async(password, user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    if new_hash:
+        user.hashed_password = new_hash
+        db.commit()
+        with _hash_lock:
+            _hash_stats["rehashed"] += 1
+    log_event(user.id, "login", "user", ip_address=request.client.host if request.client else None)
     
     access_token = create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "user": UserSchema.from_orm(user)}
@@ -66,9 +131,12 @@ async def logout():
     """Logout user"""
     return {"message": "Logged out successfully"}
 
-@router.get("/me")
-async def get_current_user(token: str, db: Session = Depends(get_db)):
-    """Get current authenticated user"""
+def authenticate_token(token: str, db: Session) -> UserSchema:
+    """Resolve a token to a user snapshot, hitting the DB only on cache misses"""
+    snapshot = token_cache.get(token)
+    if snapshot is not None:
+        return snapshot
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -79,7 +147,35 @@ async def get_current_user(token: str, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
-    return UserSchema.from_orm(user)
+    snapshot = UserSchema.from_orm(user)
+    token_cache.put(token, user.id, snapshot, payload.get("exp", time.time()))
+    return snapshot
+
+def token_subject(token: str):
+    """Email of a token's user if its signature and expiry check out, else None; never touches the DB"""
+    snapshot = token_cache.peek(token)
+    if snapshot is not None:
+        return snapshot.email
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+async def current_user(
+    token: str = None,
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    db: Session = Depends(get_db)
+) -> UserSchema:
+    """Dependency for authenticated routes; accepts a Bearer header or ?token="""
+    token = credentials.credentials if credentials else token
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return authenticate_token(token, db)
+
+@router.get("/me")
+async def get_current_user(user: UserSchema = Depends(current_user)):
+    """Get current authenticated user"""
+    return user
 
 @router.post("/2fa/setup")
 async def setup_2fa(user_id: int, db: Session = Depends(get_db)):
@@ -90,5 +186,7 @@ async def setup_2fa(user_id: int, db: Session = Depends(get_db)):
     
     user.two_factor_enabled = True
     db.commit()
+    token_cache.invalidate_user(user_id)
+    log_event(user_id, "enable_2fa", "user")
     
     return {"message": "2FA enabled", "backup_codes": ["CODE1", "CODE2", "CODE3", "CODE4", "CODE5"]}
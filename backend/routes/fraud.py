@@ -1,24 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi.responses import ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from models import Payment, FraudLog, Task, User
 from database import get_db
-from groq import Groq
+from shards import get_user_db
+from metrics import llm_call
+from fraud_monitor import velocity_monitor
+from fraud_sweep import run_sweep, load_checkpoint
+from fraud_graph import fraud_ring_index
+from log_partitions import log_storage
+from datetime import datetime
+from lazy import Lazy
 import os
 import json
+import threading
 
 router = APIRouter(prefix="/fraud", tags=["fraud"])
 
-# Initialize Groq client with graceful fallback
+# Initialize Groq client with graceful fallback, on first use so startup doesn't load the SDK
 def get_groq_client():
     api_key = os.getenv("GROQ_API_KEY")
     if api_key:
+        from groq import Groq
         return Groq(api_key=api_key)
     return None
 
-groq_client = get_groq_client()
+groq_client = Lazy(get_groq_client)
+
+# Platform-wide sweep runs one at a time per process
+_sweep_lock = threading.Lock()
+_sweep_status = {"running": False}
+
+def _run_sweep_job(workers: int, resume: bool):
+    try:
+        run_sweep(workers=workers, resume=resume, on_progress=_sweep_status.update)
+        _sweep_status.update(load_checkpoint() or {})
+    except Exception as e:
+        _sweep_status["error"] = str(e)
+    finally:
+        _sweep_status["running"] = False
+        _sweep_lock.release()
 
 @router.post("/detect/{user_id}")
-async def detect_fraud(user_id: int, db: Session = Depends(get_db)):
+async def detect_fraud(user_id: int, db: Session = Depends(get_user_db)):
     """Run fraud detection on user"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -36,14 +61,15 @@ async def detect_fraud(user_id: int, db: Session = Depends(get_db)):
         "created_at": p.created_at.isoformat()
     } for p in payments], default=str)
     
-    message = groq_client.messages.create(
-        model="mixtral-8x7b-32768",
-        max_tokens=500,
-        temperature=0.1,
-        messages=[
-            {
-                "role": "user",
-                "content": f"""Analyze for fraud patterns. Return JSON with:
+    with llm_call("detect_fraud"):
+        message = groq_client.messages.create(
+            model="mixtral-8x7b-32768",
+            max_tokens=500,
+            temperature=0.1,
+            messages=[
+                {
+                    "role": "user",
+                    "content": f"""Analyze for fraud patterns. Return JSON with:
 - fraud_risk (0-1)
 - red_flags: []
 - anomalies: []
@@ -51,9 +77,9 @@ async def detect_fraud(user_id: int, db: Session = Depends(get_db)):
 Payments: {payment_data}
 
 Respond ONLY with JSON."""
-            }
-        ]
-    )
+                }
+            ]
+        )
     
     result = json.loads(message.content[0].text)
     fraud_risk = result.get("fraud_risk", 0.0)
@@ -69,17 +95,54 @@ Respond ONLY with JSON."""
     
     return result
 
-@router.get("/logs/{user_id}")
-async def get_fraud_logs(user_id: int, limit: int = 50, db: Session = Depends(get_db)):
-    """Get fraud detection logs"""
-    logs = db.query(FraudLog).filter(FraudLog.user_id == user_id).order_by(FraudLog.created_at.desc()).limit(limit).all()
-    return [
-        {
-            "id": log.id,
-            "event_type": log.event_type,
-            "confidence": log.confidence,
-            "details": log.details,
-            "created_at": log.created_at.isoformat()
-        }
-        for log in logs
-    ]
+FRAUD_LOG_COLUMNS = ("id", "event_type", "confidence", "details", "created_at")
+
+@router.get("/logs/{user_id}", response_class=ORJSONResponse)
+async def get_fraud_logs(user_id: int, limit: int = 50, start: datetime = None, end: datetime = None, db: Session = Depends(get_db)):
+    """Get fraud detection logs, optionally within a time range"""
+    return ORJSONResponse(log_storage.query(db, "fraud_logs", user_id, start, end, limit, FRAUD_LOG_COLUMNS))
+
+@router.get("/velocity/{user_id}")
+async def get_velocity_stats(user_id: int):
+    """Get live payment velocity windows for a user"""
+    return {
+        "user_id": user_id,
+        "windows": velocity_monitor.stats(user_id),
+        "thresholds": velocity_monitor.thresholds
+    }
+
+@router.post("/sweep")
+async def start_fraud_sweep(admin_id: int, background_tasks: BackgroundTasks, workers: int = None, resume: bool = True, db: Session = Depends(get_db)):
+    """Start a platform-wide fraud sweep (admin only)"""
+    admin = db.query(User).filter(User.id == admin_id).first()
+    if not admin or admin.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin role required")
+    
+    if not _sweep_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Sweep already running")
+    
+    _sweep_status.clear()
+    _sweep_status.update(load_checkpoint() or {})
+    _sweep_status.update({"running": True, "started_by": admin_id})
+    background_tasks.add_task(_run_sweep_job, workers, resume)
+    return _sweep_status
+
+@router.get("/sweep/status")
+async def get_fraud_sweep_status():
+    """Get progress of the current or last fraud sweep"""
+    if not _sweep_status.get("running") and "sweep_id" not in _sweep_status:
+        _sweep_status.update(load_checkpoint() or {})
+    return _sweep_status
+
+@router.get("/rings")
+async def get_fraud_rings(min_size: int = 2, limit: int = 50, db: Session = Depends(get_db)):
+    """List clusters of users linked by shared IPs or wallets, riskiest first"""
+    # The first call loads every identifier; keep that off the event loop
+    await run_in_threadpool(fraud_ring_index.ensure_built, db)
+    return fraud_ring_index.clusters(min_size=min_size, limit=limit)
+
+@router.get("/rings/{user_id}")
+async def get_user_fraud_ring(user_id: int, db: Session = Depends(get_db)):
+    """Get the cluster of users linked to this user"""
+    await run_in_threadpool(fraud_ring_index.ensure_built, db)
+    return fraud_ring_index.cluster_of(user_id)
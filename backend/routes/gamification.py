@@ -2,6 +2,11 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from models import User, Achievement, Task
 from database import get_db
+from shards import shard_router
+from auth_cache import token_cache
+from nft_mint import mint_queue
+from rewards import accrue, achievement_reward
+from response_cache import cached, response_cache
 
 router = APIRouter(prefix="/gamification", tags=["gamification"])
 
@@ -13,6 +18,7 @@ BADGE_THRESHOLDS = {
 }
 
 @router.get("/leaderboard")
+@cached(ttl=30, tags=["leaderboard"])
 async def get_leaderboard(limit: int = 50, db: Session = Depends(get_db)):
     """Get global leaderboard ranked by points"""
     users = db.query(User).order_by(User.points.desc()).limit(limit).all()
@@ -48,11 +54,14 @@ async def check_and_award_achievements(user_id: int, db: Session = Depends(get_d
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    tasks = db.query(Task).filter(Task.user_id == user_id).all()
+    # Awards are catalog rows, so only the task read goes to the user's shard
+    with shard_router.session(user_id, read_only=True) as user_db:
+        tasks = user_db.query(Task).filter(Task.user_id == user_id).all()
     verified_tasks = len([t for t in tasks if t.verification_status == "verified"])
     perfect_tasks = len([t for t in tasks if t.ai_score >= 0.9])
     
     new_achievements = []
+    awarded = []
     
     # Check Task Master
     if verified_tasks >= 50:
@@ -67,6 +76,7 @@ async def check_and_award_achievements(user_id: int, db: Session = Depends(get_d
                 points_earned=100
             )
             db.add(achievement)
+            awarded.append(achievement)
             user.points += 100
             new_achievements.append("Task Master")
     
@@ -83,6 +93,7 @@ async def check_and_award_achievements(user_id: int, db: Session = Depends(get_d
                 points_earned=50
             )
             db.add(achievement)
+            awarded.append(achievement)
             user.points += 50
             new_achievements.append("Perfect Score")
     
@@ -99,13 +110,26 @@ async def check_and_award_achievements(user_id: int, db: Session = Depends(get_d
                 points_earned=0
             )
             db.add(achievement)
+            awarded.append(achievement)
             new_achievements.append("Leadership")
     
+    if awarded:
+        db.flush()
+        for achievement in awarded:
+            accrue(db, user_id, "achievement", achievement.id, achievement_reward(achievement.points_earned))
     db.commit()
+    if new_achievements:
+        token_cache.invalidate_user(user_id)
+        response_cache.invalidate_user(user_id, "leaderboard")
+        for badge_name in new_achievements:
+            mint_queue.enqueue(user_id, badge_name)
+        mint_queue.flush(db)
     
     return {"new_achievements": new_achievements, "total_points": user.points}
 
 @router.get("/stats/{user_id}")
+# Rank depends on everyone's points, so stats go stale with the leaderboard too
+@cached(ttl=15, tags=["user:{user_id}", "leaderboard"])
 async def get_gamification_stats(user_id: int, db: Session = Depends(get_db)):
     """Get user gamification stats"""
     user = db.query(User).filter(User.id == user_id).first()
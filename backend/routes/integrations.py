@@ -1,8 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from models import Integration
+from sqlalchemy import update, select, insert, exists
+from models import Integration, User, WebhookSubscription, WebhookDelivery, WebhookDeadLetter, Automation
 from database import get_db
+from webhooks import WEBHOOK_EVENTS, UnsafeWebhookURL, check_webhook_url
+from scheduler import AUTOMATION_JOBS, automation_scheduler, parse_frequency, next_run_at
+from response_cache import cached, response_cache
+from datetime import datetime
 import json
+import secrets
 
 router = APIRouter(prefix="/integrations", tags=["integrations"])
 
@@ -18,10 +25,12 @@ async def connect_integration(user_id: int, integration_type: str, config: dict,
     )
     db.add(integration)
     db.commit()
+    response_cache.invalidate_user(user_id)
     
     return {"integration_id": integration.id, "status": "connected"}
 
 @router.get("/status/{user_id}")
+@cached(ttl=60, tags=["user:{user_id}"])
 async def get_integration_status(user_id: int, db: Session = Depends(get_db)):
     """Get all connected integrations and their status"""
     integrations = db.query(Integration).filter(Integration.user_id == user_id).all()
@@ -38,19 +47,203 @@ async def get_integration_status(user_id: int, db: Session = Depends(get_db)):
 @router.post("/webhook")
 async def create_webhook(user_id: int, event: str, url: str, db: Session = Depends(get_db)):
     """Create webhook for event triggers"""
+    if event != "*" and event not in WEBHOOK_EVENTS:
+        raise HTTPException(status_code=400, detail=f"Unknown event; expected one of {sorted(WEBHOOK_EVENTS)} or *")
+    # Loopback, private and metadata addresses would let callers aim the dispatcher inside the network
+    try:
+        await run_in_threadpool(check_webhook_url, url)
+    except UnsafeWebhookURL as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    webhook = WebhookSubscription(
+        user_id=user_id,
+        event=event,
+        url=url,
+        secret=secrets.token_hex(32),
+        is_active=True
+    )
+    db.add(webhook)
+    db.commit()
+    
+    # The secret is only shown once; deliveries are signed with it
     return {
-        "webhook_id": "WHK_123",
+        "webhook_id": webhook.id,
         "event": event,
         "url": url,
+        "secret": webhook.secret,
         "status": "active"
     }
 
+@router.get("/webhooks/{user_id}")
+async def get_webhooks(user_id: int, db: Session = Depends(get_db)):
+    """List a user's webhook subscriptions"""
+    webhooks = db.query(WebhookSubscription).filter(WebhookSubscription.user_id == user_id).all()
+    return [
+        {
+            "webhook_id": w.id,
+            "event": w.event,
+            "url": w.url,
+            "status": "active" if w.is_active else "disabled",
+            "created_at": w.created_at.isoformat()
+        }
+        for w in webhooks
+    ]
+
+@router.delete("/webhook/{webhook_id}")
+async def delete_webhook(webhook_id: int, user_id: int, db: Session = Depends(get_db)):
+    """Disable a webhook; pending deliveries to it are dropped"""
+    webhook = db.query(WebhookSubscription).filter(
+        WebhookSubscription.id == webhook_id,
+        WebhookSubscription.user_id == user_id
+    ).first()
+    if not webhook:
+        raise HTTPException(status_code=404, detail="Webhook not found")
+    
+    webhook.is_active = False
+    db.execute(
+        update(WebhookDelivery)
+        .where(WebhookDelivery.subscription_id == webhook_id, WebhookDelivery.status == "pending")
+        .values(status="cancelled")
+    )
+    db.commit()
+    return {"webhook_id": webhook_id, "status": "disabled"}
+
+@router.get("/webhooks/{user_id}/dead-letters")
+async def get_dead_letters(user_id: int, limit: int = 100, db: Session = Depends(get_db)):
+    """Deliveries that exhausted their retries"""
+    letters = db.query(WebhookDeadLetter).filter(
+        WebhookDeadLetter.user_id == user_id
+    ).order_by(WebhookDeadLetter.id.desc()).limit(limit).all()
+    return [
+        {
+            "id": d.id,
+            "webhook_id": d.subscription_id,
+            "url": d.url,
+            "event": d.event,
+            "payload": d.payload,
+            "attempts": d.attempts,
+            "last_error": d.last_error,
+            "created_at": d.created_at.isoformat()
+        }
+        for d in letters
+    ]
+
+@router.post("/webhooks/dead-letters/{dead_letter_id}/replay")
+async def replay_dead_letter(dead_letter_id: int, user_id: int, db: Session = Depends(get_db)):
+    """Put a dead-lettered delivery back on the queue"""
+    letter = db.query(WebhookDeadLetter).filter(
+        WebhookDeadLetter.id == dead_letter_id,
+        WebhookDeadLetter.user_id == user_id
+    ).first()
+    if not letter:
+        raise HTTPException(status_code=404, detail="Dead letter not found")
+    
+    db.execute(
+        update(WebhookDelivery).where(WebhookDelivery.id == letter.delivery_id).values(
+            status="pending", attempts=0, next_attempt_at=datetime.utcnow(),
+            lease_owner=None, lease_until=None
+        )
+    )
+    db.delete(letter)
+    db.commit()
+    return {"delivery_id": letter.delivery_id, "status": "pending"}
+
+def _check_automation(automation_type: str, frequency: str):
+    if automation_type not in AUTOMATION_JOBS:
+        raise HTTPException(status_code=400, detail=f"Unknown automation; expected one of {sorted(AUTOMATION_JOBS)}")
+    try:
+        parse_frequency(frequency)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid frequency: {e}")
+
 @router.post("/automation/schedule")
-async def schedule_automation(user_id: int, automation_type: str, frequency: str, db: Session = Depends(get_db)):
+async def schedule_automation(user_id: int, automation_type: str, frequency: str, config: dict = None, db: Session = Depends(get_db)):
     """Schedule automation (daily reports, weekly syncs, monthly reviews)"""
+    _check_automation(automation_type, frequency)
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    automation = Automation(
+        user_id=user_id,
+        automation_type=automation_type,
+        frequency=frequency,
+        config=config,
+        is_active=True,
+        next_run_at=next_run_at(frequency, user_id, automation_type, datetime.utcnow())
+    )
+    db.add(automation)
+    db.commit()
+    automation_scheduler.schedule(automation.id, automation.next_run_at)
+    
     return {
-        "automation_id": "AUTO_123",
+        "automation_id": automation.id,
         "type": automation_type,
         "frequency": frequency,
-        "next_run": "2024-01-15T09:00:00Z"
+        "next_run": automation.next_run_at.isoformat() + "Z"
     }
+
+@router.post("/automation/schedule/all")
+async def schedule_automation_for_all(admin_id: int, automation_type: str, frequency: str, config: dict = None, db: Session = Depends(get_db)):
+    """Schedule an automation for every user that doesn't have one of this type (admin only)"""
+    admin = db.query(User).filter(User.id == admin_id).first()
+    if not admin or admin.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin role required")
+    _check_automation(automation_type, frequency)
+    
+    user_ids = db.execute(select(User.id).where(~exists().where(
+        Automation.user_id == User.id,
+        Automation.automation_type == automation_type,
+        Automation.is_active == True
+    ))).scalars().all()
+    now = datetime.utcnow()
+    if user_ids:
+        db.execute(insert(Automation), [
+            {
+                "user_id": uid,
+                "automation_type": automation_type,
+                "frequency": frequency,
+                "config": config,
+                "is_active": True,
+                "next_run_at": next_run_at(frequency, uid, automation_type, now),
+                "run_count": 0,
+                "created_at": now
+            }
+            for uid in user_ids
+        ])
+        db.commit()
+    # Jobs reach the heap on the scheduler's next refresh
+    return {"type": automation_type, "frequency": frequency, "scheduled": len(user_ids)}
+
+@router.get("/automations/{user_id}")
+async def get_automations(user_id: int, db: Session = Depends(get_db)):
+    """List a user's scheduled automations"""
+    automations = db.query(Automation).filter(Automation.user_id == user_id).all()
+    return [
+        {
+            "automation_id": a.id,
+            "type": a.automation_type,
+            "frequency": a.frequency,
+            "is_active": a.is_active,
+            "next_run": a.next_run_at.isoformat() + "Z",
+            "last_run": a.last_run_at.isoformat() + "Z" if a.last_run_at else None,
+            "last_status": a.last_status,
+            "run_count": a.run_count
+        }
+        for a in automations
+    ]
+
+@router.delete("/automation/{automation_id}")
+async def cancel_automation(automation_id: int, user_id: int, db: Session = Depends(get_db)):
+    """Stop a scheduled automation"""
+    automation = db.query(Automation).filter(
+        Automation.id == automation_id,
+        Automation.user_id == user_id
+    ).first()
+    if not automation:
+        raise HTTPException(status_code=404, detail="Automation not found")
+    
+    automation.is_active = False
+    db.commit()
+    return {"automation_id": automation_id, "status": "cancelled"}
@@ -1,34 +1,61 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from models import Payment, Task, User
-from schemas import PaymentCreate, Payment as PaymentSchema
+from schemas import PaymentCreate
 from database import get_db
+from shards import shard_router, get_user_db
+from webhooks import enqueue_event
+from rewards import accrue, task_reward
+from response_cache import cached, response_cache
+from fast_json import stream_rows
+from pagination import keyset, keyset_page
 
 router = APIRouter(prefix="/payments", tags=["payments"])
 
+PAYMENT_LIST_COLUMNS = (Payment.id, Payment.user_id, Payment.task_id, Payment.amount, Payment.method,
+                        Payment.status, Payment.risk_score, Payment.created_at)
+
 @router.post("/process")
-async def process_payment(payment_data: PaymentCreate, db: Session = Depends(get_db)):
+async def process_payment(payment_data: PaymentCreate):
     """Process a payment"""
-    payment = db.query(Payment).filter(Payment.task_id == payment_data.task_id).first()
-    if not payment:
-        raise HTTPException(status_code=404, detail="Payment not found")
-    
-    payment.status = "completed"
-    task = db.query(Task).filter(Task.id == payment.task_id).first()
-    if task:
-        task.payment_status = "paid"
-    
-    db.commit()
-    
-    return {"payment_id": payment.id, "status": "completed", "amount": payment.amount}
+    with shard_router.session_for(Payment.task_id, payment_data.task_id) as db:
+        payment = db.query(Payment).filter(Payment.task_id == payment_data.task_id).first()
+        if not payment:
+            raise HTTPException(status_code=404, detail="Payment not found")
+        if payment.status == "held":
+            raise HTTPException(status_code=409, detail="Payment held for fraud review")
+        
+        newly_paid = payment.status != "completed"
+        payment.status = "completed"
+        task = db.query(Task).filter(Task.id == payment.task_id).first()
+        if task:
+            task.payment_status = "paid"
+        if newly_paid:
+            accrue(db, payment.user_id, "task_payment", payment.id, task_reward(payment.amount))
+        enqueue_event(db, payment.user_id, "payment.completed", {
+            "payment_id": payment.id,
+            "task_id": payment.task_id,
+            "amount": payment.amount,
+            "method": payment.method
+        })
+        
+        db.commit()
+        response_cache.invalidate_user(payment.user_id)
+        
+        return {"payment_id": payment.id, "status": "completed", "amount": payment.amount}
 
-@router.get("/{user_id}")
-async def get_user_payments(user_id: int, db: Session = Depends(get_db)):
-    """Get all payments for a user"""
-    payments = db.query(Payment).filter(Payment.user_id == user_id).order_by(Payment.created_at.desc()).all()
-    return [PaymentSchema.from_orm(p) for p in payments]
+@router.get("/{user_id}", response_class=ORJSONResponse)
+async def get_user_payments(user_id: int, limit: int = 100, cursor: str = None, stream: bool = False, db: Session = Depends(get_user_db)):
+    """Get a user's payments newest first, a page at a time, or all of them as NDJSON with stream"""
+    stmt = keyset(select(*PAYMENT_LIST_COLUMNS).where(Payment.user_id == user_id), Payment.created_at, Payment.id, cursor)
+    if stream:
+        return stream_rows(db, stmt)
+    return ORJSONResponse(keyset_page(db, stmt, limit))
 
 @router.get("/credit-score/{user_id}")
+@cached(ttl=60, tags=["user:{user_id}"])
 async def get_credit_score(user_id: int, db: Session = Depends(get_db)):
     """Get user credit score"""
     user = db.query(User).filter(User.id == user_id).first()
@@ -1,7 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
-from models import User, AuditLog
+from models import User
 from database import get_db
+from audit_sink import audit_sink, user_exists, log_event, AuditBackpressure
+from log_partitions import log_storage
+from fast_json import stream_ndjson
+from pagination import decode_cursor, clamp_limit, page_of
+from auth_cache import token_cache
 from datetime import datetime
 import json
 
@@ -9,38 +15,29 @@ router = APIRouter(prefix="/security", tags=["security"])
 
 @router.post("/audit-log")
 async def log_audit_event(user_id: int, action: str, resource: str, details: dict = None, ip_address: str = None, db: Session = Depends(get_db)):
-    """Log audit event"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    """Log audit event (buffered and written in batches)"""
+    if not user_exists(db, user_id):
         raise HTTPException(status_code=404, detail="User not found")
     
-    audit = AuditLog(
-        user_id=user_id,
-        action=action,
-        resource=resource,
-        details=details,
-        ip_address=ip_address
-    )
-    db.add(audit)
-    db.commit()
+    try:
+        audit_sink.emit(user_id, action, resource, details, ip_address)
+    except AuditBackpressure:
+        raise HTTPException(status_code=503, detail="Audit queue full", headers={"Retry-After": "1"})
     
-    return {"message": "Audit logged", "audit_id": audit.id}
+    return {"message": "Audit queued", "pending": audit_sink.pending()}
+
+AUDIT_LOG_COLUMNS = ("id", "action", "resource", "details", "ip_address", "created_at")
 
-@router.get("/audit-logs/{user_id}")
-async def get_audit_logs(user_id: int, limit: int = 100, db: Session = Depends(get_db)):
-    """Get audit logs for a user"""
-    logs = db.query(AuditLog).filter(AuditLog.user_id == user_id).order_by(AuditLog.created_at.desc()).limit(limit).all()
-    return [
-        {
-            "id": log.id,
-            "action": log.action,
-            "resource": log.resource,
-            "details": log.details,
-            "ip_address": log.ip_address,
-            "created_at": log.created_at.isoformat()
-        }
-        for log in logs
-    ]
+@router.get("/audit-logs/{user_id}", response_class=ORJSONResponse)
+async def get_audit_logs(user_id: int, limit: int = 100, start: datetime = None, end: datetime = None, cursor: str = None,
+                         stream: bool = False, db: Session = Depends(get_db)):
+    """Get audit logs for a user newest first, optionally within a time range"""
+    before = decode_cursor(cursor) if cursor else None
+    if stream:
+        return stream_ndjson(log_storage.iter_query(db, "audit_logs", user_id, start, end, AUDIT_LOG_COLUMNS, before))
+    limit = clamp_limit(limit)
+    rows = log_storage.query(db, "audit_logs", user_id, start, end, limit + 1, AUDIT_LOG_COLUMNS, before)
+    return ORJSONResponse(page_of(rows, limit))
 
 @router.post("/rbac/assign-role")
 async def assign_role(user_id: int, role: str, db: Session = Depends(get_db)):
@@ -52,8 +49,11 @@ async def assign_role(user_id: int, role: str, db: Session = Depends(get_db)):
     if role not in ["admin", "manager", "user"]:
         raise HTTPException(status_code=400, detail="Invalid role")
     
+    previous_role = user.role
     user.role = role
     db.commit()
+    token_cache.invalidate_user(user_id)
+    log_event(user_id, "assign_role", "user", {"from": previous_role, "to": role})
     
     return {"user_id": user_id, "role": role}
 
@@ -1,30 +1,52 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
 from models import Task, User, Payment
-from schemas import TaskCreate, TaskUpdate, Task as TaskSchema
-from database import get_db
+from fastapi.responses import ORJSONResponse
+from schemas import TaskCreate, TaskUpdate
+from shards import shard_router, get_user_db, get_task_db
+from metrics import llm_call
+from fraud_monitor import assess_batch
+from dedup_index import task_dedup_index
+from search import search
+from webhooks import enqueue_event, enqueue_events
+from response_cache import response_cache
+from fast_json import stream_rows
+from pagination import keyset, keyset_page
+from datetime import datetime
+from typing import List
 import json
-from groq import Groq
+from lazy import Lazy
 import os
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
 
-# Initialize Groq client with graceful fallback
+# Initialize Groq client with graceful fallback, on first use so startup doesn't load the SDK
 def get_groq_client():
     api_key = os.getenv("GROQ_API_KEY")
     if api_key:
+        from groq import Groq
         return Groq(api_key=api_key)
     return None
 
-groq_client = get_groq_client()
+groq_client = Lazy(get_groq_client)
+
+MAX_BATCH_SIZE = 1000
+TASK_LIST_COLUMNS = (Task.id, Task.user_id, Task.description, Task.category, Task.ai_score,
+                     Task.verification_status, Task.payment_status, Task.amount, Task.created_at)
+# Tasks this similar to an existing one go to review without an LLM call
+DUPLICATE_REVIEW_SIMILARITY = 0.75
 
 @router.post("/submit")
-async def submit_task(user_id: int, task_data: TaskCreate, db: Session = Depends(get_db)):
+async def submit_task(user_id: int, task_data: TaskCreate, db: Session = Depends(get_user_db)):
     """Submit a new task"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    # Hash for the dedup index off the event loop, before the transaction takes the write lock
+    [signature] = await run_in_threadpool(task_dedup_index.signatures, [task_data.description])
     db_task = Task(
         user_id=user_id,
         description=task_data.description,
@@ -42,31 +64,133 @@ async def submit_task(user_id: int, task_data: TaskCreate, db: Session = Depends
         amount=task_data.amount
     )
     db.add(payment)
+    enqueue_event(db, user_id, "task.submitted", {
+        "task_id": db_task.id,
+        "category": db_task.category,
+        "amount": db_task.amount
+    })
+    task_dedup_index.add(db, [(db_task.id, user_id, signature, db_task.created_at)])
     db.commit()
+    response_cache.invalidate_user(user_id)
     
     return {"task_id": db_task.id, "status": "submitted"}
 
-@router.get("/{user_id}")
-async def get_user_tasks(user_id: int, db: Session = Depends(get_db)):
-    """Get all tasks for a user"""
-    tasks = db.query(Task).filter(Task.user_id == user_id).order_by(Task.created_at.desc()).all()
-    return [TaskSchema.from_orm(t) for t in tasks]
+@router.post("/submit/batch")
+async def submit_task_batch(user_id: int, tasks: List[TaskCreate], db: Session = Depends(get_user_db)):
+    """Submit many tasks and their payments in one transaction"""
+    if not tasks:
+        raise HTTPException(status_code=400, detail="No tasks submitted")
+    if len(tasks) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {MAX_BATCH_SIZE} tasks")
+    
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    signatures = await run_in_threadpool(task_dedup_index.signatures, [t.description for t in tasks])
+    now = datetime.utcnow()
+    task_ids = db.execute(
+        insert(Task).returning(Task.id, sort_by_parameter_order=True),
+        [
+            {
+                "id": task_id,
+                "user_id": user_id,
+                "description": t.description,
+                "category": t.category,
+                "amount": t.amount,
+                "created_at": now,
+                "updated_at": now
+            }
+            for task_id, t in zip(shard_router.new_ids(db, Task, len(tasks)), tasks)
+        ]
+    ).scalars().all()
+    
+    # Bulk inserts skip the ORM flush hooks, so run the velocity check here: every payment counts, with one FraudLog per batch
+    risk_score, held = assess_batch(db, user_id, task_ids, [t.amount for t in tasks], "bKash", now)
+    payment_rows = []
+    for payment_id, task_id, t in zip(shard_router.new_ids(db, Payment, len(tasks)), task_ids, tasks):
+        payment_rows.append({
+            "id": payment_id,
+            "user_id": user_id,
+            "task_id": task_id,
+            "amount": t.amount,
+            "method": "bKash",
+            "status": "held" if held else "pending",
+            "risk_score": risk_score,
+            "created_at": now,
+            "updated_at": now
+        })
+    payment_ids = db.execute(
+        insert(Payment).returning(Payment.id, sort_by_parameter_order=True),
+        payment_rows
+    ).scalars().all()
+    enqueue_events(db, [
+        (user_id, "task.submitted", {"task_id": task_id, "category": t.category, "amount": t.amount})
+        for task_id, t in zip(task_ids, tasks)
+    ])
+    task_dedup_index.add(db, [(task_id, user_id, sig, now) for task_id, sig in zip(task_ids, signatures)])
+    db.commit()
+    response_cache.invalidate_user(user_id)
+    
+    return {"task_ids": task_ids, "payment_ids": payment_ids, "count": len(task_ids), "status": "submitted"}
+
+@router.get("/search/{user_id}")
+async def search_tasks(user_id: int, q: str, limit: int = 20, offset: int = 0, db: Session = Depends(get_user_db)):
+    """Full-text search over a user's task descriptions"""
+    return search(db, "tasks_fts", user_id, q, limit, offset)
+
+@router.get("/{user_id}", response_class=ORJSONResponse)
+async def get_user_tasks(user_id: int, limit: int = 100, cursor: str = None, stream: bool = False, db: Session = Depends(get_user_db)):
+    """Get a user's tasks newest first, a page at a time, or all of them as NDJSON with stream"""
+    stmt = keyset(select(*TASK_LIST_COLUMNS).where(Task.user_id == user_id), Task.created_at, Task.id, cursor)
+    if stream:
+        return stream_rows(db, stmt)
+    return ORJSONResponse(keyset_page(db, stmt, limit))
+
+def _enqueue_verified(db: Session, task: Task):
+    enqueue_event(db, task.user_id, "task.verified", {
+        "task_id": task.id,
+        "verification_status": task.verification_status,
+        "ai_score": task.ai_score
+    })
+
+def _submitted_before(duplicate: dict, task: Task) -> bool:
+    if duplicate["created_at"] is None or task.created_at is None:
+        return duplicate["task_id"] < task.id
+    return (duplicate["created_at"], duplicate["task_id"]) < (task.created_at, task.id)
 
 @router.post("/verify/{task_id}")
-async def verify_task(task_id: int, db: Session = Depends(get_db)):
+async def verify_task(task_id: int, db: Session = Depends(get_task_db)):
     """Verify task with AI"""
     task = db.query(Task).filter(Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    message = groq_client.messages.create(
-        model="mixtral-8x7b-32768",
-        max_tokens=500,
-        temperature=0.1,
-        messages=[
-            {
-                "role": "user",
-                "content": f"""Analyze this task for authenticity. Return JSON with:
+    duplicates = await run_in_threadpool(task_dedup_index.query, db, task.description, task.id)
+    # Only copies of earlier tasks are suspect; the original stays verifiable.
+    # Sharded ids aren't in submission order, so order by created_at (ids only break ties within a batch)
+    if any(_submitted_before(d, task) and d["similarity"] >= DUPLICATE_REVIEW_SIMILARITY for d in duplicates):
+        result = {
+            "authenticity_score": None,
+            "red_flags": ["near_duplicate_description"],
+            "recommendation": "review",
+            "duplicates": duplicates
+        }
+        task.verification_status = "review_needed"
+        _enqueue_verified(db, task)
+        db.commit()
+        response_cache.invalidate_user(task.user_id)
+        return {"task_id": task_id, "verification_result": result, "status": task.verification_status}
+    
+    with llm_call("verify_task"):
+        message = groq_client.messages.create(
+            model="mixtral-8x7b-32768",
+            max_tokens=500,
+            temperature=0.1,
+            messages=[
+                {
+                    "role": "user",
+                    "content": f"""Analyze this task for authenticity. Return JSON with:
 - authenticity_score (0-1)
 - red_flags: []
 - recommendation: 'approve' or 'review'
@@ -74,15 +198,18 @@ async def verify_task(task_id: int, db: Session = Depends(get_db)):
 Task: {task.description}
 
 Respond ONLY with JSON."""
-            }
-        ]
-    )
+                }
+            ]
+        )
     
     result = json.loads(message.content[0].text)
+    result["duplicates"] = duplicates
     ai_score = result.get("authenticity_score", 0.5)
     
     task.ai_score = ai_score
     task.verification_status = "verified" if ai_score > 0.7 else "review_needed"
+    _enqueue_verified(db, task)
     db.commit()
+    response_cache.invalidate_user(task.user_id)
     
     return {"task_id": task_id, "verification_result": result, "status": task.verification_status}
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from models import CryptoWallet, NFTBadge
+from models import CryptoWallet, NFTBadge, User
 from database import get_db
-from datetime import datetime
+from nft_mint import mint_queue
+from rewards import summary, settle, WPAY_USD_RATE
 
 router = APIRouter(prefix="/web3", tags=["web3"])
 
@@ -14,70 +15,70 @@ async def connect_wallet(user_id: int, wallet_address: str, wallet_type: str, db
     if existing:
         raise HTTPException(status_code=400, detail="Wallet already connected")
     
+    # Settled rewards live on the user's first wallet
+    first_wallet = not db.query(CryptoWallet.id).filter(CryptoWallet.user_id == user_id).first()
+    balance = summary(db, user_id)["wpay_balance"] if first_wallet else 0
+    
     wallet = CryptoWallet(
         user_id=user_id,
         wallet_address=wallet_address,
         wallet_type=wallet_type,
-        balance=0
+        balance=balance
     )
     db.add(wallet)
     db.commit()
     
-    return {"wallet_id": wallet.id, "wallet_address": wallet_address, "balance": 0}
+    return {"wallet_id": wallet.id, "wallet_address": wallet_address, "balance": balance}
 
 @router.get("/wallet/{user_id}")
 async def get_wallet(user_id: int, db: Session = Depends(get_db)):
     """Get wallet info and WPAY token balance"""
-    wallet = db.query(CryptoWallet).filter(CryptoWallet.user_id == user_id).first()
+    wallet = db.query(CryptoWallet).filter(CryptoWallet.user_id == user_id).order_by(CryptoWallet.id).first()
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
     
     return {
         "wallet_address": wallet.wallet_address,
         "balance": wallet.balance,
-        "balance_usd": wallet.balance * 0.45,  # Mock conversion rate
-        "wallet_type": wallet_type
+        "balance_usd": wallet.balance * WPAY_USD_RATE,
+        "pending_rewards": summary(db, user_id)["pending_rewards"],
+        "wallet_type": wallet.wallet_type
     }
 
 @router.post("/nft/mint")
 async def mint_nft_badge(user_id: int, badge_name: str, db: Session = Depends(get_db)):
     """Mint NFT badge achievement"""
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
     
-    token_id = f"NFT_{user_id}_{badge_name}_{datetime.now().timestamp()}"
-    
-    nft = NFTBadge(
-        user_id=user_id,
-        badge_name=badge_name,
-        token_id=token_id,
-        metadata={
-            "name": badge_name,
-            "description": f"WorkPayAI Achievement: {badge_name}",
-            "image": f"ipfs://QmNFT{badge_name}",
-            "attributes": [
-                {"trait_type": "Achievement", "value": badge_name},
-                {"trait_type": "Minted", "value": datetime.now().isoformat()}
-            ]
-        }
-    )
-    db.add(nft)
-    db.commit()
+    mint_queue.enqueue(user_id, badge_name)
+    minted = mint_queue.flush(db)
+    # A concurrent flush may have minted it, and a badge is only minted once per user
+    nft = db.query(NFTBadge).filter(NFTBadge.user_id == user_id, NFTBadge.badge_name == badge_name).first()
+    if not nft:
+        # A concurrent flush drained this award and hasn't committed it yet
+        raise HTTPException(status_code=409, detail="Badge is still being minted, try again")
     
     return {
-        "token_id": token_id,
+        "token_id": nft.token_id,
         "badge_name": badge_name,
-        "transaction": "0x123abc456def",
-        "ipfs_link": f"ipfs://QmNFT{badge_name}"
+        "transaction": nft.tx_hash,
+        "ipfs_link": nft.token_uri,
+        "status": nft.status,
+        "already_minted": not any(m["token_id"] == nft.token_id for m in minted)
     }
 
 @router.get("/nft/{user_id}")
 async def get_user_nfts(user_id: int, db: Session = Depends(get_db)):
     """Get all NFT badges owned by user"""
-    nfts = db.query(NFTBadge).filter(NFTBadge.user_id == user_id).all()
+    nfts = db.query(NFTBadge).filter(NFTBadge.user_id == user_id).order_by(NFTBadge.id).all()
     return [
         {
             "token_id": nft.token_id,
             "badge_name": nft.badge_name,
-            "metadata": nft.metadata,
+            "metadata": nft.nft_metadata,
+            "token_uri": nft.token_uri,
+            "status": nft.status,
             "created_at": nft.created_at.isoformat()
         }
         for nft in nfts
@@ -86,10 +87,13 @@ async def get_user_nfts(user_id: int, db: Session = Depends(get_db)):
 @router.get("/rewards/{user_id}")
 async def get_crypto_rewards(user_id: int, db: Session = Depends(get_db)):
     """Get crypto rewards summary"""
-    return {
-        "user_id": user_id,
-        "wpay_earned": 150.5,
-        "wpay_to_usd": 150.5 * 0.45,
-        "pending_rewards": 25.0,
-        "total_transactions": 12
-    }
+    return summary(db, user_id)
+
+@router.post("/rewards/settle")
+async def settle_rewards(admin_id: int, min_amount: float = 0, db: Session = Depends(get_db)):
+    """Settle pending WPAY rewards into wallet balances (admin only)"""
+    admin = db.query(User).filter(User.id == admin_id).first()
+    if not admin or admin.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin role required")
+    
+    return settle(db, min_amount)
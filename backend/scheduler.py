@@ -0,0 +1,314 @@
+from sqlalchemy import select, update, or_
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from database import SessionLocal
+from shards import shard_router
+from models import Automation, Integration
+from routes.analytics import create_report
+from webhooks import enqueue_event
+from datetime import datetime, timedelta
+import heapq
+import logging
+import os
+import socket
+import threading
+import uuid
+import zlib
+
+logger = logging.getLogger(__name__)
+
+AUTOMATION_WORKERS = int(os.getenv("AUTOMATION_WORKERS", "4"))
+# Spreads jobs sharing a schedule over this many seconds after the slot
+AUTOMATION_JITTER = int(os.getenv("AUTOMATION_JITTER", "300"))
+AUTOMATION_LEASE_SECONDS = float(os.getenv("AUTOMATION_LEASE_SECONDS", "900"))
+AUTOMATION_REFRESH_INTERVAL = float(os.getenv("AUTOMATION_REFRESH_INTERVAL", "30"))
+
+FREQUENCIES = {
+    "hourly": "0 * * * *",
+    "daily": "0 9 * * *",
+    "weekly": "0 9 * * 1",
+    "monthly": "0 9 1 * *",
+}
+
+
+def _parse_field(field: str, low: int, high: int) -> set:
+    values = set()
+    for part in field.split(","):
+        base, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if base == "*":
+            start, end = low, high
+        elif "-" in base:
+            start, end = map(int, base.split("-"))
+        else:
+            start = int(base)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Field '{field}' out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class Cron:
+    """Five-field cron expression: minute hour day-of-month month day-of-week"""
+
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError("Cron expression needs 5 fields")
+        self.expr = expr
+        self.minutes = _parse_field(fields[0], 0, 59)
+        self.hours = _parse_field(fields[1], 0, 23)
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12)
+        self.weekdays = {d % 7 for d in _parse_field(fields[4], 0, 7)}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, at: datetime) -> bool:
+        in_month = at.day in self.days
+        in_week = (at.weekday() + 1) % 7 in self.weekdays
+        # As in cron, restricting both fields means either may match
+        if self.any_day:
+            return in_week
+        if self.any_weekday:
+            return in_month
+        return in_month or in_week
+
+    def next_after(self, after: datetime) -> datetime:
+        """First matching minute strictly after the given time"""
+        at = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = at + timedelta(days=366 * 5)
+        while at < limit:
+            if at.month not in self.months:
+                at = datetime(at.year + at.month // 12, at.month % 12 + 1, 1)
+            elif not self._day_matches(at):
+                at = datetime(at.year, at.month, at.day) + timedelta(days=1)
+            elif at.hour not in self.hours:
+                at = at.replace(minute=0) + timedelta(hours=1)
+            elif at.minute not in self.minutes:
+                at += timedelta(minutes=1)
+            else:
+                return at
+        raise ValueError(f"Cron expression '{self.expr}' never fires")
+
+
+def parse_frequency(frequency: str) -> Cron:
+    return Cron(FREQUENCIES.get(frequency, frequency))
+
+
+def jitter_seconds(user_id: int, automation_type: str, window: int = AUTOMATION_JITTER) -> int:
+    """Stable per-job offset, so a user's job always runs at the same point in the window"""
+    if window <= 0:
+        return 0
+    return zlib.crc32(f"{user_id}:{automation_type}".encode()) % window
+
+
+def next_run_at(frequency: str, user_id: int, automation_type: str, after: datetime) -> datetime:
+    """Next jittered run strictly after the given time"""
+    jitter = timedelta(seconds=jitter_seconds(user_id, automation_type))
+    return parse_frequency(frequency).next_after(after - jitter) + jitter
+
+
+# Jobs get a catalog session and a session on the shard holding the user's tasks and payments
+def _report_job(db, automation: Automation, user_db):
+    return create_report(user_db, automation.user_id, (automation.config or {}).get("report_type", "performance"))
+
+
+def _review_job(db, automation: Automation, user_db):
+    return create_report(user_db, automation.user_id, "review")
+
+
+def _sync_job(db, automation: Automation, user_db):
+    integrations = db.query(Integration).filter(
+        Integration.user_id == automation.user_id,
+        Integration.is_active == True
+    ).all()
+    enqueue_event(db, automation.user_id, "integrations.sync", {
+        "automation_id": automation.id,
+        "integrations": [{"id": i.id, "type": i.integration_type} for i in integrations]
+    })
+    db.commit()
+    return {"integrations": len(integrations)}
+
+
+AUTOMATION_JOBS = {
+    "report": _report_job,
+    "review": _review_job,
+    "sync": _sync_job,
+}
+
+
+class AutomationScheduler:
+    """Runs due automations on a bounded worker pool.
+
+    Upcoming runs sit in a min-heap keyed by next_run_at, refreshed from
+    the database so schedules made by other app workers are picked up.
+    Before running a job a worker takes a lease on its row; the claim only
+    succeeds while the job is due and unleased, so each run happens once
+    across processes. Missed runs are not backfilled: a job that was due
+    while nothing was running fires once and moves on to its next slot.
+    """
+
+    def __init__(self, session_factory=None, workers: int = AUTOMATION_WORKERS,
+                 lease_seconds: float = AUTOMATION_LEASE_SECONDS,
+                 refresh_interval: float = AUTOMATION_REFRESH_INTERVAL, clock=datetime.utcnow, user_session=None):
+        self.session_factory = session_factory or SessionLocal
+        # Opens the session on a user's shard; with a custom catalog factory and no router, that factory
+        if user_session is None:
+            user_session = shard_router.session if session_factory is None else lambda user_id: self.session_factory()
+        self.user_session = user_session
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.stats = {"succeeded": 0, "failed": 0, "skipped": 0}
+        self._heap = []
+        self._queued = {}
+        self._running = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._refreshed_at = None
+        self._pool = None
+        self._thread = None
+
+    def schedule(self, automation_id: int, at: datetime):
+        """Queue a run; an earlier entry for the same job is superseded"""
+        with self._lock:
+            if self._queued.get(automation_id) == at:
+                return
+            self._queued[automation_id] = at
+            heapq.heappush(self._heap, (at, automation_id))
+        self._wake.set()
+
+    def refresh(self, now: datetime):
+        """Load active jobs due before the next refresh"""
+        horizon = now + timedelta(seconds=self.refresh_interval * 2)
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(Automation.id, Automation.next_run_at)
+                .where(Automation.is_active == True, Automation.next_run_at <= horizon)
+            ).all()
+        for automation_id, at in rows:
+            self.schedule(automation_id, at)
+        self._refreshed_at = now
+
+    def _pop_due(self, now: datetime, limit: int) -> list:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(due) < limit:
+                at, automation_id = heapq.heappop(self._heap)
+                if self._queued.get(automation_id) != at:
+                    continue
+                del self._queued[automation_id]
+                self._running.add(automation_id)
+                due.append(automation_id)
+        return due
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="automation")
+        return self._pool
+
+    def tick(self, now: datetime = None) -> list:
+        """Start every due job that fits in the pool; returns their futures"""
+        now = now or self.clock()
+        if self._refreshed_at is None or (now - self._refreshed_at).total_seconds() >= self.refresh_interval:
+            self.refresh(now)
+        with self._lock:
+            free = self.workers - len(self._running)
+        return [self._executor().submit(self._run, automation_id, now) for automation_id in self._pop_due(now, free)]
+
+    def run_pending(self, now: datetime = None) -> list:
+        """Run due jobs and wait for them (used by tests and one-off runs)"""
+        futures = self.tick(now)
+        wait_futures(futures)
+        return [f.result() for f in futures]
+
+    def _claim(self, db, automation_id: int, now: datetime) -> bool:
+        claimed = db.execute(
+            update(Automation).where(
+                Automation.id == automation_id,
+                Automation.is_active == True,
+                Automation.next_run_at <= now,
+                or_(Automation.lease_until.is_(None), Automation.lease_until < now)
+            ).values(lease_owner=self.owner, lease_until=now + timedelta(seconds=self.lease_seconds))
+        ).rowcount
+        db.commit()
+        return claimed == 1
+
+    def _run(self, automation_id: int, now: datetime):
+        try:
+            with self.session_factory() as db:
+                if not self._claim(db, automation_id, now):
+                    self.stats["skipped"] += 1
+                    return None
+                automation = db.get(Automation, automation_id)
+                try:
+                    with self.user_session(automation.user_id) as user_db:
+                        AUTOMATION_JOBS[automation.automation_type](db, automation, user_db)
+                    status, error = "succeeded", None
+                except Exception as e:
+                    logger.exception("Automation %s failed", automation_id)
+                    db.rollback()
+                    automation = db.get(Automation, automation_id)
+                    status, error = "failed", str(e)
+
+                finished = max(now, self.clock())
+                automation.next_run_at = next_run_at(
+                    automation.frequency, automation.user_id, automation.automation_type, finished
+                )
+                automation.last_run_at = finished
+                automation.last_status = status
+                automation.last_error = error
+                automation.run_count = (automation.run_count or 0) + 1
+                automation.lease_owner = None
+                automation.lease_until = None
+                db.commit()
+                self.stats[status] += 1
+                self.schedule(automation_id, automation.next_run_at)
+                return status
+        finally:
+            with self._lock:
+                self._running.discard(automation_id)
+            self._wake.set()
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("Automation scheduler tick failed")
+            wait = self.refresh_interval
+            with self._lock:
+                # With the pool full, a finishing job wakes us instead
+                if self._heap and len(self._running) < self.workers:
+                    wait = min(wait, max(0.0, (self._heap[0][0] - self.clock()).total_seconds()))
+            self._wake.wait(max(wait, 0.05))
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._loop, name="automation-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def reset(self):
+        with self._lock:
+            self._heap.clear()
+            self._queued.clear()
+        self._refreshed_at = None
+
+
+automation_scheduler = AutomationScheduler()
@@ -0,0 +1,27 @@
+from fraud_sweep import run_sweep, CHUNK_SIZE, CHECKPOINT_PATH
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan all users for fraud patterns")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (0 runs inline)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Users per chunk")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Checkpoint file path")
+    parser.add_argument("--restart", action="store_true", help="Ignore any existing checkpoint")
+    args = parser.parse_args()
+
+    def report(state):
+        print(f"Swept {state['users_scanned']}/{state['total_users']} users, {state['flagged']} flagged (last user {state['last_user_id']})")
+
+    state = run_sweep(
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        resume=not args.restart,
+        checkpoint_path=args.checkpoint,
+        on_progress=report
+    )
+    print(f"Sweep {state['sweep_id']} complete: {state['users_scanned']} users, {state['flagged']} flagged")
+
+
+if __name__ == "__main__":
+    main()
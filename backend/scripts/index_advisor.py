@@ -0,0 +1,55 @@
+import argparse
+import os
+import sys
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report captured queries whose SQLite plan scans a whole table")
+    parser.add_argument("--capture", help="Replay statements saved by --save instead of running the benchmark workload")
+    parser.add_argument("--database", help="SQLite file to explain against (default: DATABASE_URL, or a generated temp dataset)")
+    parser.add_argument("--save", help="Write the captured statements here for later replay")
+    parser.add_argument("--users", type=int, default=50, help="Users in the generated dataset")
+    parser.add_argument("--requests", type=int, default=5, help="Requests per benchmark scenario")
+    args = parser.parse_args()
+
+    if args.database:
+        os.environ["DATABASE_URL"] = f"sqlite:///{args.database}"
+    elif not args.capture:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='workpay-advisor-'), 'advisor.db')}"
+    if not args.capture:
+        for name in ("RATE_LIMIT_USER_BURST", "RATE_LIMIT_USER_RATE", "RATE_LIMIT_ROUTE_BURST", "RATE_LIMIT_ROUTE_RATE"):
+            os.environ[name] = "1e9"
+
+    # The app reads DATABASE_URL at import time
+    from database import engine
+    from query_advisor import QueryCapture, advise
+
+    if args.capture:
+        capture = QueryCapture.load(args.capture)
+    else:
+        from main import app
+        from audit_sink import audit_sink
+        from benchmarks.dataset import generate
+        from benchmarks.runner import run_benchmark
+        from benchmarks.stub_llm import StubGroq, installed
+
+        print(f"Generating dataset in {engine.url.database}", file=sys.stderr)
+        ctx = generate(engine, args.users, 10, 3)
+        with installed(StubGroq(0)), QueryCapture() as capture:
+            run_benchmark(app, ctx, requests=args.requests, concurrency=1, warmup=0)
+            audit_sink.flush()
+        audit_sink.stop()
+    if args.save:
+        capture.save(args.save)
+
+    findings = advise(engine, capture)
+    for finding in findings:
+        print(f"{finding['count']:6}x  full scan of {', '.join(finding['scans'])}")
+        print(f"        {finding['statement'][:300]}")
+    print(f"{len(findings)} of {len(capture.statements)} statements scan a whole table", file=sys.stderr)
+    sys.exit(1 if findings else 0)
+
+
+if __name__ == "__main__":
+    main()
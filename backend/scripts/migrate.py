@@ -0,0 +1,24 @@
+from migrations import MIGRATIONS, applied_versions, upgrade
+from shards import shard_router
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations to the main database and every shard")
+    parser.add_argument("--list", action="store_true", help="Show each migration's status without applying anything")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, engine in shard_router.engines.items():
+            done = applied_versions(engine)
+            for version, description, _ in MIGRATIONS:
+                print(f"{name} {version} {'applied' if version in done else 'pending'}  {description}")
+        return
+    applied = upgrade(shard_router, log=print)
+    for name, versions in applied.items():
+        if not versions:
+            print(f"{name}: up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+from sqlalchemy import select, insert, delete, union, func, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import User, ShardPlacement
+from shards import shard_router, SHARDED_MODELS
+from datetime import datetime
+import argparse
+import hashlib
+import os
+
+REBALANCE_CHUNK_SIZE = int(os.getenv("REBALANCE_CHUNK_SIZE", "1000"))
+
+
+def _place(conn, user_id: int, shard: str):
+    stmt = sqlite_insert(ShardPlacement).values(user_id=user_id, shard=shard, updated_at=datetime.utcnow())
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=[ShardPlacement.user_id],
+        set_={"shard": stmt.excluded.shard, "updated_at": stmt.excluded.updated_at}
+    ))
+
+
+def _digest(row: dict) -> bytes:
+    return hashlib.blake2b(repr(tuple(row.values())).encode(), digest_size=8).digest()
+
+
+def _copy(src_engine, dst_engine, table, user_id: int, chunk_size: int) -> dict:
+    """Copy a user's rows of table in primary key order, one short transaction per chunk.
+
+    Returns each copied row's digest by primary key.
+    """
+    key = tuple_(*table.primary_key.columns)
+    copied = {}
+    last = None
+    while True:
+        stmt = select(table).where(table.c.user_id == user_id).order_by(*table.primary_key.columns).limit(chunk_size)
+        if last is not None:
+            stmt = stmt.where(key > tuple_(*last))
+        with src_engine.connect() as src:
+            batch = [dict(row._mapping) for row in src.execute(stmt)]
+        if not batch:
+            return copied
+        with dst_engine.begin() as dst:
+            # A rerun after a crash finds its copies already there
+            dst.execute(insert(table).prefix_with("OR REPLACE"), batch)
+        for row in batch:
+            copied[tuple(row[c.name] for c in table.primary_key.columns)] = _digest(row)
+        last = tuple(batch[-1][c.name] for c in table.primary_key.columns)
+
+
+def _catch_up(src_engine, dst_engine, table, user_id: int, copied: dict, chunk_size: int) -> int:
+    """Delete a user's rows of table from the source a chunk at a time, carrying over what the copy missed.
+
+    Rows the copy already carried keep their target version, which requests
+    may have changed since the placement moved; rows written or changed on
+    the source after their copy replace it, and copies of rows deleted on
+    the source are deleted too. Returns the rows removed from the source.
+    """
+    columns = list(table.primary_key.columns)
+    key = tuple_(*columns)
+    seen = set()
+    removed = 0
+    while True:
+        with src_engine.connect() as src:
+            batch = [dict(row._mapping) for row in src.execute(
+                delete(table).where(key.in_(
+                    select(*columns).where(table.c.user_id == user_id).limit(chunk_size)
+                )).returning(*table.c)
+            )]
+            if not batch:
+                break
+            changed = []
+            for row in batch:
+                pk = tuple(row[c.name] for c in columns)
+                seen.add(pk)
+                if copied.get(pk) != _digest(row):
+                    changed.append(row)
+            if changed:
+                with dst_engine.begin() as dst:
+                    dst.execute(insert(table).prefix_with("OR REPLACE"), changed)
+            src.commit()
+        removed += len(batch)
+    gone = [pk for pk in copied if pk not in seen]
+    for i in range(0, len(gone), chunk_size):
+        with dst_engine.begin() as dst:
+            dst.execute(delete(table).where(key.in_(gone[i:i + chunk_size])))
+    return removed
+
+
+def move_user(router, user_id: int, source: str, target: str, chunk_size: int = REBALANCE_CHUNK_SIZE) -> int:
+    """Move a user's rows from source to target and point their placement at target.
+
+    Rows are copied in chunks while the user's requests still go to source,
+    then the placement moves and a catch-up pass drains source, again in
+    chunks, carrying over whatever changed there in the meantime. No
+    transaction spans more than one chunk, so the user's writers and every
+    other user on either shard only ever wait for a chunk. Requests that
+    resolved the old placement and write after the catch-up leave
+    stragglers that the next rebalance pass picks up.
+    Returns the rows removed from source.
+    """
+    src_engine, dst_engine = router.engines[source], router.engines[target]
+    copied = {model: _copy(src_engine, dst_engine, model.__table__, user_id, chunk_size) for model in SHARDED_MODELS}
+    with router.catalog.begin() as conn:
+        _place(conn, user_id, target)
+    return sum(
+        _catch_up(src_engine, dst_engine, model.__table__, user_id, copied[model], chunk_size)
+        for model in SHARDED_MODELS
+    )
+
+
+def users_on(engine) -> set:
+    with engine.connect() as conn:
+        return set(conn.execute(union(*[select(model.user_id) for model in SHARDED_MODELS])).scalars())
+
+
+def rebalance(router=shard_router, dry_run: bool = False, log=print, chunk_size: int = REBALANCE_CHUNK_SIZE) -> dict:
+    """Move every user whose rows or placement aren't on their hash-ring shard.
+
+    Safe to run while the app serves traffic, and to rerun: each pass only
+    touches users that are still out of place.
+    """
+    stats = {"users_moved": 0, "rows_moved": 0, "placements": 0}
+    for name, engine in router.engines.items():
+        for user_id in sorted(users_on(engine)):
+            home = router.ring.node(user_id)
+            if home == name:
+                continue
+            stats["users_moved"] += 1
+            if not dry_run:
+                stats["rows_moved"] += move_user(router, user_id, name, home, chunk_size)
+    log(f"Moved {stats['rows_moved']} rows for {stats['users_moved']} users")
+
+    # Users with no rows yet only need their placement repointed
+    with router.catalog.connect() as conn:
+        placements = dict(conn.execute(select(ShardPlacement.user_id, ShardPlacement.shard)).all())
+        for user_id in conn.execute(select(User.id).order_by(User.id)).scalars().all():
+            home = router.ring.node(user_id)
+            if placements.get(user_id, "shard0") != home:
+                stats["placements"] += 1
+                if not dry_run:
+                    _place(conn, user_id, home)
+        conn.commit()
+    log(f"Repointed {stats['placements']} placements")
+    return stats
+
+
+def shard_counts(router=shard_router) -> dict:
+    """Rows per sharded table on each shard, counted on all shards at once"""
+    def count(db):
+        return {model.__tablename__: db.execute(select(func.count()).select_from(model)).scalar() for model in SHARDED_MODELS}
+    return dict(zip(router.engines, router.scatter(count)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move users onto their hash-ring shard after SHARD_URLS changes")
+    parser.add_argument("--dry-run", action="store_true", help="Count what would move without moving it")
+    parser.add_argument("--status", action="store_true", help="Only print row counts per shard")
+    args = parser.parse_args()
+
+    shard_router.create_all()
+    if not args.status:
+        rebalance(dry_run=args.dry_run)
+    for name, counts in shard_counts().items():
+        print(name, " ".join(f"{table}={count}" for table, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+from log_partitions import log_storage, LOG_RETENTION_MONTHS
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partition closed months of audit/fraud logs and archive old partitions")
+    parser.add_argument("--retention-months", type=int, default=LOG_RETENTION_MONTHS, help="Months kept as queryable partitions")
+    args = parser.parse_args()
+
+    moved = log_storage.rotate()
+    for partition, count in moved.items():
+        print(f"Moved {count} rows into {partition}")
+    archived = log_storage.archive(args.retention_months)
+    for key in archived:
+        print(f"Archived partition {key}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,120 +1,373 @@
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine, Base
-from models import User, Task, Payment, Achievement, ChatMessage
+from sqlalchemy import insert, select, func
+from database import engine as default_engine, Base
+from models import User, Task, Payment, Achievement, ChatMessage, AuditLog, FraudLog, CryptoWallet
 from routes.auth import hash_password
+from search import drop_fts_triggers, rebuild_fts
+from dedup_index import task_dedup_index
 from datetime import datetime, timedelta
+import argparse
+import bisect
+import itertools
+import math
 import random
+import time
 
-def seed_database():
-    """Seed database with sample data"""
+# Password of every generated account; the demo accounts keep their own
+PASSWORD = "password123"
+DEMO_USERS = [
+    {"name": "Ahmed Khan", "email": "ahmed@example.com", "password": "password123", "credit_score": 750, "points": 250, "role": "user"},
+    {"name": "Fatima Ali", "email": "fatima@example.com", "password": "password123", "credit_score": 680, "points": 150, "role": "user"},
+    {"name": "Hassan Reza", "email": "hassan@example.com", "password": "password123", "credit_score": 620, "points": 100, "role": "manager"},
+    {"name": "Admin User", "email": "admin@example.com", "password": "admin123", "credit_score": 900, "points": 1000, "role": "admin"},
+]
+
+WORDS = [
+    "invoice", "report", "research", "survey", "translation", "design", "review", "audit",
+    "data", "entry", "mobile", "payment", "customer", "support", "analysis", "market",
+    "logo", "website", "content", "marketing", "spreadsheet", "budget", "training", "video",
+]
+FIRST_NAMES = ["Ahmed", "Fatima", "Hassan", "Nadia", "Rafi", "Sadia", "Tanvir", "Mim", "Karim", "Ayesha", "Imran", "Nusrat"]
+LAST_NAMES = ["Khan", "Ali", "Reza", "Rahman", "Hossain", "Islam", "Ahmed", "Chowdhury", "Sarkar", "Begum"]
+CATEGORIES = (["general", "research", "analysis", "report"], [40, 25, 20, 15])
+VERIFICATION = (["verified", "pending", "review_needed", "rejected"], [70, 15, 10, 5])
+METHODS = (["bKash", "Nagad", "card", "crypto"], [50, 30, 15, 5])
+CHAT_MODES = (["general", "performance", "team", "strategy", "conflict"], [50, 20, 15, 10, 5])
+AUDIT_ACTIONS = (["login", "view", "update", "export", "logout"], [30, 45, 15, 3, 7])
+# Relative activity by hour of day (UTC+6 working hours dominate)
+HOUR_WEIGHTS = [2, 1, 1, 3, 8, 12, 14, 15, 15, 13, 14, 15, 13, 11, 9, 7, 6, 6, 5, 4, 3, 3, 2, 2]
+# Pareto shape; 1.16 puts ~80% of activity on ~20% of users
+ACTIVITY_ALPHA = 1.16
+MAX_ACTIVITY = 200.0
+
+
+def _cumulative(weights):
+    return list(itertools.accumulate(weights))
+
+
+class Generator:
+    """Deterministic synthetic workload for a seed and end date.
+
+    Each user gets a Pareto activity weight that scales how many tasks,
+    chats and audit events they produce. Timestamps follow HOUR_WEIGHTS
+    over the last `days` days. Fraud rings are small groups that share
+    IPs in their audit trail and carry high-confidence fraud logs.
+    """
+
+    def __init__(self, users: int, tasks_per_user: float, chats_per_user: float, audits_per_user: float,
+                 fraud_rings: int, ring_size: int, days: int, seed: int, end: datetime):
+        self.rng = random.Random(seed)
+        self.users = users
+        self.tasks_per_user = tasks_per_user
+        self.chats_per_user = chats_per_user
+        self.audits_per_user = audits_per_user
+        self.fraud_rings = fraud_rings
+        self.ring_size = ring_size
+        self.days = days
+        self.end = end.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.hours = _cumulative(HOUR_WEIGHTS)
+        self.categories = (CATEGORIES[0], _cumulative(CATEGORIES[1]))
+        self.verification = (VERIFICATION[0], _cumulative(VERIFICATION[1]))
+        self.methods = (METHODS[0], _cumulative(METHODS[1]))
+        self.chat_modes = (CHAT_MODES[0], _cumulative(CHAT_MODES[1]))
+        self.audit_actions = (AUDIT_ACTIONS[0], _cumulative(AUDIT_ACTIONS[1]))
+
+    def _pick(self, choices):
+        values, cumulative = choices
+        return values[bisect.bisect(cumulative, self.rng.random() * cumulative[-1])]
+
+    def timestamp(self) -> datetime:
+        random = self.rng.random
+        day = 1 + int(random() * self.days)
+        hour = bisect.bisect(self.hours, random() * self.hours[-1])
+        return self.end + timedelta(seconds=hour * 3600 + int(random() * 3600) - day * 86400)
+
+    def _counts(self, weights: list, total_weight: float, per_user: float) -> list:
+        """Split users * per_user events across users in proportion to weight"""
+        scale = per_user * len(weights) / total_weight
+        counts = []
+        for weight in weights:
+            expected = weight * scale
+            count = int(expected)
+            counts.append(count + (1 if self.rng.random() < expected - count else 0))
+        return counts
+
+    def plan_users(self, first_id: int):
+        rng = self.rng
+        self.first_id = first_id
+        self.weights = [min(rng.paretovariate(ACTIVITY_ALPHA), MAX_ACTIVITY) for _ in range(self.users)]
+        total = sum(self.weights) or 1.0
+        self.task_counts = self._counts(self.weights, total, self.tasks_per_user)
+        self.chat_counts = self._counts(self.weights, total, self.chats_per_user)
+        self.audit_counts = self._counts(self.weights, total, self.audits_per_user)
+        size = min(self.ring_size, self.users)
+        self.rings = {}
+        for ring in range(self.fraud_rings if size > 1 else 0):
+            for index in rng.sample(range(self.users), size):
+                self.rings.setdefault(first_id + index, ring)
+
+    @staticmethod
+    def home_ip(user_id: int) -> str:
+        return f"10.{(user_id >> 16) & 255}.{(user_id >> 8) & 255}.{user_id & 255}"
+
+    @staticmethod
+    def ring_ip(ring: int) -> str:
+        # Public, since private and reserved addresses never link users into a ring
+        return f"93.184.{(ring >> 8) & 255}.{ring & 255}"
+
+    def user_rows(self, demo_hashes: dict, common_hash: str):
+        rng = self.rng
+        demo = DEMO_USERS if demo_hashes else []
+        for index in range(self.users):
+            user_id = self.first_id + index
+            created = self.timestamp() - timedelta(days=self.days)
+            row = {
+                "id": user_id,
+                "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                "email": f"user{user_id}@example.com",
+                "hashed_password": common_hash,
+                "wallet_id": f"WALLET_{user_id:08d}",
+                "credit_score": round(min(850, max(300, rng.gauss(650, 80)))),
+                "points": min(int(self.weights[index] * 40), 5000),
+                "two_factor_enabled": rng.random() < 0.2,
+                "role": "manager" if rng.random() < 0.01 else "user",
+                "created_at": created,
+                "updated_at": created
+            }
+            if index < len(demo):
+                spec = demo[index]
+                row.update(name=spec["name"], email=spec["email"], hashed_password=demo_hashes[spec["email"]],
+                           credit_score=spec["credit_score"], points=spec["points"], role=spec["role"])
+            yield row
+
+    def task_and_payment_rows(self, first_task_id: int):
+        """(task, payment) pairs, one payment per task"""
+        rng = self.rng
+        task_id = first_task_id
+        for index, count in enumerate(self.task_counts):
+            user_id = self.first_id + index
+            in_ring = user_id in self.rings
+            for _ in range(count):
+                created = self.timestamp()
+                status = self._pick(self.verification)
+                amount = round(min(2000, rng.lognormvariate(math.log(60), 0.6)), 2)
+                paid = status == "verified" and rng.random() < 0.8
+                risk = round(rng.uniform(0.4, 0.9) if in_ring else rng.betavariate(1.2, 12), 3)
+                held = in_ring and not paid and rng.random() < 0.5
+                task = {
+                    "id": task_id,
+                    "user_id": user_id,
+                    "description": " ".join(rng.sample(WORDS, rng.randint(3, 6))),
+                    "category": self._pick(self.categories),
+                    "ai_score": round(rng.uniform(0.7, 1.0) if status == "verified" else rng.uniform(0.2, 0.75), 3),
+                    "verification_status": status,
+                    "payment_status": "paid" if paid else "unpaid",
+                    "amount": amount,
+                    "created_at": created,
+                    "updated_at": created
+                }
+                payment = {
+                    "user_id": user_id,
+                    "task_id": task_id,
+                    "amount": amount,
+                    "method": self._pick(self.methods),
+                    "status": "completed" if paid else ("held" if held else "pending"),
+                    "risk_score": risk,
+                    "created_at": created,
+                    "updated_at": created
+                }
+                task_id += 1
+                yield task, payment
+
+    def chat_rows(self):
+        rng = self.rng
+        for index, count in enumerate(self.chat_counts):
+            user_id = self.first_id + index
+            for n in range(count):
+                mode = self._pick(self.chat_modes)
+                created = self.timestamp()
+                if n % 2:
+                    content = f"Here are some ideas to improve your {' '.join(rng.sample(WORDS, 2))} work."
+                else:
+                    content = f"How do I improve my {' '.join(rng.sample(WORDS, 3))}?"
+                yield {
+                    "user_id": user_id,
+                    "content": content,
+                    "sender": "assistant" if n % 2 else "user",
+                    "analysis_mode": mode,
+                    "created_at": created
+                }
+
+    def audit_rows(self):
+        rng = self.rng
+        for index, count in enumerate(self.audit_counts):
+            user_id = self.first_id + index
+            ring = self.rings.get(user_id)
+            for _ in range(count):
+                shared = ring is not None and rng.random() < 0.5
+                yield {
+                    "user_id": user_id,
+                    "action": self._pick(self.audit_actions),
+                    "resource": rng.choice(["user", "task", "payment", "dashboard", "report"]),
+                    "details": None,
+                    "ip_address": self.ring_ip(ring) if shared else self.home_ip(user_id),
+                    "created_at": self.timestamp()
+                }
+
+    def fraud_rows(self):
+        rng = self.rng
+        for user_id, ring in sorted(self.rings.items()):
+            for _ in range(rng.randint(1, 3)):
+                yield {
+                    "user_id": user_id,
+                    "event_type": "fraud_scan",
+                    "confidence": round(rng.uniform(0.6, 0.95), 3),
+                    "details": {"red_flags": ["shared_ip", "velocity_spike"], "ring": ring},
+                    "created_at": self.timestamp()
+                }
+        for index in range(self.users):
+            if rng.random() < 0.02:
+                yield {
+                    "user_id": self.first_id + index,
+                    "event_type": "fraud_scan",
+                    "confidence": round(rng.uniform(0.02, 0.3), 3),
+                    "details": {"red_flags": []},
+                    "created_at": self.timestamp()
+                }
+
+    def wallet_rows(self):
+        for index in range(self.users):
+            if self.rng.random() < 0.3:
+                user_id = self.first_id + index
+                yield {"user_id": user_id, "wallet_address": f"0x{user_id:040x}", "balance": 0.0,
+                       "wallet_type": self.rng.choice(["metamask", "walletconnect"]), "created_at": self.timestamp()}
+
+    def achievement_rows(self):
+        now = self.end - timedelta(days=1)
+        for index, weight in enumerate(self.weights):
+            if min(int(weight * 40), 5000) >= 500:
+                yield {"user_id": self.first_id + index, "badge_name": "Leadership", "points_earned": 0, "unlocked_at": now}
+
+
+def _load(conn, table, rows, batch_size: int) -> int:
+    """executemany rows into table batch_size at a time"""
+    count = 0
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return count
+        conn.execute(insert(table), batch)
+        count += len(batch)
+
+
+def _next_id(conn, model) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def apply_bulk_pragmas(conn):
+    """Trade durability for load speed on this connection; a crash mid-seed means re-seeding"""
+    if conn.dialect.name != "sqlite":
+        return
+    for pragma in ("synchronous = OFF", "journal_mode = MEMORY", "temp_store = MEMORY", "cache_size = -262144"):
+        conn.exec_driver_sql(f"PRAGMA {pragma}")
+
+
+def reset(conn):
+    """Delete every row, children before parents"""
+    for table in reversed(Base.metadata.sorted_tables):
+        conn.execute(table.delete())
+
+
+def seed_database(engine=None, users: int = 1000, tasks_per_user: float = 20, chats_per_user: float = 6,
+                  audits_per_user: float = 30, fraud_rings: int = 10, ring_size: int = 5, days: int = 90,
+                  seed: int = 42, end: datetime = None, batch_size: int = 20000, clear: bool = False,
+                  demo: bool = True, log=print) -> dict:
+    """Generate the synthetic dataset into engine and return row counts per table"""
+    engine = engine or default_engine
     Base.metadata.create_all(bind=engine)
-    db = SessionLocal()
-    
-    try:
-        # Clear existing data
-        db.query(User).delete()
-        db.query(Task).delete()
-        db.query(Payment).delete()
-        db.query(Achievement).delete()
-        db.query(ChatMessage).delete()
-        
-        # Create sample users
-        users = [
-            User(
-                name="Ahmed Khan",
-                email="ahmed@example.com",
-                hashed_password=hash_password("password123"),
-                wallet_id="WALLET_001",
-                credit_score=750,
-                points=250,
-                role="user"
-            ),
-            User(
-                name="Fatima Ali",
-                email="fatima@example.com",
-                hashed_password=hash_password("password123"),
-                wallet_id="WALLET_002",
-                credit_score=680,
-                points=150,
-                role="user"
-            ),
-            User(
-                name="Hassan Reza",
-                email="hassan@example.com",
-                hashed_password=hash_password("password123"),
-                wallet_id="WALLET_003",
-                credit_score=620,
-                points=100,
-                role="manager"
-            ),
-            User(
-                name="Admin User",
-                email="admin@example.com",
-                hashed_password=hash_password("admin123"),
-                wallet_id="WALLET_ADMIN",
-                credit_score=900,
-                points=1000,
-                role="admin"
-            ),
-        ]
-        
-        for user in users:
-            db.add(user)
-        
-        db.commit()
-        
-        # Create sample tasks and payments
-        for user in users:
-            for i in range(5):
-                task = Task(
-                    user_id=user.id,
-                    description=f"Sample task {i+1} for {user.name}",
-                    category=random.choice(["general", "research", "analysis", "report"]),
-                    ai_score=random.uniform(0.6, 1.0),
-                    verification_status=random.choice(["verified", "pending", "review_needed"]),
-                    payment_status=random.choice(["paid", "unpaid"]),
-                    amount=random.uniform(30, 150),
-                    created_at=datetime.utcnow() - timedelta(days=random.randint(1, 30))
-                )
-                db.add(task)
-                db.commit()
-                
-                # Create payment for task
-                payment = Payment(
-                    user_id=user.id,
-                    task_id=task.id,
-                    amount=task.amount,
-                    method=random.choice(["bKash", "Nagad", "card"]),
-                    status=task.payment_status,
-                    risk_score=random.uniform(0, 0.3)
-                )
-                db.add(payment)
-        
-        db.commit()
-        
-        # Create sample achievements
-        achievements = [
-            Achievement(user_id=users[0].id, badge_name="Task Master", points_earned=100),
-            Achievement(user_id=users[0].id, badge_name="Perfect Score", points_earned=50),
-            Achievement(user_id=users[1].id, badge_name="Speed Demon", points_earned=75),
-            Achievement(user_id=users[2].id, badge_name="Leadership", points_earned=0),
-        ]
-        
-        for achievement in achievements:
-            db.add(achievement)
-        
-        db.commit()
-        
-        print("Database seeded successfully!")
-        print(f"Created {len(users)} users")
-        print(f"Created {sum(5 for u in users)} tasks and payments")
-        print(f"Created {len(achievements)} achievements")
-        
-    except Exception as e:
-        print(f"Error seeding database: {e}")
-        db.rollback()
-    finally:
-        db.close()
+    generator = Generator(users, tasks_per_user, chats_per_user, audits_per_user, fraud_rings, ring_size,
+                          days, seed, end or datetime.utcnow())
+    counts = {}
+
+    with engine.connect() as conn:
+        apply_bulk_pragmas(conn)
+        conn.commit()
+        with conn.begin():
+            drop_fts_triggers(conn)
+            if clear:
+                reset(conn)
+            existing = set(conn.execute(select(User.email).where(User.email.in_([u["email"] for u in DEMO_USERS]))).scalars())
+            demo_hashes = {u["email"]: hash_password(u["password"]) for u in DEMO_USERS} if demo and not existing else {}
+            common_hash = hash_password(PASSWORD)
+            generator.plan_users(_next_id(conn, User))
+
+        def phase(name, load):
+            start = time.perf_counter()
+            with conn.begin():
+                counts[name] = load()
+            elapsed = time.perf_counter() - start
+            log(f"{name}: {counts[name]} rows in {elapsed:.1f}s ({counts[name] / max(elapsed, 1e-9):,.0f}/s)")
+
+        phase("users", lambda: _load(conn, User.__table__, generator.user_rows(demo_hashes, common_hash), batch_size))
+
+        def load_tasks():
+            tasks = payments = 0
+            pairs = generator.task_and_payment_rows(_next_id(conn, Task))
+            while True:
+                batch = list(itertools.islice(pairs, batch_size))
+                if not batch:
+                    counts["payments"] = payments
+                    return tasks
+                conn.execute(insert(Task.__table__), [task for task, _ in batch])
+                conn.execute(insert(Payment.__table__), [payment for _, payment in batch])
+                tasks += len(batch)
+                payments += len(batch)
+
+        phase("tasks", load_tasks)
+        phase("task_signatures", lambda: task_dedup_index.index_unsigned(conn, chunk_size=batch_size))
+        phase("chat_messages", lambda: _load(conn, ChatMessage.__table__, generator.chat_rows(), batch_size))
+        phase("audit_logs", lambda: _load(conn, AuditLog.__table__, generator.audit_rows(), batch_size))
+        phase("fraud_logs", lambda: _load(conn, FraudLog.__table__, generator.fraud_rows(), batch_size))
+        phase("crypto_wallets", lambda: _load(conn, CryptoWallet.__table__, generator.wallet_rows(), batch_size))
+        phase("achievements", lambda: _load(conn, Achievement.__table__, generator.achievement_rows(), batch_size))
+
+        start = time.perf_counter()
+        with conn.begin():
+            rebuild_fts(conn)
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("ANALYZE")
+            conn.commit()
+        log(f"Search index and statistics rebuilt in {time.perf_counter() - start:.1f}s")
+
+    counts["fraud_ring_members"] = len(generator.rings)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic dataset")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--tasks-per-user", type=float, default=20, help="Mean; activity per user is power-law distributed")
+    parser.add_argument("--chats-per-user", type=float, default=6)
+    parser.add_argument("--audits-per-user", type=float, default=30)
+    parser.add_argument("--fraud-rings", type=int, default=10, help="Clusters of users sharing IPs with high fraud scores")
+    parser.add_argument("--ring-size", type=int, default=5)
+    parser.add_argument("--days", type=int, default=90, help="History span ending today")
+    parser.add_argument("--end-date", type=lambda s: datetime.strptime(s, "%Y-%m-%d"), help="Last day of history (YYYY-MM-DD), for byte-identical reruns")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=20000, help="Rows per executemany")
+    parser.add_argument("--reset", action="store_true", help="Delete all existing rows first")
+    parser.add_argument("--no-demo", action="store_true", help="Skip the demo login accounts")
+    args = parser.parse_args()
+
+    counts = seed_database(
+        users=args.users, tasks_per_user=args.tasks_per_user, chats_per_user=args.chats_per_user,
+        audits_per_user=args.audits_per_user, fraud_rings=args.fraud_rings, ring_size=args.ring_size,
+        days=args.days, seed=args.seed, end=args.end_date, batch_size=args.batch_size,
+        clear=args.reset, demo=not args.no_demo
+    )
+    print("Database seeded: " + ", ".join(f"{count} {name}" for name, count in counts.items()))
+    print("Run python -m scripts.rotate_logs to move closed months of logs into partitions")
+
 
 if __name__ == "__main__":
-    seed_database()
+    main()
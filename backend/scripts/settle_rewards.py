@@ -0,0 +1,23 @@
+from database import SessionLocal
+from rewards import settle, rebuild_balances
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Settle pending WPAY rewards into wallet balances")
+    parser.add_argument("--min-amount", type=float, default=0, help="Leave users with less pending than this for a later run")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute running balances from the accrual ledger first")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.rebuild:
+            print(f"Rebuilt balances for {rebuild_balances(db)} users")
+        result = settle(db, args.min_amount)
+        print(f"Settlement {result['settlement_id']}: {result['total']} WPAY to {result['users']} users")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
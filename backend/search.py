@@ -0,0 +1,139 @@
+from fastapi import HTTPException
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from database import Base
+
+# External-content FTS5 tables mirroring searchable columns, kept in sync by triggers.
+# user_id is indexed too, so a search matches only the user's own rows instead of filtering platform-wide matches.
+FTS_TABLES = {
+    "tasks_fts": {
+        "source": "tasks",
+        "column": "description",
+        "fields": ["category", "verification_status", "created_at"],
+    },
+    "chat_messages_fts": {
+        "source": "chat_messages",
+        "column": "content",
+        "fields": ["sender", "analysis_mode", "created_at"],
+    },
+}
+
+
+def _fts_ddl(fts: str, source: str, column: str) -> list:
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {column}, user_id,
+            content='{source}', content_rowid='id', tokenize='porter unicode61'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN
+            INSERT INTO {fts}(rowid, {column}, user_id) VALUES (new.id, new.{column}, new.user_id);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {column}, user_id) VALUES ('delete', old.id, old.{column}, old.user_id);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column}, user_id ON {source} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {column}, user_id) VALUES ('delete', old.id, old.{column}, old.user_id);
+            INSERT INTO {fts}(rowid, {column}, user_id) VALUES (new.id, new.{column}, new.user_id);
+        END""",
+    ]
+
+
+def install_fts(connection):
+    """Create FTS tables and triggers, backfilling any table created just now"""
+    if connection.dialect.name != "sqlite":
+        return
+    existing = set(connection.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'table'")
+    ).scalars())
+    for fts, spec in FTS_TABLES.items():
+        if spec["source"] not in existing:
+            continue
+        for statement in _fts_ddl(fts, spec["source"], spec["column"]):
+            connection.exec_driver_sql(statement)
+        if fts not in existing:
+            connection.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def recreate_fts(connection):
+    """Drop every FTS table and its triggers and build them again from their sources"""
+    if connection.dialect.name != "sqlite":
+        return
+    drop_fts_triggers(connection)
+    for fts in FTS_TABLES:
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {fts}")
+    install_fts(connection)
+
+
+def drop_fts_triggers(connection):
+    """Stop syncing FTS tables, e.g. for a bulk load; rebuild_fts brings them back in step"""
+    if connection.dialect.name != "sqlite":
+        return
+    for fts in FTS_TABLES:
+        for suffix in ("ai", "ad", "au"):
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+
+
+def rebuild_fts(connection):
+    """Recreate the sync triggers and reindex every FTS table from its source"""
+    if connection.dialect.name != "sqlite":
+        return
+    install_fts(connection)
+    for fts in FTS_TABLES:
+        connection.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_fts(target, connection, **kw):
+    install_fts(connection)
+
+
+def fts_query(q: str) -> str:
+    """Quote each term so user input can't break FTS5 syntax; a trailing * keeps prefix matching"""
+    terms = []
+    for term in q.split():
+        prefix = term.endswith("*")
+        term = term.rstrip("*").replace('"', '""')
+        if term:
+            terms.append(f'"{term}"*' if prefix else f'"{term}"')
+    return " ".join(terms)
+
+
+MAX_PAGE_SIZE = 100
+
+
+def search(db: Session, fts: str, user_id: int, q: str, limit: int = 20, offset: int = 0) -> dict:
+    """Ranked full-text matches for one user, one page at a time"""
+    spec = FTS_TABLES[fts]
+    # Raw SQL carries no table for the session to route on, so bind to the source table's shard
+    bind_arguments = {"clause": Base.metadata.tables[spec["source"]]}
+    if db.get_bind(**bind_arguments).dialect.name != "sqlite":
+        raise HTTPException(status_code=501, detail="Full-text search requires SQLite FTS5")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    offset = max(0, offset)
+    terms = fts_query(q)
+    if not terms:
+        return {"results": [], "limit": limit, "offset": offset, "next_offset": None}
+
+    source, column = spec["source"], spec["column"]
+    # Terms only match the text column; user_id is weighted 0 in bm25 below
+    match = f'user_id : "{int(user_id)}" AND {column} : ({terms})'
+    fields = ", ".join(f"s.{field}" for field in spec["fields"])
+    rows = db.execute(text(f"""
+        SELECT s.id, s.{column}, {fields},
+               snippet({fts}, 0, '[', ']', '...', 12) AS snippet,
+               bm25({fts}, 1.0, 0.0) AS rank
+        FROM {fts}
+        JOIN {source} s ON s.id = {fts}.rowid
+        WHERE {fts} MATCH :match
+        ORDER BY rank
+        LIMIT :limit OFFSET :offset
+    """), {"match": match, "limit": limit + 1, "offset": offset},
+        bind_arguments=bind_arguments).mappings().all()
+
+    has_more = len(rows) > limit
+    return {
+        "results": [dict(row) for row in rows[:limit]],
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if has_more else None,
+    }
@@ -0,0 +1,24 @@
+from sqlalchemy import update, insert
+from sqlalchemy.exc import IntegrityError
+from models import IdSequence
+
+
+def allocate_ids(db, name: str, count: int, first=None) -> range:
+    """Reserve count consecutive values from a named counter in the caller's transaction.
+
+    db is a Session or Connection. The counter row stays write-locked until
+    commit, so concurrent writers get disjoint, increasing blocks. A new
+    counter starts at 1, or at first() when given.
+    """
+    end = db.execute(
+        update(IdSequence).where(IdSequence.name == name)
+        .values(value=IdSequence.value + count).returning(IdSequence.value)
+    ).scalar()
+    if end is None:
+        try:
+            with db.begin_nested():
+                db.execute(insert(IdSequence).values(name=name, value=(first() if first else 1) - 1))
+        except IntegrityError:
+            pass  # Another writer created it first
+        return allocate_ids(db, name, count, first)
+    return range(end - count + 1, end + 1)
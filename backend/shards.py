@@ -0,0 +1,269 @@
+from fastapi import Request
+from sqlalchemy import event, select, insert, delete, func
+from sqlalchemy.orm import Session, sessionmaker
+from database import engine as default_engine, read_engine as default_read_engine, Base, READ_METHODS, make_write_engine, make_read_engine
+from models import User, Task, TaskSignature, TaskSignatureBand, Payment, ChatMessage, AIInsight, IdSequence, ShardPlacement, WebhookOutbox, FraudLog, RewardAccrual
+from sequences import allocate_ids
+from rewards import accrue
+from concurrent.futures import ThreadPoolExecutor
+import bisect
+import hashlib
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Extra SQLite databases, in order; shard0 is the main database, which stays the catalog.
+# Append new shards at the end: a shard's name is its position.
+SHARD_URLS = [url.strip() for url in os.getenv("SHARD_URLS", "").split(",") if url.strip()]
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+# New ids on shard i are multiples of this plus i, so shards never hand out the same id
+SHARD_ID_STRIDE = 1024
+
+# Per-user tables that live on the user's shard; everything else (users, leaderboard,
+# rewards, webhooks, logs) stays in the catalog
+SHARDED_MODELS = (Task, TaskSignature, TaskSignatureBand, Payment, ChatMessage, AIInsight)
+# Catalog tables that shard sessions write on the shard, in the same transaction as the
+# user's rows; relay() then moves them into the catalog
+RELAYED_MODELS = (WebhookOutbox, FraudLog, RewardAccrual)
+SHARD_RELAY_INTERVAL = float(os.getenv("SHARD_RELAY_INTERVAL", "1"))
+SHARD_RELAY_BATCH_SIZE = int(os.getenv("SHARD_RELAY_BATCH_SIZE", "1000"))
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring: each shard owns many points and a key goes to the next one clockwise.
+
+    Adding a shard only takes over the keys that now land on its points,
+    about 1/N of them, so a rebalance moves that many users and no more.
+    """
+
+    def __init__(self, nodes, vnodes: int = SHARD_VNODES):
+        self.points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self._keys = [point for point, _ in self.points]
+
+    def node(self, key) -> str:
+        i = bisect.bisect(self._keys, _hash(str(key))) % len(self._keys)
+        return self.points[i][1]
+
+
+class ShardRouter:
+    """Routes a user's tasks, payments and chat to the SQLite database holding them.
+
+    A user's shard is their ShardPlacement row, set from the hash ring at
+    signup; users from before sharding have none and stay on shard0 until
+    scripts.rebalance_shards moves them. Shard sessions bind the sharded
+    tables to the shard and everything else to the catalog, so writers on
+    different shards never wait on each other's lock. The webhook outbox,
+    fraud logs and reward accruals a request writes alongside a user's rows
+    go to the shard too, so the request commits to one database; relay()
+    moves them to the catalog. With no SHARD_URLS there is just shard0 and
+    sessions are plain catalog sessions.
+
+    Every shard also has a read-only engine; read sessions bind to those.
+    """
+
+    def __init__(self, catalog=None, urls=None, vnodes: int = SHARD_VNODES, read_catalog=None):
+        if catalog is None:
+            catalog, read_catalog = default_engine, default_read_engine
+        self.configure(catalog, SHARD_URLS if urls is None else urls, vnodes, read_catalog)
+        self._relay_thread = None
+        self._relay_stopping = threading.Event()
+
+    def configure(self, catalog, urls=(), vnodes: int = SHARD_VNODES, read_catalog=None):
+        self.catalog = catalog
+        self.read_catalog = read_catalog or catalog
+        self.engines = {"shard0": catalog}
+        self.read_engines = {"shard0": self.read_catalog}
+        for i, url in enumerate(urls, 1):
+            self.engines[f"shard{i}"] = make_write_engine(url)
+            self.read_engines[f"shard{i}"] = make_read_engine(url, self.engines[f"shard{i}"])
+        self.ring = HashRing(list(self.engines), vnodes)
+        self._factories = {name: self._session_factory(engine) for name, engine in self.engines.items()}
+        self._read_factories = {
+            name: self._session_factory(engine, self.read_catalog) for name, engine in self.read_engines.items()
+        }
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.engines) > 1
+
+    def _session_factory(self, engine, catalog=None):
+        catalog = catalog or self.catalog
+        if engine is catalog:
+            factory = sessionmaker(autocommit=False, autoflush=False, bind=catalog)
+        else:
+            factory = sessionmaker(
+                autocommit=False, autoflush=False, bind=catalog,
+                binds={model: engine for model in SHARDED_MODELS + RELAYED_MODELS}
+            )
+        if self.sharded:
+            event.listen(factory, "before_flush", self._assign_ids)
+        return factory
+
+    def create_all(self):
+        """Create the sharded and relayed tables, with their FTS indexes and id counters, on every extra shard"""
+        tables = [model.__table__ for model in SHARDED_MODELS + RELAYED_MODELS] + [IdSequence.__table__]
+        for engine in self.engines.values():
+            if engine is not self.catalog:
+                Base.metadata.create_all(bind=engine, tables=tables)
+
+    def shard_for(self, user_id: int) -> str:
+        if not self.sharded:
+            return "shard0"
+        with self.read_catalog.connect() as conn:
+            shard = conn.execute(
+                select(ShardPlacement.shard).where(ShardPlacement.user_id == user_id)
+            ).scalar()
+        return shard or "shard0"
+
+    def session(self, user_id: int, read_only: bool = False) -> Session:
+        factories = self._read_factories if read_only else self._factories
+        return factories[self.shard_for(user_id)]()
+
+    def shard_of(self, column, value) -> str:
+        """Shard holding a row where column == value, e.g. a task by id; shard0 if none does"""
+        if self.sharded:
+            for name, engine in self.read_engines.items():
+                with engine.connect() as conn:
+                    if conn.execute(select(column).where(column == value).limit(1)).first():
+                        return name
+        return "shard0"
+
+    def session_for(self, column, value) -> Session:
+        return self._factories[self.shard_of(column, value)]()
+
+    def scatter(self, fn) -> list:
+        """Run fn(session) on every shard at once; results come back in shard order"""
+        def run(factory):
+            with factory() as db:
+                return fn(db)
+
+        if not self.sharded:
+            return [run(self._factories["shard0"])]
+        with ThreadPoolExecutor(max_workers=len(self._factories)) as pool:
+            return list(pool.map(run, self._factories.values()))
+
+    def gather(self, stmt, db: Session = None):
+        """Rows of a select over a sharded table from every shard in turn; unsharded, just db's"""
+        if not self.sharded and db is not None:
+            yield from db.execute(stmt)
+            return
+        for engine in self.read_engines.values():
+            with engine.connect() as conn:
+                yield from conn.execute(stmt)
+
+    def new_ids(self, db: Session, model, count: int) -> list:
+        """Ids for new rows of a sharded table, unique across shards so rows can move.
+
+        Each shard hands out ids ending in its own index (id % SHARD_ID_STRIDE)
+        from a counter in its own database, inside db's transaction, so no
+        other database is locked. Unsharded, each id is None and the
+        database assigns it as before.
+        """
+        if not self.sharded or not count:
+            return [None] * count
+        conn = db.connection(bind_arguments={"mapper": model})
+        index = list(self.engines.values()).index(conn.engine)
+        counter = allocate_ids(conn, f"shard:{model.__tablename__}", count, first=lambda: self._first_counter(model))
+        return [n * SHARD_ID_STRIDE + index for n in counter]
+
+    def relay(self, limit: int = SHARD_RELAY_BATCH_SIZE) -> int:
+        """Move rows written on the extra shards for the catalog (RELAYED_MODELS) into it.
+
+        Rows are copied into the catalog, then deleted from their shard. A
+        crash in between copies them again on the next run: webhook events
+        and fraud logs are at-least-once, and a repeated accrual is ignored
+        by its (user_id, source, source_id) key, so balances are credited once.
+        """
+        moved = 0
+        for engine in self.engines.values():
+            if engine is self.catalog:
+                continue
+            for model in RELAYED_MODELS:
+                table = model.__table__
+                with engine.connect() as conn:
+                    rows = conn.execute(select(table).order_by(table.c.id).limit(limit)).mappings().all()
+                if not rows:
+                    continue
+                with Session(self.catalog) as db:
+                    if model is RewardAccrual:
+                        for row in rows:
+                            accrue(db, row["user_id"], row["source"], row["source_id"], row["amount"])
+                    else:
+                        # Catalog ids are its own; shard ids only order the relay
+                        db.execute(insert(table), [{k: v for k, v in row.items() if k != "id"} for row in rows])
+                    db.commit()
+                with engine.begin() as conn:
+                    conn.execute(delete(table).where(table.c.id.in_([row["id"] for row in rows])))
+                moved += len(rows)
+        return moved
+
+    def _relay_loop(self, interval: float):
+        while not self._relay_stopping.is_set():
+            try:
+                # A full batch means more is waiting, so go again straight away
+                if self.relay() >= SHARD_RELAY_BATCH_SIZE:
+                    continue
+            except Exception:
+                logger.exception("Shard relay failed")
+            self._relay_stopping.wait(interval)
+
+    def start_relay(self, interval: float = SHARD_RELAY_INTERVAL):
+        if self._relay_thread is None or not self._relay_thread.is_alive():
+            self._relay_stopping.clear()
+            self._relay_thread = threading.Thread(target=self._relay_loop, args=(interval,), name="shard-relay", daemon=True)
+            self._relay_thread.start()
+
+    def stop_relay(self, timeout: float = 10.0):
+        self._relay_stopping.set()
+        if self._relay_thread is not None:
+            self._relay_thread.join(timeout)
+            self._relay_thread = None
+
+    def _first_counter(self, model) -> int:
+        # Start past every id already in use, e.g. shard0's from before sharding
+        top = 0
+        for engine in self.engines.values():
+            with engine.connect() as conn:
+                top = max(top, conn.execute(select(func.max(model.id))).scalar() or 0)
+        return top // SHARD_ID_STRIDE + 1
+
+    def _assign_ids(self, session, flush_context, instances):
+        for model in SHARDED_MODELS:
+            pending = [obj for obj in session.new if type(obj) is model and obj.id is None]
+            for obj, row_id in zip(pending, self.new_ids(session, model, len(pending))):
+                obj.id = row_id
+
+
+shard_router = ShardRouter()
+
+
+@event.listens_for(User, "after_insert")
+def _place_new_user(mapper, connection, target):
+    if shard_router.sharded and connection.engine is shard_router.catalog:
+        connection.execute(
+            insert(ShardPlacement).values(user_id=target.id, shard=shard_router.ring.node(target.id))
+        )
+
+
+def get_user_db(user_id: int, request: Request):
+    """Dependency to get a session on the shard holding user_id's data; read-only for GET and HEAD"""
+    db = shard_router.session(user_id, read_only=request.method in READ_METHODS)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_task_db(task_id: int):
+    """Dependency to get a session on the shard holding task_id"""
+    db = shard_router.session_for(Task.id, task_id)
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,99 @@
+import os
+
+# Keep the module-level engine off the real database file
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import get_db
+from fraud_monitor import velocity_monitor
+from fraud_graph import fraud_ring_index
+from audit_sink import audit_sink
+from rate_limit import rate_limiter
+from response_cache import response_cache
+from shards import ShardRouter, shard_router
+from migrations import upgrade
+from main import app
+from benchmarks.stub_llm import StubGroq, installed
+import models
+
+
+@pytest.fixture
+def engine():
+    """Fresh in-memory database per test"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    # The same explicit migration step deploys run (scripts.migrate)
+    upgrade(ShardRouter(engine, urls=()), log=lambda message: None)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    def _make_user(name="Test User", **fields):
+        count = db.query(models.User).count()
+        user = models.User(
+            name=name,
+            email=fields.pop("email", f"user{count}@example.com"),
+            hashed_password=fields.pop("hashed_password", "x"),
+            wallet_id=fields.pop("wallet_id", f"WALLET_{count}"),
+            **fields
+        )
+        db.add(user)
+        db.commit()
+        return user
+    return _make_user
+
+
+@pytest.fixture
+def client(engine):
+    """TestClient for the app with get_db bound to the test database"""
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def reset_indexes():
+        velocity_monitor.reset()
+        fraud_ring_index.reset()
+        rate_limiter.reset()
+        response_cache.clear()
+
+    app.dependency_overrides[get_db] = override_get_db
+    default_engine, audit_sink.engine = audit_sink.engine, engine
+    shard_router.configure(engine)
+    reset_indexes()
+    yield TestClient(app)
+    audit_sink.flush()
+    audit_sink.engine = default_engine
+    shard_router.configure(default_engine)
+    reset_indexes()
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def stub_llm():
+    """Deterministic in-process LLM installed in every route module"""
+    with installed(StubGroq()) as stub:
+        yield stub
@@ -0,0 +1,39 @@
+import pytest
+from audit_sink import AuditSink, AuditBackpressure, audit_sink
+from models import AuditLog
+
+
+def test_sink_batches_and_flushes(engine, db, make_user):
+    user = make_user()
+    sink = AuditSink(engine=engine, batch_size=10, flush_interval=60)
+    for i in range(25):
+        sink.emit(user.id, "view", f"task/{i}", ip_address="203.0.113.1")
+    assert sink.flush(timeout=5)
+    assert db.query(AuditLog).count() == 25
+    assert sink.written == 25
+
+    sink.emit(user.id, "logout", "user")
+    sink.stop()
+    assert db.query(AuditLog).count() == 26
+
+
+def test_sink_pushes_back_when_full(engine, monkeypatch):
+    sink = AuditSink(engine=engine, max_queue=2)
+    # Without a writer thread nothing drains the queue
+    monkeypatch.setattr(sink, "start", lambda: None)
+    sink.emit(1, "a", "r")
+    sink.emit(1, "b", "r")
+    with pytest.raises(AuditBackpressure):
+        sink.emit(1, "c", "r")
+
+
+def test_audit_endpoint_and_in_process_events(client, db, make_user):
+    user = make_user()
+    response = client.post(f"/api/security/audit-log?user_id={user.id}&action=export&resource=report")
+    assert response.status_code == 200
+    assert client.post("/api/security/audit-log?user_id=999&action=x&resource=y").status_code == 404
+
+    client.post(f"/api/security/rbac/assign-role?user_id={user.id}&role=manager")
+    audit_sink.flush()
+    actions = client.get(f"/api/security/audit-logs/{user.id}").json()["results"]
+    assert sorted(log["action"] for log in actions) == ["assign_role", "export"]
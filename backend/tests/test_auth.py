@@ -0,0 +1,58 @@
+from passlib.context import CryptContext
+from auth_cache import TokenCache, token_cache
+import time
+from routes.auth import hasher_stats, BCRYPT_ROUNDS
+
+
+def test_register_and_login_on_hash_pool(client):
+    payload = {"name": "Nadia", "email": "nadia@example.com", "password": "s3cret", "wallet_id": "W_NADIA"}
+    assert client.post("/api/auth/register", json=payload).status_code == 200
+
+    assert client.post("/api/auth/login?email=nadia@example.com&password=s3cret").status_code == 200
+    assert client.post("/api/auth/login?email=nadia@example.com&password=wrong").status_code == 401
+    stats = hasher_stats()
+    assert stats["pending"] == 0 and stats["completed"] >= 3
+
+
+def test_login_rehashes_outdated_cost(client, db, make_user):
+    old_context = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=BCRYPT_ROUNDS + 1)
+    user = make_user(email="old@example.com", hashed_password=old_context.hash("pw"))
+
+    assert client.post("/api/auth/login?email=old@example.com&password=pw").status_code == 200
+    db.refresh(user)
+    assert f"${BCRYPT_ROUNDS:02d}$" in user.hashed_password
+    assert client.post("/api/auth/login?email=old@example.com&password=pw").status_code == 200
+
+
+def test_me_uses_token_cache_and_invalidates_on_role_change(client, db):
+    payload = {"name": "Rafi", "email": "rafi@example.com", "password": "pw", "wallet_id": "W_RAFI"}
+    data = client.post("/api/auth/register", json=payload).json()
+    token, user_id = data["access_token"], data["user"]["id"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    token_cache.clear()
+    assert client.get("/api/auth/me", headers=headers).json()["role"] == "user"
+    hits = token_cache.hits
+    assert client.get(f"/api/auth/me?token={token}").json()["id"] == user_id
+    assert token_cache.hits == hits + 1
+
+    client.post(f"/api/security/rbac/assign-role?user_id={user_id}&role=manager")
+    assert client.get("/api/auth/me", headers=headers).json()["role"] == "manager"
+
+    assert client.get("/api/auth/me").status_code == 401
+    assert client.get("/api/auth/me?token=garbage").status_code == 401
+
+
+def test_token_cache_bounds_and_expiry():
+    cache = TokenCache(max_size=2, max_ttl=60)
+    now = time.time()
+    cache.put("a", 1, "A", now + 30)
+    cache.put("b", 2, "B", now + 30)
+    cache.get("a")
+    cache.put("c", 3, "C", now + 30)
+    assert cache.get("b") is None and cache.get("a") == "A"
+
+    cache.put("expired", 4, "X", now - 1)
+    assert cache.get("expired") is None
+    cache.invalidate_user(1)
+    assert cache.get("a") is None
@@ -0,0 +1,57 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import get_db
+from audit_sink import audit_sink
+from shards import shard_router
+from main import app
+from benchmarks.dataset import generate
+from benchmarks.runner import SCENARIOS, run_benchmark, select_scenarios, compare, percentile
+from benchmarks.stub_llm import StubGroq
+import rate_limit
+
+
+def test_stub_llm_is_deterministic():
+    prompt = [{"role": "user", "content": "Analyze this task for authenticity. Task: logo design"}]
+    first = StubGroq().messages.create(model="m", messages=prompt).content[0].text
+    assert StubGroq().messages.create(model="m", messages=prompt).content[0].text == first
+    assert "authenticity_score" in first
+
+
+def test_percentiles_and_regressions():
+    ordered = list(range(1, 101))
+    assert (percentile(ordered, 50), percentile(ordered, 95), percentile(ordered, 99)) == (50, 95, 99)
+    assert select_scenarios(["tasks.*"]) == ["tasks.submit", "tasks.list", "tasks.search", "tasks.verify"]
+
+    baseline = {"a": {"p95_ms": 10.0, "throughput": 100.0, "errors": 0}}
+    assert compare({"a": {"p95_ms": 11.0, "throughput": 95.0, "errors": 0}}, baseline) == []
+    metrics = [r["metric"] for r in compare({"a": {"p95_ms": 20.0, "throughput": 50.0, "errors": 1}}, baseline)]
+    assert metrics == ["p95_ms", "throughput", "errors"]
+
+
+def test_every_scenario_runs_without_server_errors(client, stub_llm, tmp_path, monkeypatch):
+    # Concurrent requests need their own connections, so use a file database
+    engine = create_engine(f"sqlite:///{tmp_path / 'bench.db'}", connect_args={"check_same_thread": False})
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    monkeypatch.setattr(audit_sink, "engine", engine)
+    shard_router.configure(engine)
+    monkeypatch.setattr(rate_limit, "USER_BURST", 1e9)
+    ctx = generate(engine, users=6, tasks_per_user=4, chats_per_user=2)
+
+    results = run_benchmark(app, ctx, requests=4, concurrency=3, warmup=1)
+    assert set(results) == set(SCENARIOS)
+    for name, stats in results.items():
+        assert stats["requests"] == 4, name
+        assert stats["errors"] == 0, (name, stats["status"])
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+    assert stub_llm.calls > 0
+    audit_sink.flush()
+    engine.dispose()
@@ -0,0 +1,73 @@
+import pytest
+from fastapi import Request
+from sqlalchemy import exc, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from database import get_db, make_engine, make_read_engine, make_write_engine, sqlite_pragmas
+import database
+
+
+def _pragma(engine, name):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def test_wal_profile_is_applied_on_connect(tmp_path):
+    writer = make_engine(f"sqlite:///{tmp_path / 'app.db'}", pragmas=sqlite_pragmas("wal", "busy_timeout=7000"))
+    assert _pragma(writer, "journal_mode") == "wal"
+    assert _pragma(writer, "synchronous") == 1  # NORMAL
+    assert _pragma(writer, "busy_timeout") == 7000
+    assert _pragma(writer, "cache_size") == -65536
+
+    assert sqlite_pragmas("off", "") == {}
+    assert sqlite_pragmas("durable", "")["synchronous"] == "FULL"
+
+
+def test_reader_sees_commits_and_refuses_writes(tmp_path):
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    writer = make_engine(url)
+    reader = make_read_engine(url, writer)
+    assert reader is not writer
+    with writer.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        conn.execute(text("INSERT INTO t VALUES (1)"))
+
+    # In WAL mode a reader holding a snapshot doesn't block the writer
+    with reader.connect() as read_conn:
+        read_conn.execute(text("BEGIN"))
+        assert read_conn.execute(text("SELECT count(*) FROM t")).scalar() == 1
+        with writer.begin() as conn:
+            conn.execute(text("INSERT INTO t VALUES (2)"))
+        read_conn.execute(text("COMMIT"))
+        assert read_conn.execute(text("SELECT count(*) FROM t")).scalar() == 2
+
+        with pytest.raises(OperationalError, match="readonly"):
+            read_conn.execute(text("INSERT INTO t VALUES (3)"))
+
+    # An in-memory database has no separate reader
+    memory = make_engine("sqlite://")
+    assert make_read_engine("sqlite://", memory) is memory
+
+
+@pytest.mark.parametrize("method, read_only", [("GET", True), ("HEAD", True), ("POST", False)])
+def test_get_db_reads_for_get_requests(tmp_path, monkeypatch, method, read_only):
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    writer = make_engine(url)
+    reader = make_read_engine(url, writer)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=writer))
+    monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(bind=reader))
+
+    dependency = get_db(Request({"type": "http", "method": method, "headers": []}))
+    db = next(dependency)
+    assert db.get_bind() is (reader if read_only else writer)
+    dependency.close()
+
+
+def test_strict_writer_waits_a_bounded_time_for_its_connection(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "WRITE_POOL_TIMEOUT", 0.1)
+    writer = make_write_engine(f"sqlite:///{tmp_path / 'app.db'}", max_overflow=0)
+    held = writer.connect()
+    with pytest.raises(exc.TimeoutError):
+        writer.connect()
+    held.close()
+    writer.connect().close()
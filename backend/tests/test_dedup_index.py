@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from dedup_index import TaskDedupIndex, MinHasher, similarity, task_dedup_index
+from models import Task
+
+ORIGINAL = "Compiled the quarterly sales report for the Dhaka region and reconciled all invoices with the finance team"
+EDITED = "Compiled the quarterly sales report for the Dhaka region and reconciled all the invoices with finance team."
+UNRELATED = "Designed a landing page mockup in Figma for the new mobile banking onboarding flow"
+
+
+def test_signature_similarity_tracks_edits():
+    hasher = MinHasher()
+    original = hasher.signature(ORIGINAL)
+    assert similarity(original, hasher.signature(ORIGINAL)) == 1.0
+    assert similarity(original, hasher.signature(EDITED)) > 0.7
+    assert similarity(original, hasher.signature(UNRELATED)) < 0.2
+
+
+def test_index_finds_near_duplicates_across_users(db, make_user):
+    first, second = make_user(), make_user()
+    db.add_all([Task(id=1, user_id=first.id, description=ORIGINAL), Task(id=2, user_id=second.id, description=UNRELATED)])
+    db.commit()
+    index = TaskDedupIndex()
+    # Tasks from before the index was stored are backfilled
+    assert index.index_unsigned(db.connection()) == 2
+    db.commit()
+
+    matches = index.query(db, EDITED)
+    assert [m["task_id"] for m in matches] == [1]
+    assert matches[0]["user_id"] == first.id
+    assert index.query(db, ORIGINAL, exclude=1) == []
+
+    index.remove(db, 1)
+    db.commit()
+    assert index.query(db, EDITED) == []
+
+
+def test_verify_routes_recycled_task_to_review(client, make_user):
+    first, second = make_user(), make_user()
+    original = client.post(f"/api/tasks/submit?user_id={first.id}", json={"description": ORIGINAL}).json()
+    copy = client.post(f"/api/tasks/submit?user_id={second.id}", json={"description": EDITED}).json()
+
+    response = client.post(f"/api/tasks/verify/{copy['task_id']}")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "review_needed"
+    assert data["verification_result"]["duplicates"][0]["task_id"] == original["task_id"]
+
+
+def test_verify_orders_duplicates_by_submission_time(client, db, make_user, stub_llm):
+    user = make_user()
+    # Sharded ids aren't allocated in submission order, so the original can have the larger id
+    now = datetime.utcnow()
+    db.add_all([
+        Task(id=5000, user_id=user.id, description=ORIGINAL, created_at=now - timedelta(hours=1)),
+        Task(id=10, user_id=user.id, description=EDITED, created_at=now),
+    ])
+    db.commit()
+    task_dedup_index.index_unsigned(db.connection())
+    db.commit()
+
+    assert client.post("/api/tasks/verify/5000").json()["status"] != "review_needed"
+    assert client.post("/api/tasks/verify/10").json()["status"] == "review_needed"
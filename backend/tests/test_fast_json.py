@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+import json
+from models import Task, Payment, ChatMessage, AuditLog
+from fast_json import STREAM_CHUNK_ROWS
+from schemas import Task as TaskSchema, Payment as PaymentSchema
+
+
+def test_task_and_payment_lists_match_schema_output(client, db, make_user):
+    user = make_user()
+    base = datetime(2025, 1, 1)
+    for i in range(3):
+        task = Task(user_id=user.id, description=f"Task {i}", amount=10.0 + i, created_at=base + timedelta(hours=i))
+        db.add(task)
+        db.flush()
+        db.add(Payment(user_id=user.id, task_id=task.id, amount=task.amount, created_at=task.created_at))
+    db.commit()
+
+    tasks = db.query(Task).order_by(Task.created_at.desc()).all()
+    expected = [TaskSchema.from_orm(t).model_dump(mode="json") for t in tasks]
+    assert client.get(f"/api/tasks/{user.id}").json()["results"] == expected
+
+    payments = db.query(Payment).order_by(Payment.created_at.desc()).all()
+    expected = [PaymentSchema.from_orm(p).model_dump(mode="json") for p in payments]
+    assert client.get(f"/api/payments/{user.id}").json()["results"] == expected
+    assert client.get("/api/payments/999").json()["results"] == []
+
+
+def test_streamed_list_equals_buffered(client, db, make_user):
+    user = make_user()
+    base = datetime(2025, 1, 1)
+    db.add_all([
+        Task(user_id=user.id, description=f"Task {i}", created_at=base + timedelta(seconds=i))
+        for i in range(STREAM_CHUNK_ROWS + 5)
+    ])
+    db.commit()
+
+    buffered = client.get(f"/api/tasks/{user.id}?limit=1000").json()["results"]
+    streamed = client.get(f"/api/tasks/{user.id}?stream=true")
+    assert streamed.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in streamed.text.splitlines()]
+    assert len(rows) == STREAM_CHUNK_ROWS + 5 and rows[:1000] == buffered
+    assert client.get("/api/tasks/999?stream=true").text == ""
+
+
+def test_chat_history_and_logs_return_latest_rows(client, db, make_user):
+    user = make_user()
+    base = datetime.utcnow().replace(microsecond=0)
+    db.add_all([
+        ChatMessage(user_id=user.id, content=f"message {i}", created_at=base + timedelta(minutes=i))
+        for i in range(5)
+    ])
+    db.add(AuditLog(user_id=user.id, action="login", resource="user", details={"ok": True}, ip_address="1.2.3.4", created_at=base))
+    db.commit()
+
+    history = client.get(f"/api/ai/chat/history/{user.id}?limit=3").json()["results"]
+    assert [m["content"] for m in history] == ["message 2", "message 3", "message 4"]
+    assert history[0]["created_at"] == (base + timedelta(minutes=2)).isoformat()
+
+    logs = client.get(f"/api/security/audit-logs/{user.id}").json()["results"]
+    assert logs == [{"id": 1, "action": "login", "resource": "user", "details": {"ok": True},
+                     "ip_address": "1.2.3.4", "created_at": base.isoformat()}]
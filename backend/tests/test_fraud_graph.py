@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+import ipaddress
+import time
+import pytest
+import fraud_graph
+from fraud_graph import UnionFind, FraudRingIndex, fraud_ring_index
+from models import AuditLog, CryptoWallet, FraudLog
+
+
+def test_union_find_merges_by_size():
+    sets = UnionFind()
+    for item in "abcd":
+        sets.add(item)
+    sets.union("a", "b")
+    sets.union("c", "d")
+    assert sets.find("a") == sets.find("b")
+    assert sets.find("a") != sets.find("c")
+    root, absorbed = sets.union("b", "d")
+    assert absorbed is not None and sets.size[root] == 4
+    assert sets.union("a", "c") == (root, None)
+
+
+def test_index_links_shared_ip_and_wallet():
+    index = FraudRingIndex()
+    index.link(1, "ip", "93.184.216.7")
+    index.link(2, "ip", "93.184.216.7")
+    index.link(3, "wallet", "0xABC")
+    index.link(2, "wallet", "0xabc")
+    index.link(4, "ip", "127.0.0.1")
+    index.link(5, "ip", "127.0.0.1")
+    index.record_risk(3, 0.9)
+
+    cluster = index.cluster_of(1)
+    assert cluster["members"] == [1, 2, 3]
+    assert cluster["shared_identifiers"] == ["ip:93.184.216.7", "wallet:0xabc"]
+    assert cluster["risk"]["max_confidence"] == 0.9
+    assert cluster["risk"]["flagged_members"] == 1
+    # Loopback addresses never link users
+    assert index.cluster_of(4)["size"] == 1
+    assert [c["members"] for c in index.clusters()] == [[1, 2, 3]]
+
+
+@pytest.mark.parametrize("address", ["10.0.0.8", "192.168.1.1", "100.64.3.2", "169.254.1.1", "fe80::1", "240.0.0.1", "::ffff:10.0.0.8"])
+def test_shared_non_public_addresses_do_not_link_users(address):
+    index = FraudRingIndex()
+    index.link(1, "ip", address)
+    index.link(2, "ip", address)
+    assert index.cluster_of(1)["size"] == 1
+
+
+def test_configured_proxy_addresses_do_not_link_users(monkeypatch):
+    monkeypatch.setattr(fraud_graph, "FRAUD_RING_IGNORED_IPS", [ipaddress.ip_network("93.184.216.0/28")])
+    index = FraudRingIndex()
+    for user_id in (1, 2):
+        index.link(user_id, "ip", "93.184.216.9")
+        index.link(user_id, "ip", "93.184.216.99")
+    assert index.cluster_of(1)["shared_identifiers"] == ["ip:93.184.216.99"]
+
+
+def test_index_builds_and_tracks_commits(db, make_user):
+    first = make_user(wallet_id="W1")
+    second = make_user(wallet_id="W2")
+    db.add(AuditLog(user_id=first.id, action="login", resource="user", ip_address="93.184.216.4"))
+    db.commit()
+
+    fraud_ring_index.build(db)
+    try:
+        assert fraud_ring_index.cluster_of(first.id)["size"] == 1
+
+        db.add(CryptoWallet(user_id=second.id, wallet_address="W1"))
+        db.add(FraudLog(user_id=second.id, event_type="fraud_scan", confidence=0.7))
+        db.commit()
+        cluster = fraud_ring_index.cluster_of(first.id)
+        assert cluster["members"] == [first.id, second.id]
+        assert cluster["risk"]["max_confidence"] == 0.7
+
+        db.add(AuditLog(user_id=second.id, action="login", resource="user", ip_address="93.184.216.1"))
+        db.flush()
+        db.rollback()
+        assert "ip:93.184.216.1" not in fraud_ring_index.cluster_of(first.id)["shared_identifiers"]
+    finally:
+        fraud_ring_index.reset()
+
+
+def test_concurrent_first_requests_build_once(client, monkeypatch):
+    builds = []
+
+    def slow_build(db):
+        builds.append(db)
+        time.sleep(0.05)
+        fraud_ring_index.built = True
+
+    monkeypatch.setattr(fraud_ring_index, "build", slow_build)
+    with ThreadPoolExecutor(4) as pool:
+        responses = list(pool.map(lambda _: client.get("/api/fraud/rings"), range(4)))
+    assert all(response.status_code == 200 for response in responses)
+    assert len(builds) == 1
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+from fraud_monitor import SlidingWindow, VelocityMonitor, velocity_monitor, _load_recent_payments
+from models import Task, Payment, FraudLog
+
+
+def test_sliding_window_evicts_expired_events():
+    window = SlidingWindow(timedelta(minutes=1))
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    window.add(start, 10.0, "bKash")
+    window.add(start + timedelta(seconds=30), 20.0, "Nagad")
+    assert window.snapshot() == {"count": 2, "amount": 30.0, "methods": 2}
+
+    window.add(start + timedelta(seconds=61), 5.0, "Nagad")
+    assert window.snapshot() == {"count": 2, "amount": 25.0, "methods": 1}
+
+
+def test_monitor_trips_count_threshold():
+    monitor = VelocityMonitor(thresholds={
+        "minute": {"count": 3, "amount": 1e9, "methods": 10},
+        "hour": {"count": 100, "amount": 1e9, "methods": 10},
+        "day": {"count": 100, "amount": 1e9, "methods": 10},
+    })
+    now = datetime(2024, 1, 1)
+    for i in range(2):
+        risk, tripped = monitor.observe(1, 10.0, "bKash", now + timedelta(seconds=i))
+        assert not tripped
+    risk, tripped = monitor.observe(1, 10.0, "bKash", now + timedelta(seconds=2))
+    assert risk == 1.0
+    assert tripped[0]["window"] == "minute" and tripped[0]["metric"] == "count"
+
+    # Other users are unaffected
+    risk, tripped = monitor.observe(2, 10.0, "bKash", now)
+    assert not tripped
+
+
+def test_payment_insert_sets_risk_and_logs(db, make_user):
+    velocity_monitor.reset()
+    user = make_user()
+    for i in range(6):
+        task = Task(user_id=user.id, description=f"task {i}", amount=50.0)
+        db.add(task)
+        db.flush()
+        db.add(Payment(user_id=user.id, task_id=task.id, amount=50.0))
+        db.commit()
+
+    payments = db.query(Payment).order_by(Payment.id).all()
+    assert payments[0].risk_score < 1.0
+    assert payments[-1].risk_score == 1.0
+    assert payments[-1].status == "held"
+    logs = db.query(FraudLog).filter(FraudLog.event_type == "velocity_check").all()
+    assert len(logs) == 2
+    assert velocity_monitor.stats(user.id)["minute"]["count"] == 6
+    velocity_monitor.reset()
+
+
+def test_rolled_back_payments_are_not_recorded(db, make_user):
+    velocity_monitor.reset()
+    user = make_user()
+    task = Task(user_id=user.id, description="task", amount=50.0)
+    db.add(task)
+    db.commit()
+
+    db.add(Payment(user_id=user.id, task_id=task.id, amount=50.0))
+    db.flush()
+    db.rollback()
+    assert velocity_monitor.stats(user.id)["minute"]["count"] == 0
+
+    # Payments in one transaction still count towards each other before it commits
+    for _ in range(6):
+        db.add(Payment(user_id=user.id, task_id=task.id, amount=50.0))
+        db.flush()
+    assert velocity_monitor.stats(user.id)["minute"]["count"] == 0
+    db.commit()
+    assert velocity_monitor.stats(user.id)["minute"]["count"] == 6
+    assert db.query(Payment).order_by(Payment.id).all()[-1].status == "held"
+    velocity_monitor.reset()
+
+
+def test_idle_users_are_dropped():
+    monitor = VelocityMonitor(max_users=2)
+    now = datetime(2024, 1, 1)
+    monitor.observe(1, 10.0, "bKash", now)
+    monitor.observe(2, 10.0, "bKash", now + timedelta(hours=1))
+    # User 1's payment has left the day window by the time user 3 pays
+    monitor.observe(3, 10.0, "bKash", now + timedelta(days=1, minutes=1))
+    assert not monitor.is_tracked(1)
+    assert monitor.is_tracked(2) and monitor.is_tracked(3)
+
+    # Past max_users the least recently active user goes
+    monitor.observe(2, 10.0, "Nagad", now + timedelta(days=1, minutes=2))
+    monitor.observe(4, 10.0, "bKash", now + timedelta(days=1, minutes=3))
+    assert not monitor.is_tracked(3)
+    assert monitor.stats(2, now + timedelta(days=1, minutes=3))["day"]["count"] == 2
+
+
+def test_reloaded_windows_keep_distinct_methods(db, make_user):
+    velocity_monitor.reset()
+    user = make_user()
+    task = Task(user_id=user.id, description="task", amount=50.0)
+    db.add(task)
+    db.commit()
+    at = datetime.utcnow()
+    db.add_all([
+        Payment(user_id=user.id, task_id=task.id, amount=50.0, method=method, created_at=at)
+        for method in ("bKash", "Nagad")
+    ])
+    db.commit()
+
+    velocity_monitor.reset()
+    _load_recent_payments(db, user.id, at)
+    assert velocity_monitor.stats(user.id, at)["minute"]["methods"] == 2
+    velocity_monitor.reset()
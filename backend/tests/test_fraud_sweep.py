@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+import json
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from fraud_sweep import score_user_payments, run_sweep, load_checkpoint
+import fraud_sweep
+import pytest
+from models import User, Task, Payment, FraudLog
+
+
+def _seed(engine, users=10, bursty=(3, 7)):
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": i, "name": f"u{i}", "email": f"u{i}@example.com", "hashed_password": "x", "wallet_id": f"W{i}"}
+            for i in range(1, users + 1)
+        ])
+        conn.execute(insert(Task), [{"id": i, "user_id": i, "description": "t"} for i in range(1, users + 1)])
+        payments = []
+        for user_id in range(1, users + 1):
+            count = 40 if user_id in bursty else 3
+            gap = timedelta(seconds=30) if user_id in bursty else timedelta(days=2)
+            for n in range(count):
+                payments.append({
+                    "user_id": user_id, "task_id": user_id, "amount": 50.0,
+                    "method": "bKash", "status": "completed", "created_at": start + gap * n
+                })
+        conn.execute(insert(Payment), payments)
+
+
+def test_score_flags_burst():
+    start = datetime(2024, 1, 1)
+    calm = [(50.0, "completed", "bKash", start + timedelta(days=n)) for n in range(10)]
+    assert score_user_payments(calm)[1] == []
+
+    burst = [(50.0, "completed", "bKash", start + timedelta(seconds=10 * n)) for n in range(40)]
+    risk, flags = score_user_payments(burst)
+    assert risk == 1.0
+    assert flags[0]["type"] == "payment_burst"
+
+
+def test_sweep_inline_with_resume(engine, tmp_path):
+    _seed(engine)
+    factory = sessionmaker(bind=engine)
+    checkpoint = str(tmp_path / "sweep.json")
+    progress = []
+
+    state = run_sweep(workers=0, chunk_size=4, checkpoint_path=checkpoint, session_factory=factory, on_progress=progress.append)
+    assert state["completed"] and state["users_scanned"] == 10
+    assert [p["last_user_id"] for p in progress] == [4, 8, 10]
+
+    db = factory()
+    flagged = sorted(log.user_id for log in db.query(FraudLog).filter(FraudLog.event_type == "fraud_sweep"))
+    assert flagged == [3, 7]
+    db.close()
+
+    # A half-finished checkpoint resumes after the last committed chunk
+    state = load_checkpoint(checkpoint)
+    state.update({"completed": False, "last_user_id": 8, "users_scanned": 8})
+    with open(checkpoint, "w") as f:
+        json.dump(state, f)
+    resumed = run_sweep(workers=0, chunk_size=4, checkpoint_path=checkpoint, session_factory=factory)
+    assert resumed["sweep_id"] == state["sweep_id"] and resumed["users_scanned"] == 10
+
+
+def test_sweep_resumes_from_committed_progress(engine, tmp_path, monkeypatch):
+    _seed(engine)
+    factory = sessionmaker(bind=engine)
+    checkpoint = str(tmp_path / "sweep.json")
+    save_checkpoint = fraud_sweep.save_checkpoint
+
+    # Crash after the second chunk commits but before its checkpoint reaches disk
+    def crash_on_second(state, path):
+        if state["last_user_id"] == 8:
+            raise RuntimeError("killed")
+        save_checkpoint(state, path)
+
+    monkeypatch.setattr(fraud_sweep, "save_checkpoint", crash_on_second)
+    with pytest.raises(RuntimeError):
+        run_sweep(workers=0, chunk_size=4, checkpoint_path=checkpoint, session_factory=factory)
+    assert load_checkpoint(checkpoint)["last_user_id"] == 4
+
+    monkeypatch.setattr(fraud_sweep, "save_checkpoint", save_checkpoint)
+    progress = []
+    state = run_sweep(workers=0, chunk_size=4, checkpoint_path=checkpoint, session_factory=factory, on_progress=progress.append)
+    assert [p["last_user_id"] for p in progress] == [10]
+    assert state["users_scanned"] == 10 and state["flagged"] == 2
+
+    db = factory()
+    flagged = sorted(log.user_id for log in db.query(FraudLog).filter(FraudLog.event_type == "fraud_sweep"))
+    assert flagged == [3, 7]
+    db.close()
+
+
+def test_sweep_process_pool(tmp_path):
+    url = f"sqlite:///{tmp_path / 'sweep.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    _seed(engine, users=12, bursty=(5,))
+
+    state = run_sweep(
+        workers=2, chunk_size=3, resume=False,
+        checkpoint_path=str(tmp_path / "sweep.json"),
+        database_url=url, session_factory=sessionmaker(bind=engine)
+    )
+    assert state["users_scanned"] == 12 and state["flagged"] == 1
+    engine.dispose()
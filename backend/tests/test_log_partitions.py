@@ -0,0 +1,91 @@
+from datetime import datetime
+import os
+from sqlalchemy import create_engine, inspect
+from log_partitions import LogStorage, months_between, shift_month, partition_table
+from models import AuditLog, FraudLog
+
+
+def test_month_helpers():
+    assert shift_month("2024-01", -1) == "2023-12"
+    assert shift_month("2023-12", 1) == "2024-01"
+    assert months_between(datetime(2023, 11, 5), datetime(2024, 1, 2)) == ["2024-01", "2023-12", "2023-11"]
+
+
+def test_rotate_archive_and_range_query(engine, db, make_user, tmp_path):
+    user = make_user()
+    for month in (1, 2, 3, 4):
+        db.add(AuditLog(user_id=user.id, action=f"m{month}", resource="r", created_at=datetime(2024, month, 10)))
+    db.add(FraudLog(user_id=user.id, event_type="scan", confidence=0.4, created_at=datetime(2024, 2, 1)))
+    db.commit()
+
+    storage = LogStorage(engine=engine, root=str(tmp_path))
+    moved = storage.rotate(now=datetime(2024, 4, 20))
+    assert moved == {"audit_logs/2024-01": 1, "audit_logs/2024-02": 1, "audit_logs/2024-03": 1, "fraud_logs/2024-02": 1}
+    assert db.query(AuditLog).count() == 1
+    assert storage.partitions() == ["2024-03", "2024-02", "2024-01"]
+
+    assert storage.archive(retention_months=2, now=datetime(2024, 4, 20)) == ["2024-01"]
+    assert storage.partitions() == ["2024-03", "2024-02"]
+    assert os.path.exists(storage.archive_path("audit_logs", "2024-01"))
+
+    latest = storage.query(db, "audit_logs", user.id, limit=2)
+    assert [row["action"] for row in latest] == ["m4", "m3"]
+
+    in_range = storage.query(db, "audit_logs", user.id, start=datetime(2024, 1, 1), end=datetime(2024, 2, 28))
+    assert [row["action"] for row in in_range] == ["m2", "m1"]
+
+    fraud = storage.query(db, "fraud_logs", user.id)
+    assert fraud[0]["confidence"] == 0.4
+
+
+def test_keyset_pages_and_full_scan_span_partitions(engine, db, make_user, tmp_path):
+    user = make_user()
+    # Two rows share each timestamp, so the id breaks ties
+    for month in (1, 2, 3):
+        for n in range(2):
+            db.add(AuditLog(user_id=user.id, action=f"m{month}-{n}", resource="r", created_at=datetime(2024, month, 10)))
+    db.commit()
+    storage = LogStorage(engine=engine, root=str(tmp_path))
+    storage.rotate(now=datetime(2024, 3, 20))
+
+    seen, before = [], None
+    while True:
+        rows = storage.query(db, "audit_logs", user.id, limit=2, before=before)
+        if not rows:
+            break
+        seen.extend(row["action"] for row in rows)
+        before = (datetime.fromisoformat(rows[-1]["created_at"]), rows[-1]["id"])
+    assert seen == ["m3-1", "m3-0", "m2-1", "m2-0", "m1-1", "m1-0"]
+
+    columns = ("id", "action", "created_at")
+    dump = list(storage.iter_query(db, "audit_logs", user.id, columns=columns))
+    assert [row["action"] for row in dump] == seen
+    assert set(dump[0]) == set(columns)
+    after_first = storage.iter_query(db, "audit_logs", user.id, before=(datetime(2024, 3, 10), dump[0]["id"]))
+    assert [row["action"] for row in after_first] == seen[1:]
+
+
+def test_partitions_carry_the_hot_table_indexes(engine, db, make_user, tmp_path):
+    user = make_user()
+    db.add(AuditLog(user_id=user.id, action="old", resource="r", created_at=datetime(2024, 1, 10)))
+    db.commit()
+    storage = LogStorage(engine=engine, root=str(tmp_path))
+    storage.rotate(now=datetime(2024, 2, 1))
+
+    def index_names(key):
+        part = create_engine(f"sqlite:///{storage.partition_path(key)}")
+        names = {index["name"] for index in inspect(part).get_indexes("audit_logs")}
+        part.dispose()
+        return names
+
+    assert "ix_audit_logs_user_id_created_at" in index_names("2024-01")
+
+    # A partition written without indexes gets them when it's first opened
+    legacy = create_engine(f"sqlite:///{storage.partition_path('2023-12')}")
+    table = partition_table(AuditLog.__table__)
+    table.indexes.clear()
+    table.create(legacy)
+    legacy.dispose()
+    assert index_names("2023-12") == set()
+    storage.query(db, "audit_logs", user.id)
+    assert "ix_audit_logs_user_id_created_at" in index_names("2023-12")
@@ -0,0 +1,67 @@
+import pytest
+import metrics
+from metrics import Histogram, llm_call, http_requests, n_plus_one, llm_calls
+from models import Task
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test", ("route",), (0.1, 1.0))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(("/x",), value)
+    lines = histogram.render()
+    assert 'test_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="/x",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{route="/x",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{route="/x"} 3' in lines
+
+
+def test_requests_are_measured_by_route_template(client, make_user):
+    user = make_user()
+    route = "/api/analytics/metrics/{user_id}"
+    before = http_requests.value(("GET", route, "200"))
+    response = client.get(f"/api/analytics/metrics/{user.id}")
+    assert response.headers["server-timing"].startswith("db;dur=")
+    assert http_requests.value(("GET", route, "200")) == before + 1
+
+    body = client.get("/metrics").text
+    assert f'workpay_http_requests_total{{method="GET",route="{route}",status="200"}}' in body
+    assert 'workpay_password_hasher{stat="workers"}' in body
+    assert "workpay_sql_statement_duration_seconds_bucket" in body
+
+
+def test_repeated_select_is_flagged_as_n_plus_one(client, db, make_user, monkeypatch):
+    monkeypatch.setattr(metrics, "N_PLUS_ONE_THRESHOLD", 2)
+    user = make_user(points=600)
+    db.add_all([Task(user_id=user.id, description=f"t{i}", amount=1, ai_score=0.95) for i in range(10)])
+    db.commit()
+
+    # The achievement check looks up each qualifying badge with the same SELECT
+    route = "/api/gamification/check-achievements/{user_id}"
+    before = n_plus_one.value((route,))
+    client.post(f"/api/gamification/check-achievements/{user.id}")
+    assert n_plus_one.value((route,)) == before + 1
+
+    single = "/api/payments/credit-score/{user_id}"
+    before = n_plus_one.value((single,))
+    client.get(f"/api/payments/credit-score/{user.id}")
+    assert n_plus_one.value((single,)) == before
+
+
+def test_llm_calls_counted_by_outcome():
+    before = llm_calls.value(("op", "error"))
+    with pytest.raises(RuntimeError):
+        with llm_call("op"):
+            raise RuntimeError("upstream down")
+    with llm_call("op"):
+        pass
+    assert llm_calls.value(("op", "error")) == before + 1
+    assert llm_calls.value(("op", "ok")) >= 1
+
+
+def test_profile_toggle_returns_collapsed_stacks(client, make_user, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_PROFILING", True)
+    user = make_user()
+    response = client.get(f"/api/payments/credit-score/{user.id}?profile=1")
+    assert response.status_code == 200
+    assert response.headers["x-profiled-status"] == "200"
+    assert response.headers["content-type"].startswith("text/plain")
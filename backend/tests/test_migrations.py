@@ -0,0 +1,96 @@
+from sqlalchemy import create_engine, inspect, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from database import Base
+from migrations import MIGRATIONS, migrate
+from models import Task, NFTBadge, SchemaMigration
+from search import search
+from query_advisor import QueryCapture, advise
+
+
+def _listing(conn):
+    conn.execute(select(Task.id).where(Task.user_id == 1).order_by(Task.created_at.desc(), Task.id.desc()).limit(10)).all()
+
+
+def test_migrate_adds_indexes_to_an_existing_database():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    # A database created before the indexes were declared
+    with engine.begin() as conn:
+        for name in ("ix_tasks_user_id_created_at", "ix_payments_task_id", "ix_users_points"):
+            conn.exec_driver_sql(f"DROP INDEX {name}")
+
+    with QueryCapture() as capture, engine.connect() as conn:
+        _listing(conn)
+    assert [f["scans"] for f in advise(engine, capture)] == [["tasks"]]
+
+    assert migrate(engine, log=lambda message: None) == [version for version, _, _ in MIGRATIONS]
+    indexes = {index["name"] for index in inspect(engine).get_indexes("tasks")}
+    assert "ix_tasks_user_id_created_at" in indexes
+    assert advise(engine, capture) == []
+
+    # Recorded once and not reapplied
+    assert migrate(engine, log=lambda message: None) == []
+    with engine.connect() as conn:
+        assert conn.execute(select(SchemaMigration.version)).scalars().all() == [version for version, _, _ in MIGRATIONS]
+
+
+def test_migrate_adds_nft_badge_columns_to_a_baseline_table():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    # nft_badges as created before batch minting
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE nft_badges")
+        conn.exec_driver_sql(
+            "CREATE TABLE nft_badges (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, badge_name VARCHAR NOT NULL, "
+            "token_id VARCHAR NOT NULL UNIQUE, nft_metadata JSON NOT NULL, created_at DATETIME)"
+        )
+        conn.exec_driver_sql("INSERT INTO nft_badges (user_id, badge_name, token_id, nft_metadata) VALUES (1, 'First', 'T1', '{}')")
+        # Minted twice before one badge per user was enforced
+        conn.exec_driver_sql("INSERT INTO nft_badges (user_id, badge_name, token_id, nft_metadata) VALUES (1, 'First', 'T2', '{}')")
+
+    migrate(engine, log=lambda message: None)
+    with engine.connect() as conn:
+        badge = conn.execute(select(NFTBadge)).one()
+    assert (badge.token_id, badge.status, badge.content_hash, badge.tx_hash) == ("T1", "minted", None, None)
+    indexes = {index["name"]: index["unique"] for index in inspect(engine).get_indexes("nft_badges")}
+    assert indexes["ix_nft_badges_user_id_badge_name"]
+
+
+def test_migrate_indexes_user_id_in_fts_tables():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    # tasks_fts as created when user_id was UNINDEXED
+    with engine.begin() as conn:
+        for suffix in ("ai", "ad", "au"):
+            conn.exec_driver_sql(f"DROP TRIGGER tasks_fts_{suffix}")
+        conn.exec_driver_sql("DROP TABLE tasks_fts")
+        conn.exec_driver_sql(
+            "CREATE VIRTUAL TABLE tasks_fts USING fts5(description, user_id UNINDEXED, "
+            "content='tasks', content_rowid='id', tokenize='porter unicode61')"
+        )
+        conn.exec_driver_sql("INSERT INTO tasks (user_id, description) VALUES (7, 'Quarterly invoice audit')")
+
+    migrate(engine, log=lambda message: None)
+    with Session(engine) as db:
+        assert [r["description"] for r in search(db, "tasks_fts", 7, "invoice")["results"]] == ["Quarterly invoice audit"]
+        db.add(Task(user_id=7, description="Invoice follow-up"))
+        db.commit()
+        assert len(search(db, "tasks_fts", 7, "invoice")["results"]) == 2
+
+
+def test_capture_round_trips_through_a_file(tmp_path):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with QueryCapture() as capture, engine.connect() as conn:
+        _listing(conn)
+        _listing(conn)
+        conn.execute(select(Task.description)).all()
+
+    path = tmp_path / "capture.json"
+    capture.save(path)
+    replayed = QueryCapture.load(path)
+    assert replayed.statements == capture.statements
+    # Only the unfiltered read scans, now that the listing is indexed
+    findings = advise(engine, replayed)
+    assert [(f["scans"], f["count"]) for f in findings] == [(["tasks"], 1)]
@@ -0,0 +1,110 @@
+from models import NFTBadge, NFTMetadata
+from nft_mint import MintQueue, LocalChain, allocate_ids, mint_queue
+
+
+class RecordingChain(LocalChain):
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.pinned = []
+        self.calls = []
+
+    def pin(self, metadata):
+        self.pinned.append(metadata["name"])
+        return super().pin(metadata)
+
+    def mint(self, mints):
+        if self.fail:
+            raise RuntimeError("node unavailable")
+        self.calls.append(len(mints))
+        return super().mint(mints)
+
+
+def test_allocated_ids_are_disjoint_and_increasing(db):
+    first = allocate_ids(db, "test", 3)
+    second = allocate_ids(db, "test", 2)
+    db.commit()
+    assert list(first) == [1, 2, 3] and list(second) == [4, 5]
+
+
+def test_batch_mint_dedups_metadata_and_badges(db, make_user):
+    users = [make_user() for _ in range(25)]
+    chain = RecordingChain()
+    queue = MintQueue(backend=chain, batch_size=10)
+    for user in users:
+        queue.enqueue(user.id, "Task Master")
+        queue.enqueue(user.id, "Task Master")
+    queue.enqueue(users[0].id, "Leadership")
+
+    minted = queue.flush(db)
+    assert len(minted) == 26
+    assert chain.calls == [10, 10, 6]
+    # One pin per distinct metadata document, not per token
+    assert sorted(chain.pinned) == ["Leadership", "Task Master"]
+    assert db.query(NFTMetadata).count() == 2
+
+    token_ids = [m["token_id"] for m in minted]
+    assert token_ids == sorted(token_ids) and len(set(token_ids)) == 26
+    assert {m["status"] for m in minted} == {"minted"}
+
+    # Badges already held aren't minted again
+    queue.enqueue(users[1].id, "Task Master")
+    assert queue.flush(db) == []
+    assert db.query(NFTBadge).count() == 26
+
+
+def test_badge_inserted_by_a_concurrent_flush_is_skipped(db, make_user):
+    user = make_user()
+    rival = MintQueue()
+    rival.enqueue(user.id, "Team Player")
+
+    class RacingQueue(MintQueue):
+        def _token_uris(self, db, documents):
+            # The rival flush commits after this one checked which badges are held
+            rival.flush(db)
+            return super()._token_uris(db, documents)
+
+    chain = RecordingChain()
+    queue = RacingQueue(backend=chain)
+    queue.enqueue(user.id, "Team Player")
+    queue.enqueue(user.id, "Mentor")
+    assert [m["badge_name"] for m in queue.flush(db)] == ["Mentor"]
+    assert chain.calls == [1]
+    assert db.query(NFTBadge).filter(NFTBadge.badge_name == "Team Player").count() == 1
+
+
+def test_failed_chain_call_stays_pending_until_retry(db, make_user):
+    user = make_user()
+    chain = RecordingChain(fail=True)
+    queue = MintQueue(backend=chain)
+    queue.enqueue(user.id, "Perfect Score")
+    assert queue.flush(db)[0]["status"] == "pending"
+    assert db.query(NFTBadge).one().status == "pending"
+
+    chain.fail = False
+    assert len(queue.retry_pending(db)) == 1
+    db.expire_all()
+    nft = db.query(NFTBadge).one()
+    assert nft.status == "minted" and nft.tx_hash.startswith("0x")
+
+
+def test_mint_endpoint_and_listing(client, make_user):
+    user = make_user()
+    response = client.post(f"/api/web3/nft/mint?user_id={user.id}&badge_name=Leadership")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "minted" and body["already_minted"] is False
+
+    again = client.post(f"/api/web3/nft/mint?user_id={user.id}&badge_name=Leadership").json()
+    assert again["token_id"] == body["token_id"] and again["already_minted"] is True
+
+    nfts = client.get(f"/api/web3/nft/{user.id}").json()
+    assert nfts[0]["metadata"]["name"] == "Leadership"
+    assert client.post("/api/web3/nft/mint?user_id=999&badge_name=Leadership").status_code == 404
+
+
+def test_mint_endpoint_conflicts_while_another_flush_holds_the_award(client, make_user, monkeypatch):
+    user = make_user()
+    # Another request drained the queue and hasn't committed its batch
+    monkeypatch.setattr(mint_queue, "flush", lambda db: mint_queue._drain() and [])
+    response = client.post(f"/api/web3/nft/mint?user_id={user.id}&badge_name=Leadership")
+    assert response.status_code == 409
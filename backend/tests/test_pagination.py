@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+import json
+from models import Task, Payment, ChatMessage
+from pagination import encode_cursor, decode_cursor
+
+
+def _walk(client, url):
+    pages, cursor = [], None
+    while True:
+        body = client.get(url + (f"&cursor={cursor}" if cursor else "")).json()
+        pages.append([row["id"] for row in body["results"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip_and_rejects_garbage(client, make_user):
+    at = datetime(2025, 1, 2, 3, 4, 5, 600000)
+    assert decode_cursor(encode_cursor({"created_at": at, "id": 7})) == (at, 7)
+    user = make_user()
+    assert client.get(f"/api/tasks/{user.id}?cursor=not-a-cursor").status_code == 400
+
+
+def test_task_and_payment_pages_cover_every_row_once(client, db, make_user):
+    user = make_user()
+    base = datetime(2025, 1, 1)
+    # Timestamps repeat in pairs so the id has to break ties
+    for i in range(7):
+        task = Task(user_id=user.id, description=f"Task {i}", created_at=base + timedelta(minutes=i // 2))
+        db.add(task)
+        db.flush()
+        db.add(Payment(user_id=user.id, task_id=task.id, amount=10, created_at=task.created_at))
+    db.commit()
+
+    expected = [t.id for t in db.query(Task).order_by(Task.created_at.desc(), Task.id.desc())]
+    pages = _walk(client, f"/api/tasks/{user.id}?limit=3")
+    assert [len(p) for p in pages] == [3, 3, 1]
+    assert sum(pages, []) == expected
+
+    pages = _walk(client, f"/api/payments/{user.id}?limit=2")
+    assert len(sum(pages, [])) == 7 and len(set(sum(pages, []))) == 7
+
+    # A stream picks up from a cursor too
+    cursor = client.get(f"/api/tasks/{user.id}?limit=3").json()["next_cursor"]
+    rest = client.get(f"/api/tasks/{user.id}?stream=true&cursor={cursor}").text.splitlines()
+    assert [json.loads(line)["id"] for line in rest] == expected[3:]
+
+
+def test_chat_history_pages_walk_back_in_time(client, db, make_user):
+    user = make_user()
+    base = datetime(2025, 1, 1)
+    db.add_all([
+        ChatMessage(user_id=user.id, content=f"message {i}", created_at=base + timedelta(minutes=i))
+        for i in range(5)
+    ])
+    db.commit()
+
+    first = client.get(f"/api/ai/chat/history/{user.id}?limit=2").json()
+    assert [m["content"] for m in first["results"]] == ["message 3", "message 4"]
+    second = client.get(f"/api/ai/chat/history/{user.id}?limit=2&cursor={first['next_cursor']}").json()
+    assert [m["content"] for m in second["results"]] == ["message 1", "message 2"]
+
+    dump = client.get(f"/api/ai/chat/history/{user.id}?stream=true").text.splitlines()
+    assert [json.loads(line)["content"] for line in dump] == [f"message {i}" for i in range(4, -1, -1)]
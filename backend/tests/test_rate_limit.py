@@ -0,0 +1,90 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from rate_limit import TokenBucketLimiter, RateLimitMiddleware
+from routes.auth import create_access_token
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_refills_lazily():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(clock=clock)
+    limits = [("k", 3, 1.0)]
+    assert [limiter.acquire(limits) for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire(limits) == 1.0
+    clock.now = 2.0
+    assert limiter.acquire(limits, cost=2) == 0
+    assert limiter.acquire(limits) == 1.0
+
+
+def test_denied_request_consumes_nothing():
+    limiter = TokenBucketLimiter(clock=FakeClock())
+    assert limiter.acquire([("user", 10, 1.0), ("route", 1, 1.0)]) == 0
+    assert limiter.acquire([("user", 10, 1.0), ("route", 1, 1.0)]) == 1.0
+    # The user bucket was not charged for the denied call
+    assert limiter.acquire([("user", 10, 1.0)], cost=9) == 0
+
+
+def test_idle_buckets_expire():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(clock=clock)
+    limiter.acquire([("a", 2, 1.0)])
+    limiter.acquire([("b", 2, 1.0)])
+    clock.now = 5.0
+    limiter.acquire([("c", 2, 1.0)])
+    assert len(limiter) == 1
+
+
+def _limited_app(cost):
+    app = FastAPI()
+
+    @app.post("/api/ai/predict/{user_id}")
+    async def predict(user_id: int):
+        return {"ok": True}
+
+    @app.post("/api/ai/chat/send")
+    async def send(user_id: int):
+        return {"ok": True}
+
+    @app.get("/api/ai/chat/history/{user_id}")
+    async def history(user_id: int):
+        return []
+
+    limiter = TokenBucketLimiter(clock=FakeClock())
+    app.add_middleware(RateLimitMiddleware, limiter=limiter, rules=[("POST", "/api/ai/", cost)])
+    return TestClient(app)
+
+
+def test_middleware_returns_429_with_retry_after():
+    client = _limited_app(10)
+    assert client.post("/api/ai/predict/1").status_code == 200
+    assert client.post("/api/ai/predict/1").status_code == 200
+    response = client.post("/api/ai/predict/1")
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) > 0
+    # Other signed-in users and unlimited routes are unaffected
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'other@example.com'})}"}
+    assert client.post("/api/ai/predict/1", headers=headers).status_code == 200
+    assert client.get("/api/ai/chat/history/1").status_code == 200
+
+
+def test_clients_cannot_mint_fresh_buckets():
+    client = _limited_app(10)
+    # Made-up tokens, query and path parameters don't count as identities; the client address is the key
+    for i in range(2):
+        assert client.post(f"/api/ai/predict/{i}?user_id={i}", headers={"Authorization": f"Bearer forged{i}"}).status_code == 200
+    assert client.post("/api/ai/predict/9?user_id=9", headers={"Authorization": "Bearer forged9"}).status_code == 429
+    assert client.post("/api/ai/chat/send?user_id=3").status_code == 429
+
+    # A verified token is one bucket, whichever user_id it names
+    client = _limited_app(10)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'ahmed@example.com'})}"}
+    assert client.post("/api/ai/predict/1", headers=headers).status_code == 200
+    assert client.post("/api/ai/predict/2", headers=headers).status_code == 200
+    assert client.post("/api/ai/predict/3", headers=headers).status_code == 429
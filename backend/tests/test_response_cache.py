@@ -0,0 +1,65 @@
+from models import Task
+from response_cache import ResponseCache
+
+
+def test_lru_ttl_and_tag_invalidation():
+    now = [0.0]
+    cache = ResponseCache(max_entries=2, clock=lambda: now[0])
+    cache.put("a", b"1", '"a"', 10, ["user:1"])
+    cache.put("b", b"2", '"b"', 10, ["user:2", "leaderboard"])
+    cache.get("a")
+    cache.put("c", b"3", '"c"', 10, ["user:3"])
+    assert cache.get("b") is None and cache.get("a") == (b"1", '"a"')
+
+    cache.invalidate("user:1")
+    assert cache.get("a") is None
+    now[0] = 11
+    assert cache.get("c") is None and len(cache) == 0
+
+
+def test_store_skipped_when_invalidated_mid_read():
+    cache = ResponseCache()
+    generations = cache.generations(["user:1"])
+    cache.invalidate("user:1")
+    cache.put("a", b"1", '"a"', 10, ["user:1"], generations)
+    assert cache.get("a") is None
+
+
+def test_byte_budget_evicts_oldest():
+    cache = ResponseCache(max_bytes=10)
+    cache.put("a", b"x" * 6, '"a"', 10, [])
+    cache.put("b", b"x" * 6, '"b"', 10, [])
+    assert cache.get("a") is None and cache.get("b") is not None
+
+
+def test_cached_routes_etag_and_write_invalidation(client, db, make_user):
+    user = make_user()
+    first = client.get(f"/api/analytics/metrics/{user.id}")
+    assert first.headers["x-cache"] == "MISS" and first.json()["total_tasks"] == 0
+    etag = first.headers["etag"]
+
+    second = client.get(f"/api/analytics/metrics/{user.id}")
+    assert second.headers["x-cache"] == "HIT" and second.json() == first.json()
+    assert client.get(f"/api/analytics/metrics/{user.id}", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post(f"/api/tasks/submit?user_id={user.id}", json={"description": "Build dashboard", "category": "dev", "amount": 20})
+    fresh = client.get(f"/api/analytics/metrics/{user.id}", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200 and fresh.json()["total_tasks"] == 1
+
+    # Query strings are part of the key
+    assert len(client.get("/api/gamification/leaderboard?limit=1").json()) == 1
+    assert len(client.get("/api/gamification/leaderboard?limit=5").json()) == 1
+    assert client.get("/api/payments/credit-score/999").status_code == 404
+
+
+def test_achievements_invalidate_leaderboard_and_stats(client, db, make_user):
+    user = make_user(points=600)
+    other = make_user(points=650)
+    assert client.get(f"/api/gamification/stats/{other.id}").json()["rank"] == 1
+    client.get("/api/gamification/leaderboard")
+
+    db.add_all([Task(user_id=user.id, description=f"t{i}", amount=1, verification_status="verified", ai_score=0.5) for i in range(50)])
+    db.commit()
+    client.post(f"/api/gamification/check-achievements/{user.id}")
+    assert client.get("/api/gamification/leaderboard").json()[0]["user_id"] == user.id
+    assert client.get(f"/api/gamification/stats/{other.id}").json()["rank"] == 2
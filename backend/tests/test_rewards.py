@@ -0,0 +1,77 @@
+import pytest
+from models import Task, Payment, RewardAccrual, RewardBalance, CryptoWallet
+from rewards import accrue, settle, summary, rebuild_balances, task_reward, achievement_reward
+
+
+def test_accrual_is_idempotent_per_source(db, make_user):
+    user = make_user()
+    assert accrue(db, user.id, "task_payment", 1, 2.5)
+    assert not accrue(db, user.id, "task_payment", 1, 2.5)
+    assert accrue(db, user.id, "achievement", 1, 10)
+    db.commit()
+
+    rewards = summary(db, user.id)
+    assert rewards["pending_rewards"] == 12.5 and rewards["wpay_earned"] == 12.5
+    assert rewards["total_transactions"] == 2
+    assert summary(db, 999)["wpay_earned"] == 0.0
+
+
+def test_settlement_moves_pending_into_primary_wallet(db, make_user):
+    alice, bob = make_user(), make_user()
+    db.add_all([
+        CryptoWallet(user_id=alice.id, wallet_address="0xa1", wallet_type="metamask", balance=0),
+        CryptoWallet(user_id=alice.id, wallet_address="0xa2", wallet_type="metamask", balance=0),
+    ])
+    accrue(db, alice.id, "achievement", 1, 30)
+    accrue(db, bob.id, "achievement", 2, 0.5)
+    db.commit()
+
+    result = settle(db, min_amount=1)
+    assert result["users"] == 1 and result["total"] == 30
+
+    wallets = db.query(CryptoWallet).order_by(CryptoWallet.id).all()
+    assert [w.balance for w in wallets] == [30, 0]
+    assert summary(db, alice.id)["pending_rewards"] == 0
+    assert summary(db, alice.id)["wpay_balance"] == 30
+    assert summary(db, bob.id)["pending_rewards"] == 0.5
+    assert settle(db, min_amount=1)["settlement_id"] is None
+
+    # The ledger alone reproduces the running totals
+    before = {b.user_id: (b.pending, b.settled, b.lifetime_earned, b.transactions) for b in db.query(RewardBalance)}
+    wallets[0].balance = 0
+    db.commit()
+    rebuild_balances(db)
+    db.expire_all()
+    after = {b.user_id: (b.pending, b.settled, b.lifetime_earned, b.transactions) for b in db.query(RewardBalance)}
+    assert after == before
+    assert db.query(CryptoWallet).order_by(CryptoWallet.id).first().balance == 30
+
+
+def test_paid_tasks_and_achievements_credit_wpay(client, db, make_user):
+    user = make_user()
+    admin = make_user(role="admin")
+    task = Task(user_id=user.id, description="Write docs", amount=100.0, verification_status="verified", ai_score=0.95)
+    db.add(task)
+    db.commit()
+    db.add(Payment(user_id=user.id, task_id=task.id, amount=100.0))
+    db.commit()
+
+    assert client.post("/api/payments/process", json={"task_id": task.id}).status_code == 200
+    client.post("/api/payments/process", json={"task_id": task.id})
+    assert client.get(f"/api/web3/rewards/{user.id}").json()["pending_rewards"] == pytest.approx(task_reward(100.0))
+
+    user.points = 600
+    db.commit()
+    assert client.post(f"/api/gamification/check-achievements/{user.id}").json()["new_achievements"] == ["Leadership"]
+    rewards = client.get(f"/api/web3/rewards/{user.id}").json()
+    assert rewards["wpay_earned"] == pytest.approx(task_reward(100.0) + achievement_reward(0))
+    assert rewards["total_transactions"] == 2
+
+    client.post(f"/api/web3/wallet/connect?user_id={user.id}&wallet_address=0xabc&wallet_type=metamask")
+    assert client.post(f"/api/web3/rewards/settle?admin_id={user.id}").status_code == 403
+    assert client.post(f"/api/web3/rewards/settle?admin_id={admin.id}").json()["users"] == 1
+    wallet = client.get(f"/api/web3/wallet/{user.id}").json()
+    assert wallet["wallet_type"] == "metamask"
+    assert wallet["balance"] == pytest.approx(rewards["wpay_earned"])
+    assert wallet["pending_rewards"] == 0
+    assert db.query(RewardAccrual).count() == 3
@@ -0,0 +1,112 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import Automation, Report, WebhookOutbox, User
+from scheduler import Cron, AutomationScheduler, AUTOMATION_JOBS, jitter_seconds, next_run_at
+
+
+def test_cron_next_after():
+    monday = datetime(2024, 1, 1, 8, 30)
+    assert Cron("0 9 * * *").next_after(monday) == datetime(2024, 1, 1, 9, 0)
+    assert Cron("0 9 * * *").next_after(datetime(2024, 1, 1, 9, 0)) == datetime(2024, 1, 2, 9, 0)
+    assert Cron("*/15 * * * *").next_after(monday) == datetime(2024, 1, 1, 8, 45)
+    assert Cron("0 9 * * 5").next_after(monday) == datetime(2024, 1, 5, 9, 0)
+    assert Cron("0 0 31 * *").next_after(datetime(2024, 1, 31, 1)) == datetime(2024, 3, 31)
+    assert Cron("0 9 1 * *").next_after(datetime(2024, 12, 2)) == datetime(2025, 1, 1, 9)
+    with pytest.raises(ValueError):
+        Cron("61 * * * *")
+    with pytest.raises(ValueError):
+        Cron("0 0 30 2 *").next_after(monday)
+
+
+def test_jitter_spreads_users_and_is_stable():
+    offsets = {jitter_seconds(uid, "report") for uid in range(200)}
+    assert len(offsets) > 100
+    assert jitter_seconds(7, "report") == jitter_seconds(7, "report")
+
+    after = datetime(2024, 1, 1, 8)
+    first = next_run_at("daily", 7, "report", after)
+    assert first - datetime(2024, 1, 1, 9) == timedelta(seconds=jitter_seconds(7, "report"))
+    assert next_run_at("daily", 7, "report", first) == first + timedelta(days=1)
+
+
+def make_scheduler(engine, now, **kwargs):
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return AutomationScheduler(session_factory=factory, clock=lambda: now, **kwargs)
+
+
+def add_automation(db, user, automation_type="report", frequency="daily", at=datetime(2024, 1, 1, 9)):
+    automation = Automation(user_id=user.id, automation_type=automation_type, frequency=frequency, next_run_at=at)
+    db.add(automation)
+    db.commit()
+    return automation
+
+
+def test_due_jobs_run_once_across_schedulers(tmp_path):
+    # Worker threads need their own connections, so not the shared in-memory fixture
+    engine = create_engine(f"sqlite:///{tmp_path}/scheduler.db")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    users = [User(name=f"U{i}", email=f"u{i}@example.com", hashed_password="x", wallet_id=f"W{i}") for i in range(6)]
+    db.add_all(users)
+    db.commit()
+    for user in users:
+        add_automation(db, user)
+    now = datetime(2024, 1, 1, 9, 5)
+    first, second = make_scheduler(engine, now, workers=2), make_scheduler(engine, now, workers=4)
+
+    # Two processes racing over the same rows: leases let each run through exactly once
+    results = first.run_pending(now) + second.run_pending(now) + first.run_pending(now) + first.run_pending(now)
+    assert results.count("succeeded") == 6
+    assert db.query(Report).count() == 6
+
+    db.expire_all()
+    for automation in db.query(Automation):
+        assert automation.run_count == 1 and automation.lease_until is None
+        assert automation.next_run_at > datetime(2024, 1, 2, 9)
+    assert first.run_pending(now) == [] and second.run_pending(now) == []
+    db.close()
+    engine.dispose()
+
+
+def test_failed_job_is_recorded_and_rescheduled(engine, db, make_user, monkeypatch):
+    user = make_user()
+    automation = add_automation(db, user, automation_type="review")
+
+    def broken(db, automation, user_db):
+        raise RuntimeError("boom")
+    monkeypatch.setitem(AUTOMATION_JOBS, "review", broken)
+
+    now = datetime(2024, 1, 1, 9, 5)
+    assert make_scheduler(engine, now).run_pending(now) == ["failed"]
+    db.refresh(automation)
+    assert automation.last_status == "failed" and automation.last_error == "boom"
+    assert automation.next_run_at > now
+
+
+def test_sync_job_emits_webhook_event(engine, db, make_user):
+    user = make_user()
+    add_automation(db, user, automation_type="sync", frequency="weekly")
+    now = datetime(2024, 1, 1, 9, 5)
+    assert make_scheduler(engine, now).run_pending(now) == ["succeeded"]
+    assert db.query(WebhookOutbox).one().event == "integrations.sync"
+
+
+def test_schedule_endpoints(client, db, make_user):
+    user = make_user()
+    admin = make_user(role="admin")
+    assert client.post(f"/api/integrations/automation/schedule?user_id={user.id}&automation_type=report&frequency=bogus").status_code == 400
+
+    response = client.post(f"/api/integrations/automation/schedule?user_id={user.id}&automation_type=report&frequency=*/30 * * * *")
+    assert response.status_code == 200
+    assert response.json()["automation_id"] != "AUTO_123"
+
+    response = client.post(f"/api/integrations/automation/schedule/all?admin_id={admin.id}&automation_type=report&frequency=daily")
+    assert response.json()["scheduled"] == 1
+    assert client.post(f"/api/integrations/automation/schedule/all?admin_id={user.id}&automation_type=report&frequency=daily").status_code == 403
+
+    automation_id = client.get(f"/api/integrations/automations/{user.id}").json()[0]["automation_id"]
+    assert client.delete(f"/api/integrations/automation/{automation_id}?user_id={user.id}").status_code == 200
+    assert client.get(f"/api/integrations/automations/{user.id}").json()[0]["is_active"] is False
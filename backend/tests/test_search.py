@@ -0,0 +1,59 @@
+from sqlalchemy import text
+from models import Task, ChatMessage
+from search import fts_query, install_fts
+
+
+def test_fts_query_quotes_terms():
+    assert fts_query('invoice "recon* OR') == '"invoice" """recon"* "OR"'
+    assert fts_query("  ") == ""
+
+
+def test_task_search_is_ranked_and_user_scoped(client, db, make_user):
+    user, other = make_user(), make_user()
+    db.add_all([
+        Task(user_id=user.id, description="Reconciled invoices for March"),
+        Task(user_id=user.id, description="Invoice invoice invoice cleanup"),
+        Task(user_id=user.id, description="Designed onboarding screens"),
+        Task(user_id=other.id, description="Invoices for another tenant"),
+    ])
+    db.commit()
+
+    data = client.get(f"/api/tasks/search/{user.id}?q=invoice").json()
+    assert [r["description"] for r in data["results"]] == [
+        "Invoice invoice invoice cleanup",
+        "Reconciled invoices for March",
+    ]
+    assert data["next_offset"] is None
+
+    # Terms match descriptions, not the indexed user_id
+    assert client.get(f"/api/tasks/search/{user.id}?q={user.id}").json()["results"] == []
+
+    page = client.get(f"/api/tasks/search/{user.id}?q=invoice&limit=1").json()
+    assert len(page["results"]) == 1 and page["next_offset"] == 1
+
+    # Triggers keep the index in sync with updates and deletes
+    task = db.query(Task).filter(Task.description == "Designed onboarding screens").first()
+    task.description = "Invoice template redesign"
+    db.commit()
+    assert len(client.get(f"/api/tasks/search/{user.id}?q=invoice").json()["results"]) == 3
+    db.delete(task)
+    db.commit()
+    assert len(client.get(f"/api/tasks/search/{user.id}?q=invoice").json()["results"]) == 2
+
+
+def test_chat_search_and_backfill(client, engine, db, make_user):
+    user = make_user()
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE chat_messages_fts")
+        for suffix in ("ai", "ad", "au"):
+            conn.exec_driver_sql(f"DROP TRIGGER chat_messages_fts_{suffix}")
+    db.add(ChatMessage(user_id=user.id, content="How do I improve my payout speed?"))
+    db.commit()
+
+    with engine.begin() as conn:
+        install_fts(conn)
+        assert conn.execute(text("SELECT count(*) FROM chat_messages_fts")).scalar() == 1
+
+    data = client.get(f"/api/ai/chat/search/{user.id}?q=payout").json()
+    assert data["results"][0]["content"] == "How do I improve my payout speed?"
+    assert "[payout]" in data["results"][0]["snippet"]
@@ -0,0 +1,69 @@
+from sqlalchemy import create_engine, event, select, func
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from datetime import datetime
+from models import User, Task, Payment, AuditLog, FraudLog
+from fraud_graph import FraudRingIndex
+from search import search
+from scripts.seed import seed_database
+
+END = datetime(2025, 3, 31)
+
+
+def _engine(foreign_keys=False):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    if foreign_keys:
+        event.listen(engine, "connect", lambda conn, _: conn.execute("PRAGMA foreign_keys = ON"))
+    return engine
+
+
+def _seed(engine, **kwargs):
+    options = dict(users=60, tasks_per_user=8, chats_per_user=2, audits_per_user=4, fraud_rings=2,
+                   ring_size=4, days=30, seed=7, end=END, batch_size=50, log=lambda message: None)
+    options.update(kwargs)
+    return seed_database(engine, **options)
+
+
+def test_same_seed_same_rows():
+    first, second = _engine(), _engine()
+    counts = _seed(first)
+    assert _seed(second) == counts
+    assert counts["users"] == 60 and counts["tasks"] == counts["payments"]
+
+    query = select(Task.user_id, Task.description, Task.amount, Task.created_at).order_by(Task.id)
+    with first.connect() as a, second.connect() as b:
+        assert a.execute(query).all() == b.execute(query).all()
+        # Power-law activity: the busiest tenth of users own far more than a tenth of the tasks
+        per_user = sorted(a.execute(select(func.count()).select_from(Task).group_by(Task.user_id)).scalars(), reverse=True)
+        assert sum(per_user[:6]) > 0.25 * counts["tasks"]
+        created = a.execute(select(Task.created_at)).scalars().all()
+        assert all(datetime(2025, 3, 1) <= at < datetime(2025, 4, 1) for at in created)
+
+
+def test_fraud_rings_share_ips_and_index_as_clusters(engine):
+    counts = _seed(engine, audits_per_user=20)
+    assert counts["fraud_ring_members"] >= 4
+    with Session(engine) as db:
+        assert db.query(FraudLog).filter(FraudLog.confidence >= 0.5).count() >= counts["fraud_ring_members"]
+        index = FraudRingIndex()
+        index.build(db)
+        # The riskiest clusters are rings linked by a shared IP
+        rings = index.clusters(min_size=2)
+        assert rings[0]["risk"]["flagged_members"] >= 2
+        assert any(key.startswith("ip:93.184.") for key in rings[0]["shared_identifiers"])
+
+        # FTS triggers are restored and the bulk-loaded rows are indexed
+        task = db.query(Task).first()
+        word = task.description.split()[0]
+        assert search(db, "tasks_fts", task.user_id, word)["results"]
+
+
+def test_reset_deletes_children_before_parents():
+    engine = _engine(foreign_keys=True)
+    _seed(engine, users=10, demo=True)
+    counts = _seed(engine, users=5, clear=True)
+    with Session(engine) as db:
+        assert db.query(User).count() == 5
+        assert db.query(Payment).count() == counts["payments"]
+        assert db.query(AuditLog).count() == counts["audit_logs"]
+        assert db.query(User).filter(User.email == "admin@example.com").count() == 1
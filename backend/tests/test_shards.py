@@ -0,0 +1,199 @@
+from sqlalchemy import create_engine, event, select, func
+from sqlalchemy.orm import Session, sessionmaker
+from database import Base, get_db
+from main import app
+from models import User, Task, ShardPlacement, Automation, Report, WebhookOutbox, FraudLog, RewardBalance
+from shards import HashRing, shard_router, SHARD_ID_STRIDE, RELAYED_MODELS
+from rewards import task_reward
+from scripts import rebalance_shards
+from scripts.rebalance_shards import rebalance, shard_counts, move_user
+from scheduler import AutomationScheduler
+from datetime import datetime
+
+
+def _engine(path):
+    return create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+
+
+def _shard(catalog, tmp_path, shards: int):
+    """Point the router at catalog plus shards extra databases and the app's get_db at catalog"""
+    shard_router.configure(catalog, [f"sqlite:///{tmp_path / f'shard{i}.db'}" for i in range(1, shards + 1)])
+    shard_router.create_all()
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=catalog)
+
+    def override_get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+
+
+def _add_users(catalog, count: int) -> list:
+    with Session(catalog) as db:
+        start = db.query(User).count()
+        users = [User(name=f"User {i}", email=f"u{i}@example.com", hashed_password="x", wallet_id=f"W{i}")
+                 for i in range(start, start + count)]
+        db.add_all(users)
+        db.commit()
+        return [user.id for user in users]
+
+
+def _tasks_by_shard(user_id: int) -> dict:
+    counts = {}
+    for name, engine in shard_router.engines.items():
+        with engine.connect() as conn:
+            counts[name] = conn.execute(select(func.count()).select_from(Task).where(Task.user_id == user_id)).scalar()
+    return counts
+
+
+def test_adding_a_shard_only_moves_keys_onto_it():
+    before = HashRing(["shard0", "shard1", "shard2"])
+    after = HashRing(["shard0", "shard1", "shard2", "shard3"])
+    moved = [key for key in range(4000) if before.node(key) != after.node(key)]
+    assert all(after.node(key) == "shard3" for key in moved)
+    assert 0.15 < len(moved) / 4000 < 0.35
+
+
+def test_user_rows_go_to_their_shard_with_unique_ids(client, stub_llm, tmp_path):
+    catalog = _engine(tmp_path / "catalog.db")
+    Base.metadata.create_all(catalog)
+    _shard(catalog, tmp_path, 2)
+    user_ids = _add_users(catalog, 8)
+    with catalog.connect() as conn:
+        placements = dict(conn.execute(select(ShardPlacement.user_id, ShardPlacement.shard)).all())
+    assert len(set(placements.values())) > 1
+
+    task_ids = []
+    for user_id in user_ids:
+        task_ids.append(client.post(f"/api/tasks/submit?user_id={user_id}", json={"description": "Logo design", "amount": 20}).json()["task_id"])
+        batch = [{"description": f"Batch task {i}", "amount": 5} for i in range(3)]
+        task_ids += client.post(f"/api/tasks/submit/batch?user_id={user_id}", json=batch).json()["task_ids"]
+        # Everything for the user sits on their placement shard, with ids ending in its index
+        shard = placements[user_id]
+        assert _tasks_by_shard(user_id) == {name: 4 if name == shard else 0 for name in shard_router.engines}
+        page = client.get(f"/api/tasks/{user_id}").json()["results"]
+        assert len(page) == 4 and {t["id"] % SHARD_ID_STRIDE for t in page} == {int(shard[5:])}
+        assert client.get(f"/api/tasks/search/{user_id}?q=batch").json()["results"]
+    assert len(set(task_ids)) == len(task_ids)
+
+    # Routes addressed by task id find the right shard
+    assert client.post(f"/api/tasks/verify/{task_ids[0]}").status_code == 200
+    assert client.post("/api/payments/process", json={"task_id": task_ids[0], "amount": 20}).json()["status"] == "completed"
+    counts = shard_counts()
+    assert sum(c["payments"] for c in counts.values()) == len(task_ids)
+
+
+def test_rebalance_moves_users_onto_a_new_shard(client, tmp_path):
+    catalog = _engine(tmp_path / "catalog.db")
+    Base.metadata.create_all(catalog)
+    # Users from before sharding have rows on shard0 and no placement
+    shard_router.configure(catalog)
+    legacy = _add_users(catalog, 6)
+    for user_id in legacy:
+        client.post(f"/api/tasks/submit?user_id={user_id}", json={"description": "Legacy task", "amount": 10})
+
+    _shard(catalog, tmp_path, 1)
+    newer = _add_users(catalog, 6)
+    for user_id in newer:
+        client.post(f"/api/tasks/submit?user_id={user_id}", json={"description": "Sharded task", "amount": 10})
+    _shard(catalog, tmp_path, 2)
+
+    stats = rebalance(log=lambda message: None)
+    assert stats["users_moved"] > 0
+    for user_id in legacy + newer:
+        home = shard_router.ring.node(user_id)
+        assert shard_router.shard_for(user_id) == home
+        assert _tasks_by_shard(user_id)[home] == 1
+        assert len(client.get(f"/api/payments/{user_id}").json()["results"]) == 1
+    assert rebalance(log=lambda message: None) == {"users_moved": 0, "rows_moved": 0, "placements": 0}
+
+
+def test_move_carries_over_writes_made_during_the_copy(client, tmp_path, monkeypatch):
+    catalog = _engine(tmp_path / "catalog.db")
+    Base.metadata.create_all(catalog)
+    _shard(catalog, tmp_path, 1)
+    user_id = next(uid for uid in _add_users(catalog, 8) if shard_router.ring.node(uid) == "shard1")
+    with Session(catalog) as db:
+        db.merge(ShardPlacement(user_id=user_id, shard="shard0"))
+        db.add_all([Task(user_id=user_id, description=f"Task {i}") for i in range(5)])
+        db.commit()
+        first, second = db.scalars(select(Task.id).where(Task.user_id == user_id).order_by(Task.id).limit(2))
+
+    place = rebalance_shards._place
+
+    def write_then_place(conn, user_id, shard):
+        # The user's requests keep writing to shard0 until the placement moves
+        with Session(catalog) as db:
+            db.get(Task, first).description = "Edited"
+            db.delete(db.get(Task, second))
+            db.add(Task(user_id=user_id, description="Late"))
+            db.commit()
+        place(conn, user_id, shard)
+
+    monkeypatch.setattr(rebalance_shards, "_place", write_then_place)
+    assert move_user(shard_router, user_id, "shard0", "shard1", chunk_size=2) == 5
+    assert shard_router.shard_for(user_id) == "shard1"
+    assert _tasks_by_shard(user_id) == {"shard0": 0, "shard1": 5}
+    with shard_router.engines["shard1"].connect() as conn:
+        descriptions = conn.execute(select(Task.description).where(Task.user_id == user_id).order_by(Task.id)).scalars().all()
+    assert descriptions == ["Edited", "Task 2", "Task 3", "Task 4", "Late"]
+
+
+def test_scheduled_reports_read_the_users_shard(client, tmp_path):
+    catalog = _engine(tmp_path / "catalog.db")
+    Base.metadata.create_all(catalog)
+    _shard(catalog, tmp_path, 2)
+    user_id = next(uid for uid in _add_users(catalog, 8) if shard_router.shard_for(uid) != "shard0")
+    for i in range(3):
+        client.post(f"/api/tasks/submit?user_id={user_id}", json={"description": f"Task {i}", "amount": 10})
+    with Session(catalog) as db:
+        db.add(Automation(user_id=user_id, automation_type="report", frequency="daily", next_run_at=datetime(2024, 1, 1, 9)))
+        db.commit()
+
+    now = datetime(2024, 1, 1, 9, 5)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=catalog)
+    scheduler = AutomationScheduler(session_factory=factory, user_session=shard_router.session, clock=lambda: now)
+    assert scheduler.run_pending(now) == ["succeeded"]
+    with Session(catalog) as db:
+        assert db.query(Report).one().data["total_tasks"] == 3
+
+
+def test_requests_commit_to_the_users_shard_and_relay_to_the_catalog(client, stub_llm, tmp_path):
+    catalog = _engine(tmp_path / "catalog.db")
+    Base.metadata.create_all(catalog)
+    _shard(catalog, tmp_path, 1)
+    user_id = next(uid for uid in _add_users(catalog, 8) if shard_router.shard_for(uid) == "shard1")
+    written = set()
+    for name, engine in shard_router.engines.items():
+        event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args, name=name: (
+            written.add(name) if statement.split()[0] in ("INSERT", "UPDATE", "DELETE") else None
+        ))
+
+    def post(url, **kwargs):
+        written.clear()
+        response = client.post(url, **kwargs)
+        assert response.status_code == 200
+        # One database per request, so the outbox commits with the state change
+        assert written == {"shard1"}
+        return response.json()
+
+    task_id = post(f"/api/tasks/submit?user_id={user_id}", json={"description": "Logo design", "amount": 20})["task_id"]
+    post(f"/api/tasks/submit/batch?user_id={user_id}", json=[{"description": f"Batch {i}", "amount": 200} for i in range(7)])
+    post(f"/api/tasks/verify/{task_id}")
+    post("/api/payments/process", json={"task_id": task_id, "amount": 20})
+    post(f"/api/ai/chat/send?user_id={user_id}&content=hello")
+    post(f"/api/ai/sentiment/{user_id}")
+
+    with Session(catalog) as db:
+        assert db.query(WebhookOutbox).count() == 0
+        assert shard_router.relay() > 0
+        assert db.query(WebhookOutbox).count() == 10
+        assert db.query(FraudLog).count() > 0
+        assert db.get(RewardBalance, user_id).pending == task_reward(20)
+    with shard_router.engines["shard1"].connect() as conn:
+        assert all(conn.execute(select(func.count()).select_from(model)).scalar() == 0 for model in RELAYED_MODELS)
+    assert shard_router.relay() == 0
+
@@ -0,0 +1,57 @@
+import importlib
+import os
+import subprocess
+import sys
+import pytest
+from sqlalchemy import select, delete
+from migrations import MIGRATIONS
+from models import SchemaMigration
+import main
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_app_has_no_side_effects(tmp_path):
+    path = tmp_path / "app.db"
+    script = "import main, sys; print(' '.join(sorted({'groq', 'passlib'} & set(sys.modules))))"
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}")
+    result = subprocess.run([sys.executable, "-c", script], cwd=BACKEND, env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+    assert not path.exists()
+
+
+@pytest.mark.parametrize("auto_migrate", ["1", "0"])
+def test_startup_migrates_only_when_asked(client, engine, monkeypatch, auto_migrate):
+    monkeypatch.setenv("AUTO_MIGRATE", auto_migrate)
+    monkeypatch.setenv("WEBHOOK_DISPATCHER", "0")
+    monkeypatch.setenv("AUTOMATION_SCHEDULER", "0")
+    monkeypatch.setattr(main, "startup_timings", dict(main.startup_timings))
+    main.startup_timings.pop("migrate", None)
+    with engine.begin() as conn:
+        conn.execute(delete(SchemaMigration))
+
+    with client:
+        metrics = client.get("/metrics").text
+
+    with engine.connect() as conn:
+        versions = conn.execute(select(SchemaMigration.version)).scalars().all()
+    if auto_migrate == "1":
+        assert versions == [version for version, _, _ in MIGRATIONS]
+        assert 'workpay_startup_seconds{phase="migrate"}' in metrics
+    else:
+        assert versions == []
+        assert "migrate" not in main.startup_timings
+    assert 'workpay_startup_seconds{phase="import"}' in metrics
+
+
+@pytest.mark.parametrize("module", ["routes.tasks", "routes.fraud", "routes.analytics", "routes.ai_intelligence"])
+def test_groq_client_is_built_on_first_use(monkeypatch, module):
+    from groq import Groq
+    from lazy import Lazy
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    client = Lazy(importlib.import_module(module).get_groq_client)
+    assert not client.built
+
+    assert client.api_key == "test-key"
+    assert isinstance(client.get(), Groq)
+    assert client.built
@@ -0,0 +1,46 @@
+from models import Task, Payment, FraudLog
+from fraud_monitor import velocity_monitor
+
+
+def test_batch_submit_returns_ids_in_order(client, db, make_user):
+    user = make_user()
+    items = [{"description": f"task {i}", "amount": 10.0 + i} for i in range(8)]
+    response = client.post(f"/api/tasks/submit/batch?user_id={user.id}", json=items)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 8
+
+    tasks = {t.id: t for t in db.query(Task).all()}
+    assert [tasks[i].description for i in data["task_ids"]] == [f"task {i}" for i in range(8)]
+    payments = {p.id: p for p in db.query(Payment).all()}
+    assert [payments[i].task_id for i in data["payment_ids"]] == data["task_ids"]
+    # Every payment in the batch counts, so 8 trip the per-minute count like 8 single submissions would
+    assert {payments[i].status for i in data["payment_ids"]} == {"held"}
+    assert velocity_monitor.stats(user.id)["minute"]["count"] == 8
+    # but the batch gets one FraudLog, not one per payment after the fifth
+    assert db.query(FraudLog).count() == 1
+
+
+def test_batch_velocity_uses_the_total_amount(client, db, make_user):
+    user = make_user()
+    items = [{"description": f"task {i}", "amount": 200.0} for i in range(5)]
+    data = client.post(f"/api/tasks/submit/batch?user_id={user.id}", json=items).json()
+
+    payments = db.query(Payment).filter(Payment.id.in_(data["payment_ids"])).all()
+    assert {p.status for p in payments} == {"held"}
+    logs = db.query(FraudLog).filter(FraudLog.event_type == "velocity_check").all()
+    assert len(logs) == 1
+    assert logs[0].details["task_ids"] == data["task_ids"]
+    assert logs[0].details["amount"] == 1000.0
+
+
+def test_small_batches_pass(client, db, make_user):
+    user = make_user()
+    data = client.post(f"/api/tasks/submit/batch?user_id={user.id}", json=[{"description": "a", "amount": 10.0}] * 3).json()
+    assert {p.status for p in db.query(Payment).filter(Payment.id.in_(data["payment_ids"]))} == {"pending"}
+    assert db.query(FraudLog).count() == 0
+
+
+def test_batch_submit_unknown_user(client):
+    response = client.post("/api/tasks/submit/batch?user_id=999", json=[{"description": "x"}])
+    assert response.status_code == 404
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import httpx
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy.orm import sessionmaker
+from models import WebhookDelivery, WebhookDeadLetter, WebhookOutbox
+from webhooks import WebhookDispatcher, sign
+import webhooks
+
+# Test hostnames and what they resolve to; none of them hit DNS
+HOSTS = {
+    "hooks.local": ["93.184.216.34"],
+    "other.local": ["93.184.216.35"],
+    "x.local": ["93.184.216.36"],
+    "internal.local": ["93.184.216.37", "10.0.0.5"],
+}
+
+
+@pytest.fixture(autouse=True)
+def fake_dns(monkeypatch):
+    def resolve(host, port):
+        if host.replace(".", "").isdigit() or ":" in host:
+            return [host]
+        if host not in HOSTS:
+            raise OSError("unknown host")
+        return HOSTS[host]
+    monkeypatch.setattr(webhooks, "resolve_host", resolve)
+
+
+class StandIn:
+    """Local HTTP endpoint recording every request it receives"""
+
+    def __init__(self, status=200):
+        self.status = status
+        self.requests = []
+
+    def __call__(self, request: httpx.Request):
+        self.requests.append(request)
+        status = self.status(request) if callable(self.status) else self.status
+        return httpx.Response(status)
+
+
+def dispatcher_for(engine, endpoint, **kwargs):
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return WebhookDispatcher(session_factory=factory, transport=httpx.MockTransport(endpoint), **kwargs)
+
+
+def subscribe(client, user_id, event, url="http://hooks.local/in"):
+    response = client.post(f"/api/integrations/webhook?user_id={user_id}&event={event}&url={url}")
+    assert response.status_code == 200
+    return response.json()
+
+
+def submit(client, user_id, n):
+    body = [{"description": f"Task {i}", "category": "dev", "amount": 10.0 + i} for i in range(n)]
+    return client.post(f"/api/tasks/submit/batch?user_id={user_id}", json=body).json()
+
+
+def test_outbox_written_with_state_change_and_batched_per_endpoint(client, engine, db, make_user):
+    user = make_user()
+    hook = subscribe(client, user.id, "task.submitted")
+    subscribe(client, user.id, "*", url="http://other.local/all")
+    submit(client, user.id, 5)
+    assert db.query(WebhookOutbox).count() == 5
+
+    endpoint = StandIn()
+    summary = asyncio.run(dispatcher_for(engine, endpoint, batch_size=3).run_once())
+    assert summary["fanned_out"] == 5
+    assert summary["delivered"] == 10
+
+    by_host = {}
+    for request in endpoint.requests:
+        by_host.setdefault(request.url.host, []).append(len(json.loads(request.content)["events"]))
+    assert sorted(by_host["hooks.local"]) == [2, 3]
+    assert sorted(by_host["other.local"]) == [2, 3]
+
+    request = next(r for r in endpoint.requests if r.url.host == "hooks.local")
+    assert request.headers["x-workpay-signature"] == sign(hook["secret"], request.content)
+
+    # Nothing is sent twice
+    assert asyncio.run(dispatcher_for(engine, endpoint).run_once())["claimed"] == 0
+    assert len(endpoint.requests) == 4
+
+
+def test_failures_back_off_then_dead_letter(client, engine, db, make_user):
+    user = make_user()
+    subscribe(client, user.id, "task.submitted")
+    submit(client, user.id, 1)
+
+    endpoint = StandIn(status=503)
+    dispatcher = dispatcher_for(engine, endpoint, max_attempts=3)
+    now = datetime(2024, 1, 1)
+    assert asyncio.run(dispatcher.run_once(now))["retrying"] == 1
+    delivery = db.query(WebhookDelivery).one()
+    assert delivery.attempts == 1 and delivery.next_attempt_at >= now + timedelta(seconds=5)
+
+    # Not due yet
+    assert asyncio.run(dispatcher.run_once(now + timedelta(seconds=1)))["claimed"] == 0
+    asyncio.run(dispatcher.run_once(now + timedelta(hours=1)))
+    assert asyncio.run(dispatcher.run_once(now + timedelta(hours=2)))["dead"] == 1
+
+    letter = db.query(WebhookDeadLetter).one()
+    assert letter.attempts == 3 and letter.last_error == "HTTP 503"
+    dead = client.get(f"/api/integrations/webhooks/{user.id}/dead-letters").json()
+    assert dead[0]["event"] == "task.submitted"
+
+    assert client.post(f"/api/integrations/webhooks/dead-letters/{letter.id}/replay?user_id={user.id}").status_code == 200
+    endpoint.status = 200
+    assert asyncio.run(dispatcher.run_once())["delivered"] == 1
+
+
+def test_polls_use_indexes_and_old_rows_are_pruned(client, engine, db, make_user):
+    user = make_user()
+    subscribe(client, user.id, "task.submitted")
+    submit(client, user.id, 3)
+    submit(client, make_user().id, 2)  # no subscribers, so fanned out without deliveries
+
+    dispatcher = dispatcher_for(engine, StandIn())
+    with engine.connect() as conn:
+        for stmt in (
+            "SELECT id FROM webhook_outbox WHERE dispatched_at IS NULL ORDER BY id LIMIT 10",
+            "SELECT id FROM webhook_deliveries WHERE status = 'pending' AND next_attempt_at <= '2024-01-01' "
+            "ORDER BY next_attempt_at LIMIT 10",
+        ):
+            plan = " ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {stmt}"))
+            assert "USING INDEX ix_webhook_outbox_pending" in plan or "USING COVERING INDEX ix_webhook_deliveries" in plan, plan
+            assert "TEMP B-TREE" not in plan, plan
+
+    now = datetime.utcnow()
+    assert asyncio.run(dispatcher.run_once(now))["delivered"] == 3
+    assert dispatcher.prune(now) == {"deliveries": 0, "events": 0}
+    assert dispatcher.prune(now + timedelta(days=8)) == {"deliveries": 3, "events": 5}
+    assert db.query(WebhookOutbox).count() == 0
+
+
+def test_leased_deliveries_are_not_claimed_twice(client, engine, make_user):
+    user = make_user()
+    subscribe(client, user.id, "task.submitted")
+    submit(client, user.id, 4)
+
+    first, second = dispatcher_for(engine, StandIn()), dispatcher_for(engine, StandIn())
+    now = datetime.utcnow()
+    first._fan_out(now)
+    assert len(first._claim(now)) == 4
+    assert second._claim(now) == []
+    # A lapsed lease is picked up by another dispatcher
+    assert len(second._claim(now + timedelta(seconds=first.lease_seconds + 1))) == 4
+
+
+def test_webhook_validation_and_disable(client, make_user):
+    user = make_user()
+    assert client.post(f"/api/integrations/webhook?user_id={user.id}&event=nope&url=http://x.local").status_code == 400
+    assert client.post(f"/api/integrations/webhook?user_id={user.id}&event=task.verified&url=ftp://x").status_code == 400
+    # The dispatcher can't be aimed at loopback, private or metadata addresses
+    for url in ("http://127.0.0.1:8000/admin", "http://169.254.169.254/latest/meta-data", "http://[::1]/",
+                "http://100.64.0.1/", "http://internal.local/", "http://nowhere.local/"):
+        response = client.post(f"/api/integrations/webhook?user_id={user.id}&event=task.verified&url={url}")
+        assert response.status_code == 400, url
+    hook = subscribe(client, user.id, "task.verified")
+    assert client.delete(f"/api/integrations/webhook/{hook['webhook_id']}?user_id={user.id}").status_code == 200
+    assert client.get(f"/api/integrations/webhooks/{user.id}").json()[0]["status"] == "disabled"
+
+
+def test_leases_are_renewed_while_a_round_sends(client, engine, make_user):
+    user = make_user()
+    subscribe(client, user.id, "task.submitted")
+    submit(client, user.id, 2)
+    second = dispatcher_for(engine, StandIn())
+    stolen = []
+
+    async def slow_endpoint(request):
+        # Outlive the lease several times over, then let another dispatcher try to claim
+        await asyncio.sleep(0.5)
+        stolen.extend(second._claim(datetime.utcnow()))
+        return httpx.Response(200)
+
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    first = WebhookDispatcher(session_factory=factory, transport=httpx.MockTransport(slow_endpoint), lease_seconds=0.15)
+    assert asyncio.run(first.run_once())["delivered"] == 2
+    assert stolen == []
+
+
+def test_hosts_are_checked_again_at_send_time(client, engine, db, make_user, monkeypatch):
+    user = make_user()
+    subscribe(client, user.id, "task.submitted")
+    submit(client, user.id, 1)
+    # The host now resolves inside the network
+    monkeypatch.setitem(HOSTS, "hooks.local", ["127.0.0.1"])
+
+    endpoint = StandIn()
+    assert asyncio.run(dispatcher_for(engine, endpoint).run_once())["retrying"] == 1
+    assert endpoint.requests == []
+    assert "public address" in db.query(WebhookDelivery).one().last_error
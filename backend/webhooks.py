@@ -0,0 +1,384 @@
+from sqlalchemy import select, insert, update, delete, exists, literal, or_
+from database import SessionLocal
+from models import WebhookSubscription, WebhookOutbox, WebhookDelivery, WebhookDeadLetter
+from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import hmac
+import httpx
+import ipaddress
+import json
+import logging
+import os
+import random
+import socket
+import uuid
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_EVENTS = {"task.submitted", "task.verified", "payment.completed", "integrations.sync"}
+
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "50"))
+WEBHOOK_CLAIM_SIZE = int(os.getenv("WEBHOOK_CLAIM_SIZE", "1000"))
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "64"))
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_BACKOFF_BASE = float(os.getenv("WEBHOOK_BACKOFF_BASE", "5"))
+WEBHOOK_BACKOFF_MAX = float(os.getenv("WEBHOOK_BACKOFF_MAX", "3600"))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "1"))
+# How long a claim lasts without renewal; a live dispatcher renews it every third of this
+# while its round is sending, so a long round never loses its claim
+WEBHOOK_LEASE_SECONDS = float(os.getenv("WEBHOOK_LEASE_SECONDS", "60"))
+# Delivered and cancelled deliveries, and outbox rows left without deliveries, are deleted after this long
+WEBHOOK_RETENTION_DAYS = float(os.getenv("WEBHOOK_RETENTION_DAYS", "7"))
+WEBHOOK_PRUNE_INTERVAL = float(os.getenv("WEBHOOK_PRUNE_INTERVAL", "3600"))
+
+
+class UnsafeWebhookURL(ValueError):
+    pass
+
+
+def resolve_host(host: str, port: int) -> list:
+    """Every address host resolves to"""
+    return [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+
+
+def is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    # is_global rules out private, loopback, link-local, CGNAT and reserved ranges
+    return ip.is_global and not ip.is_multicast
+
+
+def check_webhook_url(url: str):
+    """Raise UnsafeWebhookURL unless url is http(s) and its host only resolves to public addresses.
+
+    Blocking (DNS), so async callers run it in a thread.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise UnsafeWebhookURL("Webhook URL must be http(s)")
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        addresses = resolve_host(parsed.hostname, port)
+    except (OSError, ValueError):
+        raise UnsafeWebhookURL("Webhook host does not resolve")
+    if not addresses or not all(is_public_address(address) for address in addresses):
+        raise UnsafeWebhookURL("Webhook URL must resolve to a public address")
+
+
+def enqueue_event(db, user_id: int, event: str, payload: dict):
+    """Add an outbox row to the caller's transaction; it commits with the state change"""
+    db.add(WebhookOutbox(user_id=user_id, event=event, payload=payload, created_at=datetime.utcnow()))
+
+
+def enqueue_events(db, rows: list):
+    """Bulk form of enqueue_event for (user_id, event, payload) tuples"""
+    if rows:
+        now = datetime.utcnow()
+        db.execute(insert(WebhookOutbox), [
+            {"user_id": user_id, "event": event, "payload": payload, "created_at": now}
+            for user_id, event, payload in rows
+        ])
+
+
+def sign(secret: str, body: bytes) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def backoff_delay(attempts: int, base: float = WEBHOOK_BACKOFF_BASE, cap: float = WEBHOOK_BACKOFF_MAX) -> float:
+    """Exponential backoff with up to 10% jitter so failing endpoints don't retry in lockstep"""
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return delay + random.uniform(0, delay * 0.1)
+
+
+class WebhookDispatcher:
+    """Delivers outbox events to subscribed endpoints.
+
+    Each round fans new outbox rows out into per-subscription deliveries,
+    leases due deliveries so concurrent dispatchers never send the same
+    one, POSTs them in batches per endpoint over a pooled keep-alive
+    client, and records the outcome. Failures back off exponentially and
+    land in the dead-letter table after max_attempts. Delivery is
+    at-least-once: leases are renewed while a round sends, and a crash
+    mid-send lets the lease lapse so the batch is retried.
+    """
+
+    def __init__(self, session_factory=None, transport=None, batch_size: int = WEBHOOK_BATCH_SIZE,
+                 claim_size: int = WEBHOOK_CLAIM_SIZE, concurrency: int = WEBHOOK_CONCURRENCY,
+                 max_attempts: int = WEBHOOK_MAX_ATTEMPTS, poll_interval: float = WEBHOOK_POLL_INTERVAL,
+                 lease_seconds: float = WEBHOOK_LEASE_SECONDS):
+        self.session_factory = session_factory or SessionLocal
+        self.transport = transport
+        self.batch_size = batch_size
+        self.claim_size = claim_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.stats = {"delivered": 0, "failed": 0, "dead": 0}
+        self._client = None
+        self._task = None
+        self._stopping = None
+        self._pruned_at = None
+
+    def _http(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=self.transport,
+                timeout=WEBHOOK_TIMEOUT,
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            )
+        return self._client
+
+    def _fan_out(self, now: datetime) -> int:
+        """Claim undispatched outbox rows and create a delivery per matching subscription"""
+        with self.session_factory() as db:
+            pending = select(WebhookOutbox.id).where(
+                WebhookOutbox.dispatched_at.is_(None)
+            ).order_by(WebhookOutbox.id).limit(self.claim_size)
+            claimed = db.execute(
+                update(WebhookOutbox).where(WebhookOutbox.id.in_(pending))
+                .values(dispatched_at=now).returning(WebhookOutbox.id)
+            ).scalars().all()
+            if not claimed:
+                return 0
+            db.execute(insert(WebhookDelivery).from_select(
+                ["outbox_id", "subscription_id", "status", "attempts", "next_attempt_at", "created_at"],
+                select(
+                    WebhookOutbox.id, WebhookSubscription.id,
+                    literal("pending"), literal(0), literal(now), literal(now)
+                ).join(WebhookSubscription, WebhookSubscription.user_id == WebhookOutbox.user_id).where(
+                    WebhookOutbox.id.in_(claimed),
+                    WebhookSubscription.is_active == True,
+                    or_(WebhookSubscription.event == WebhookOutbox.event, WebhookSubscription.event == "*")
+                )
+            ))
+            db.commit()
+            return len(claimed)
+
+    def _claim(self, now: datetime) -> list:
+        """Lease due deliveries and load what's needed to send them"""
+        until = now + timedelta(seconds=self.lease_seconds)
+        with self.session_factory() as db:
+            due = select(WebhookDelivery.id).where(
+                WebhookDelivery.status == "pending",
+                WebhookDelivery.next_attempt_at <= now,
+                or_(WebhookDelivery.lease_until.is_(None), WebhookDelivery.lease_until < now)
+            ).order_by(WebhookDelivery.next_attempt_at).limit(self.claim_size)
+            claimed = db.execute(
+                update(WebhookDelivery).where(WebhookDelivery.id.in_(due))
+                .values(lease_owner=self.owner, lease_until=until).returning(WebhookDelivery.id)
+            ).scalars().all()
+            db.commit()
+            if not claimed:
+                return []
+            return db.execute(
+                select(
+                    WebhookDelivery.id, WebhookDelivery.attempts,
+                    WebhookSubscription.id.label("subscription_id"), WebhookSubscription.url, WebhookSubscription.secret,
+                    WebhookOutbox.id.label("outbox_id"), WebhookOutbox.user_id, WebhookOutbox.event,
+                    WebhookOutbox.payload, WebhookOutbox.created_at
+                ).join(WebhookSubscription, WebhookSubscription.id == WebhookDelivery.subscription_id)
+                .join(WebhookOutbox, WebhookOutbox.id == WebhookDelivery.outbox_id)
+                .where(WebhookDelivery.id.in_(claimed))
+                .order_by(WebhookDelivery.subscription_id, WebhookOutbox.id)
+            ).mappings().all()
+
+    def _renew(self, ids: list) -> int:
+        """Extend the lease on deliveries this dispatcher still holds"""
+        until = datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+        with self.session_factory() as db:
+            renewed = db.execute(
+                update(WebhookDelivery)
+                .where(WebhookDelivery.id.in_(ids), WebhookDelivery.lease_owner == self.owner)
+                .values(lease_until=until)
+            ).rowcount
+            db.commit()
+        return renewed
+
+    async def _keep_leased(self, ids: list, done: asyncio.Event):
+        while True:
+            try:
+                await asyncio.wait_for(done.wait(), self.lease_seconds / 3)
+                return
+            except asyncio.TimeoutError:
+                await asyncio.to_thread(self._renew, ids)
+
+    def _batches(self, rows: list) -> list:
+        by_endpoint = {}
+        for row in rows:
+            by_endpoint.setdefault(row["subscription_id"], []).append(row)
+        batches = []
+        for endpoint_rows in by_endpoint.values():
+            for i in range(0, len(endpoint_rows), self.batch_size):
+                batches.append(endpoint_rows[i:i + self.batch_size])
+        return batches
+
+    async def _send(self, batch: list, gate: asyncio.Semaphore):
+        first = batch[0]
+        body = json.dumps({
+            "webhook_id": first["subscription_id"],
+            "events": [
+                {
+                    "id": row["outbox_id"],
+                    "event": row["event"],
+                    "user_id": row["user_id"],
+                    "created_at": row["created_at"].isoformat(),
+                    "data": row["payload"],
+                }
+                for row in batch
+            ],
+        }, default=str).encode()
+        headers = {
+            "content-type": "application/json",
+            "x-workpay-signature": sign(first["secret"], body),
+        }
+        async with gate:
+            try:
+                # Checked again at send time, since the host's DNS can change after it was accepted
+                await asyncio.to_thread(check_webhook_url, first["url"])
+            except UnsafeWebhookURL as e:
+                return batch, str(e)
+            try:
+                response = await self._http().post(first["url"], content=body, headers=headers)
+            except httpx.HTTPError as e:
+                return batch, f"{type(e).__name__}: {e}"
+        if 200 <= response.status_code < 300:
+            return batch, None
+        return batch, f"HTTP {response.status_code}"
+
+    def _record(self, results: list, now: datetime):
+        delivered, updates, dead = [], [], []
+        for batch, error in results:
+            for row in batch:
+                attempts = row["attempts"] + 1
+                if error is None:
+                    delivered.append(row["id"])
+                elif attempts >= self.max_attempts:
+                    updates.append({"id": row["id"], "status": "dead", "attempts": attempts,
+                                    "last_error": error, "lease_owner": None, "lease_until": None})
+                    dead.append({
+                        "delivery_id": row["id"],
+                        "subscription_id": row["subscription_id"],
+                        "user_id": row["user_id"],
+                        "url": row["url"],
+                        "event": row["event"],
+                        "payload": row["payload"],
+                        "attempts": attempts,
+                        "last_error": error,
+                        "created_at": now,
+                    })
+                else:
+                    updates.append({"id": row["id"], "status": "pending", "attempts": attempts,
+                                    "last_error": error, "lease_owner": None, "lease_until": None,
+                                    "next_attempt_at": now + timedelta(seconds=backoff_delay(attempts))})
+
+        with self.session_factory() as db:
+            if delivered:
+                db.execute(
+                    update(WebhookDelivery).where(WebhookDelivery.id.in_(delivered)).values(
+                        status="delivered", attempts=WebhookDelivery.attempts + 1, delivered_at=now,
+                        last_error=None, lease_owner=None, lease_until=None
+                    )
+                )
+            # Retry times differ per row, so these go through the by-primary-key bulk update
+            for status in ("pending", "dead"):
+                rows = [u for u in updates if u["status"] == status]
+                if rows:
+                    db.execute(update(WebhookDelivery), rows)
+            if dead:
+                db.execute(insert(WebhookDeadLetter), dead)
+            db.commit()
+
+        self.stats["delivered"] += len(delivered)
+        self.stats["failed"] += len(updates) - len(dead)
+        self.stats["dead"] += len(dead)
+        return {"delivered": len(delivered), "retrying": len(updates) - len(dead), "dead": len(dead)}
+
+    def _delete_in_chunks(self, db, model, *conditions) -> int:
+        # Bounded deletes, so the write lock is never held for the whole backlog
+        deleted = 0
+        while True:
+            ids = select(model.id).where(*conditions).limit(self.claim_size)
+            count = db.execute(delete(model).where(model.id.in_(ids))).rowcount
+            db.commit()
+            deleted += count
+            if count < self.claim_size:
+                return deleted
+
+    def prune(self, now: datetime = None, retention_days: float = WEBHOOK_RETENTION_DAYS) -> dict:
+        """Delete finished deliveries and outbox rows older than the retention window.
+
+        Dead deliveries stay with their dead letters, and so do their outbox rows.
+        """
+        cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+        with self.session_factory() as db:
+            deliveries = self._delete_in_chunks(
+                db, WebhookDelivery,
+                WebhookDelivery.status.in_(("delivered", "cancelled")), WebhookDelivery.created_at < cutoff
+            )
+            events = self._delete_in_chunks(
+                db, WebhookOutbox,
+                WebhookOutbox.dispatched_at < cutoff,
+                ~exists().where(WebhookDelivery.outbox_id == WebhookOutbox.id)
+            )
+        return {"deliveries": deliveries, "events": events}
+
+    async def run_once(self, now: datetime = None) -> dict:
+        """One dispatch round; returns counts for what it did"""
+        now = now or datetime.utcnow()
+        fanned = await asyncio.to_thread(self._fan_out, now)
+        rows = await asyncio.to_thread(self._claim, now)
+        summary = {"fanned_out": fanned, "claimed": len(rows), "delivered": 0, "retrying": 0, "dead": 0}
+        if not rows:
+            return summary
+        gate = asyncio.Semaphore(self.concurrency)
+        done = asyncio.Event()
+        renewer = asyncio.create_task(self._keep_leased([row["id"] for row in rows], done))
+        try:
+            results = await asyncio.gather(*(self._send(batch, gate) for batch in self._batches(rows)))
+        finally:
+            done.set()
+            await renewer
+        summary.update(await asyncio.to_thread(self._record, results, now))
+        return summary
+
+    async def run(self):
+        while not self._stopping.is_set():
+            try:
+                now = datetime.utcnow()
+                if self._pruned_at is None or (now - self._pruned_at).total_seconds() >= WEBHOOK_PRUNE_INTERVAL:
+                    self._pruned_at = now
+                    await asyncio.to_thread(self.prune, now)
+                summary = await self.run_once()
+            except Exception:
+                logger.exception("Webhook dispatch round failed")
+                summary = {"claimed": 0}
+            if not summary["claimed"]:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self):
+        """Run the dispatch loop as a task on the current event loop"""
+        if self._task is None or self._task.done():
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+webhook_dispatcher = WebhookDispatcher()